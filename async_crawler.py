@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+非同步管線版的對局爬蟲 (資料流程與 find_data.py 相同)，分成四個階段，以有上限的佇列串接：
+1. 召喚師：從爬取佇列租用召喚師、逐頁取得上次收錄之後的對局 id 並過濾已收錄的對局
+2. 抓取：多個協程同時請求對局詳細資料，由 riot_client.RiotClient 依 Riot 回傳的限速標頭控制速度
+3. 擷取：extract_match_info / extract_features 與 JSON 序列化交給多個程序計算
+4. 寫入：累積成批後以多列 INSERT 寫入資料庫 (獨立的連線與執行緒)
+Riot 的限速以區域為單位，[crawler] REGIONS 設定多個區域時每個區域各有一條爬取路線 (召喚師與抓取階段)：
+各自的爬取佇列分區 (summoners.region)、限速與同時請求數，擷取與寫入階段共用；
+對局 id 含平台前綴 (例如 TW2_123)，各區域的對局在同一個已收錄集合與 model_matches 中去重
+每個召喚師開始抓取前先記錄檢查點 (待抓取的對局 id)，該召喚師的對局全部寫入後才標記為已搜尋；
+程式中斷後以相同的 [crawler] WORKER_ID 重新啟動時會先接續自己租用中的召喚師，已寫入的對局由資料庫過濾掉
+下游較慢時佇列會塞滿，上游自動等待；每個階段定期回報處理速度、忙碌比例與輸入佇列深度，以及各區域的寫入速度，
+可看出瓶頸在 API (抓取忙碌、擷取佇列空)、CPU (擷取佇列滿) 還是資料庫 (寫入佇列滿)
+
+config.ini [api-key] 可選設定：
+    API_BASE_URL  測試時指向 mock_riot_server.py，例如 http://127.0.0.1:8089
+    MAX_IN_FLIGHT 每個區域同時進行中的請求上限 (預設 50)
+    TARGET_MATCHES 目標對局數 (預設 5000000)
+config.ini [crawler] 可選設定：
+    REGIONS         要爬取的區域，以逗號分隔，例如 sea,asia,americas (預設為 [api-key] REGION_MATCH)
+    EXTRACT_WORKERS 擷取程序數 (預設為 CPU 數，0 表示在主程序中擷取)
+    QUEUE_SIZE      各階段佇列上限 (預設 200)
+    REPORT_SECONDS  回報間隔秒數 (預設 10)
+config.ini [region.<區域>] 可選設定：
+    GAME_NAME / TAG_LINE  該區域爬取佇列為空時的種子召喚師 (REGION_MATCH 預設使用 [api-key] 的設定)
+    API_BASE_URL          該區域使用的位址 (測試時每個區域各一個 mock_riot_server.py)
+
+選用套件 (不在 requirements.txt 中)：aiohttp (riot_client.py)，寫入封存時另需 zstandard (match_archive.py)
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from find_data import (API_KEY, COUNT_REFRESH_ROUNDS, GAME_NAME, INSERT_BATCH_SIZE, MATCH_ID_PAGE_SIZE, MATCH_ID_PAGES,
+                       REGION_ACCOUNT, REGION_MATCH, SEEN_CAPACITY, SEEN_ERROR_RATE, SEEN_FILE, SEEN_SAVE_ROUNDS,
+                       TAG_LINE, config, count_matches, filter_new_matches, get_crawl_start_time, get_db_connection,
+                       insert_prepared_matches, insert_summoner_if_not_exists, lease_summoners, load_checkpoint,
+                       mark_summoner_as_searched, prepare_match, reclaim_own_leases, release_summoners,
+                       save_checkpoint)
+from seen_matches import load_seen_matches
+from riot_client import RiotApiError, RiotClient
+
+API_BASE_URL = config.get('api-key', 'API_BASE_URL', fallback=None)
+MAX_IN_FLIGHT = config.getint('api-key', 'MAX_IN_FLIGHT', fallback=50)
+TARGET_MATCHES = config.getint('api-key', 'TARGET_MATCHES', fallback=5_000_000)
+REGIONS = [region.strip() for region in config.get('crawler', 'REGIONS', fallback=REGION_MATCH).split(',')
+           if region.strip()]
+EXTRACT_WORKERS = config.getint('crawler', 'EXTRACT_WORKERS', fallback=os.cpu_count() or 1)
+QUEUE_SIZE = config.getint('crawler', 'QUEUE_SIZE', fallback=200)
+REPORT_SECONDS = config.getfloat('crawler', 'REPORT_SECONDS', fallback=10)
+
+
+def region_base_urls():
+    return {region: config.get(f"region.{region}", 'API_BASE_URL') for region in REGIONS
+            if config.has_option(f"region.{region}", 'API_BASE_URL')}
+
+
+def region_seed(region):
+    """區域的種子召喚師 (GAME_NAME, TAG_LINE)，沒有設定時回傳 None"""
+    section = f"region.{region}"
+    if config.has_option(section, 'GAME_NAME'):
+        return config.get(section, 'GAME_NAME'), config.get(section, 'TAG_LINE')
+    if region == REGION_MATCH:
+        return GAME_NAME, TAG_LINE
+    return None
+
+
+class StageMetrics:
+    """單一階段的處理數量與忙碌時間，回報時計算區間內的速度"""
+
+    def __init__(self, name, workers, queue=None):
+        self.name = name
+        self.workers = workers
+        self.queue = queue  # 此階段的輸入佇列
+        self.items = 0
+        self.busy = 0.0
+        self.reported_items = 0
+        self.reported_busy = 0.0
+
+    def record(self, start, items=1):
+        self.items += items
+        self.busy += time.perf_counter() - start
+
+    def report(self, interval):
+        items = self.items - self.reported_items
+        busy = self.busy - self.reported_busy
+        self.reported_items = self.items
+        self.reported_busy = self.busy
+        depth = f"{self.queue.qsize()}/{self.queue.maxsize}" if self.queue is not None else "-"
+        return (f"{self.name}: {items / interval:.1f}/秒，忙碌 {busy / (interval * self.workers):.0%}，"
+                f"佇列 {depth}")
+
+
+class RegionLane:
+    """單一區域的爬取路線：召喚師階段與抓取階段，使用該區域的爬取佇列分區與限速"""
+
+    def __init__(self, pipeline, region):
+        self.pipeline = pipeline
+        self.client = pipeline.client
+        self.conn = pipeline.conn
+        self.region = region
+        self.seed = region_seed(region)
+        self.id_queue = asyncio.Queue(QUEUE_SIZE)
+        self.summoner_metrics = StageMetrics(f"{region} 召喚師", 1)
+        self.fetch_metrics = StageMetrics(f"{region} 抓取", MAX_IN_FLIGHT, self.id_queue)
+        self.ingested = 0  # 此區域寫入的對局數
+        self.reported_ingested = 0
+
+    async def list_match_ids(self, puuid):
+        """
+        逐頁取得上次收錄之後的對局 id (見 find_data.list_match_ids)，第一頁就查無資料時回傳 None
+        任何一頁請求失敗都拋出 RiotApiError，不以不完整的清單記錄檢查點
+        """
+        start_time = get_crawl_start_time(self.conn, puuid)
+        end_time = int(time.time())
+        match_ids = []
+        for page in range(MATCH_ID_PAGES):
+            page_ids = await self.client.get_match_ids(self.region, puuid, start=page * MATCH_ID_PAGE_SIZE,
+                                                       count=MATCH_ID_PAGE_SIZE, start_time=start_time,
+                                                       end_time=end_time)
+            if page_ids is None:
+                return match_ids if page else None
+            match_ids.extend(page_ids)
+            if len(page_ids) < MATCH_ID_PAGE_SIZE:
+                break
+        return match_ids
+
+    # -------------------- 1. 召喚師 --------------------
+    async def produce(self):
+        pipeline = self.pipeline
+        consecutive_errors = 0  # 連續錯誤計數器
+        # 已租用尚未處理的召喚師，先接續同一個 WORKER_ID 上次未完成的
+        leased = reclaim_own_leases(self.conn, self.region)
+        while pipeline.current_count < TARGET_MATCHES:
+            try:
+                pipeline.rounds += 1
+                if pipeline.rounds % COUNT_REFRESH_ROUNDS == 0:
+                    pipeline.current_count = count_matches(self.conn)
+                if pipeline.rounds % SEEN_SAVE_ROUNDS == 0:
+                    pipeline.seen.sync(self.conn)
+                    pipeline.seen.save()
+
+                if not leased:
+                    leased = lease_summoners(self.conn, region=self.region)
+                summoner_puuid = leased.pop(0) if leased else None
+                if not summoner_puuid:
+                    # 若找不到，則使用該區域的種子召喚師並插入 summoners 表（若尚未存在）
+                    if self.seed is None:
+                        print(f"{self.region} 爬取佇列已空且沒有種子召喚師，結束此區域")
+                        break
+                    game_name, tag_line = self.seed
+                    account_data = await self.client.get_account(REGION_ACCOUNT, game_name, tag_line)
+                    if account_data is None:
+                        print(f"{self.region} 初始召喚師資料取得失敗，結束此區域")
+                        break
+                    summoner_puuid = account_data.get("puuid")
+                    insert_summoner_if_not_exists(self.conn, summoner_puuid, game_name, game_name, tag_line,
+                                                  self.region)
+
+                start = time.perf_counter()
+                # 有檢查點時接續上次未完成的對局 id，否則向 API 取得並記錄檢查點
+                # 管線中對局完成的順序不固定，游標維持 0，已寫入的對局由 filter_new_matches 過濾
+                checkpoint = load_checkpoint(self.conn, summoner_puuid)
+                if checkpoint:
+                    match_ids, newest = checkpoint["match_ids"][checkpoint["cursor"]:], checkpoint.get("newest")
+                else:
+                    try:
+                        match_ids = await self.list_match_ids(summoner_puuid)
+                    except RiotApiError as e:
+                        # 請求失敗不是查無對局：不標記為已搜尋，結束時歸還租約由之後的程序重試
+                        print("取得對局 id 失敗，稍後重試此召喚師:", summoner_puuid, e)
+                        pipeline.failed.add(summoner_puuid)
+                        continue
+                    if match_ids is None:
+                        print("查無此召喚師的對局 id，跳過此召喚師:", summoner_puuid)
+                        mark_summoner_as_searched(self.conn, summoner_puuid)
+                        continue
+                    newest = match_ids[0] if match_ids else None
+                new_ids = filter_new_matches(self.conn, pipeline.seen, match_ids)
+                if not checkpoint:
+                    save_checkpoint(self.conn, summoner_puuid, new_ids, 0, newest)
+                # 其他召喚師已排入 (尚未寫入) 的對局不重複排入，但此召喚師同樣要等它處理完才算完成；
+                # 在 await 之前同步登記，避免登記前該對局已處理完
+                to_queue = []
+                for match_id in new_ids:
+                    pipeline.owners.setdefault(match_id, set()).add(summoner_puuid)
+                    if match_id not in pipeline.queued:
+                        pipeline.queued.add(match_id)
+                        to_queue.append(match_id)
+                self.summoner_metrics.record(start, len(to_queue))
+                if not new_ids:
+                    mark_summoner_as_searched(self.conn, summoner_puuid, newest)
+                else:
+                    pipeline.outstanding[summoner_puuid] = set(new_ids)
+                    pipeline.newest[summoner_puuid] = newest
+                for match_id in to_queue:
+                    await self.id_queue.put(match_id)
+                consecutive_errors = 0
+
+            except Exception as e:
+                print(f"{self.region} 發生異常：", e)
+                self.conn.rollback()
+                consecutive_errors += 1
+                if consecutive_errors >= 5:
+                    print(f"{self.region} 連續異常達5次，結束此區域。")
+                    break
+                print("等待1分鐘後再繼續...")
+                await asyncio.sleep(60)
+        return leased
+
+    # -------------------- 2. 抓取 --------------------
+    async def fetch(self):
+        while True:
+            match_id = await self.id_queue.get()
+            if match_id is None:
+                return
+            start = time.perf_counter()
+            try:
+                raw_match = await self.client.get_match(self.region, match_id)
+            except RiotApiError:
+                # 請求失敗：等待此對局的召喚師保留檢查點，下次重新抓取
+                self.fetch_metrics.record(start)
+                self.pipeline.finish([match_id], ok=False)
+                continue
+            self.fetch_metrics.record(start)
+            if raw_match is None:
+                self.pipeline.finish([match_id])
+                continue
+            await self.pipeline.raw_queue.put(raw_match)
+
+    def report(self, interval):
+        ingested = self.ingested - self.reported_ingested
+        self.reported_ingested = self.ingested
+        return f"{self.region}: 寫入 {ingested / interval:.1f}/秒，累計 {self.ingested}"
+
+
+class CrawlPipeline:
+    def __init__(self, client, conn, writer_conn, seen, extract_pool, regions=None):
+        self.client = client
+        self.conn = conn  # 召喚師階段使用 (各區域的協程在同一個執行緒輪流使用)
+        self.writer_conn = writer_conn  # 寫入階段使用 (在執行緒中執行，不可與召喚師階段共用交易)
+        self.seen = seen
+        self.extract_pool = extract_pool
+        self.raw_queue = asyncio.Queue(QUEUE_SIZE)
+        self.row_queue = asyncio.Queue(QUEUE_SIZE)
+        self.queued = set()  # 已進入管線、尚未寫入的對局 id，避免不同召喚師 (或區域) 重複排入
+        self.owners = {}  # 對局 id -> 等待該對局處理完的召喚師 (排入者與清單中也有此對局的其他召喚師)
+        self.outstanding = {}  # 召喚師 -> 尚未處理完的對局 id
+        self.newest = {}  # 召喚師 -> 清單中最新的對局 id，完成時記錄為 crawled_until
+        self.failed = set()  # 請求或寫入失敗的召喚師，保留檢查點不標記為已搜尋
+        self.current_count = count_matches(conn)
+        self.rounds = 0
+        self.extract_tasks = max(1, EXTRACT_WORKERS)
+        self.lanes = {region: RegionLane(self, region) for region in (regions or REGIONS)}
+        self.extract_metrics = StageMetrics("擷取", self.extract_tasks, self.raw_queue)
+        self.store_metrics = StageMetrics("寫入", 1, self.row_queue)
+        self.metrics = [metrics for lane in self.lanes.values() for metrics in (lane.summoner_metrics,
+                                                                                 lane.fetch_metrics)]
+        self.metrics += [self.extract_metrics, self.store_metrics]
+
+    def finish(self, match_ids, ok=True):
+        """
+        對局處理完 (寫入、查無資料或擷取失敗)；等待該對局的召喚師的對局都處理完時標記為已搜尋
+        ok=False 時所有等待該對局的召喚師都保留檢查點，不標記為已搜尋
+        """
+        for match_id in match_ids:
+            self.queued.discard(match_id)
+            for puuid in self.owners.pop(match_id, ()):
+                if not ok:
+                    self.failed.add(puuid)
+                remaining = self.outstanding[puuid]
+                remaining.discard(match_id)
+                if not remaining:
+                    del self.outstanding[puuid]
+                    newest = self.newest.pop(puuid, None)
+                    if puuid not in self.failed:
+                        mark_summoner_as_searched(self.conn, puuid, newest)
+
+    # -------------------- 3. 擷取 --------------------
+    async def extract(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            raw_match = await self.raw_queue.get()
+            if raw_match is None:
+                return
+            start = time.perf_counter()
+            try:
+                if self.extract_pool is None:
+                    prepared = prepare_match(raw_match)
+                else:
+                    prepared = await loop.run_in_executor(self.extract_pool, prepare_match, raw_match)
+            except Exception as e:
+                print("擷取對局資料失敗:", raw_match.get("metadata", {}).get("matchId"), e)
+                self.finish([raw_match.get("metadata", {}).get("matchId")])
+                continue
+            self.extract_metrics.record(start)
+            await self.row_queue.put(prepared)
+
+    # -------------------- 4. 寫入 --------------------
+    async def store(self):
+        loop = asyncio.get_running_loop()
+        finished = False
+        while not finished:
+            prepared = await self.row_queue.get()
+            if prepared is None:
+                return
+            # 取出佇列中已完成的對局湊成一批，不等待
+            batch = [prepared]
+            while len(batch) < INSERT_BATCH_SIZE and not self.row_queue.empty():
+                prepared = self.row_queue.get_nowait()
+                if prepared is None:
+                    finished = True
+                    break
+                batch.append(prepared)
+
+            start = time.perf_counter()
+            try:
+                self.current_count += await loop.run_in_executor(None, insert_prepared_matches, self.writer_conn,
+                                                                 batch, self.seen)
+                ok = True
+            except Exception:
+                ok = False
+            self.store_metrics.record(start, len(batch))
+            if ok:
+                for prepared in batch:
+                    if prepared["region"] in self.lanes:
+                        self.lanes[prepared["region"]].ingested += 1
+            self.finish([prepared["match_id"] for prepared in batch], ok)
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(REPORT_SECONDS)
+            print(f"目前 matches 數量: {self.current_count}，累計請求 {self.client.stats['requests']}，"
+                  f"429 {self.client.stats['rate_limited']} 次")
+            for metrics in self.metrics:
+                print("  " + metrics.report(REPORT_SECONDS))
+            for lane in self.lanes.values():
+                print("  " + lane.report(REPORT_SECONDS))
+
+    async def run(self):
+        """啟動各區域與共用階段；各區域的召喚師階段都結束後依序送出結束訊號 (None)，讓已進入管線的對局處理完"""
+        fetchers = {region: [asyncio.create_task(lane.fetch()) for _ in range(MAX_IN_FLIGHT)]
+                    for region, lane in self.lanes.items()}
+        extractors = [asyncio.create_task(self.extract()) for _ in range(self.extract_tasks)]
+        writer = asyncio.create_task(self.store())
+        reporter = asyncio.create_task(self.report())
+
+        leased = []
+        for lane_leased in await asyncio.gather(*(lane.produce() for lane in self.lanes.values())):
+            leased += lane_leased
+        for region, lane in self.lanes.items():
+            for _ in fetchers[region]:
+                await lane.id_queue.put(None)
+        await asyncio.gather(*(task for tasks in fetchers.values() for task in tasks))
+        for _ in extractors:
+            await self.raw_queue.put(None)
+        await asyncio.gather(*extractors)
+        await self.row_queue.put(None)
+        await writer
+        reporter.cancel()
+        # 請求或寫入失敗的召喚師保留檢查點，與未處理的一起歸還租約
+        return leased + sorted(self.failed)
+
+
+async def crawl():
+    conn = get_db_connection()
+    writer_conn = get_db_connection()
+    seen = load_seen_matches(conn, SEEN_FILE, SEEN_CAPACITY, SEEN_ERROR_RATE)
+    extract_pool = ProcessPoolExecutor(EXTRACT_WORKERS) if EXTRACT_WORKERS > 0 else None
+
+    try:
+        async with RiotClient(API_KEY, base_url=API_BASE_URL, max_in_flight=MAX_IN_FLIGHT,
+                              base_urls=region_base_urls()) as client:
+            pipeline = CrawlPipeline(client, conn, writer_conn, seen, extract_pool)
+            leased = await pipeline.run()
+            for lane in pipeline.lanes.values():
+                print(f"{lane.region} 寫入對局 {lane.ingested} 筆")
+        release_summoners(conn, leased)
+    finally:
+        if extract_pool is not None:
+            extract_pool.shutdown()
+        seen.sync(conn)
+        seen.save()
+    print("達到目標對局數量:", count_matches(conn))
+    writer_conn.close()
+    conn.close()
+
+
+def main():
+    asyncio.run(crawl())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+讀取模型包 (根目錄 model_bundle.py 建立的單一 zip 檔)：
+manifest.json 記錄英雄列表、特徵欄位順序與各檔案的 sha256，陣列為 .npy，scaler 以 mean/scale 陣列保存，
+讀取時不需要 pickle 與 scikit-learn；patch_stats.npy (選用) 為各版本的英雄統計表，版本順序為 manifest 的 patches
+這是唯一的讀取實作：根目錄的 model_bundle.py (建立模型包) 與服務端的預測器都由此匯入；
+flaskApi 部署時只包含該目錄，flaskApi/bundle_reader.py 為指向此檔案的符號連結，因此只能匯入 patch_versions
+"""
+import hashlib
+import io
+import json
+import zipfile
+
+import numpy as np
+
+from patch_versions import patch_key
+
+BUNDLE_FORMAT = 1
+BUNDLE_FILE = "aram_model_bundle.zip"
+
+
+def read_bundle(path):
+    """讀取模型包並驗證雜湊，回傳 (manifest, 模型檔案內容, {名稱: 陣列})"""
+    with open(path, "rb") as f:
+        data = f.read()
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        if manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"不支援的模型包格式: {manifest.get('format')}")
+        files = {name: zf.read(name) for name in manifest["files"]}
+    for name, content in files.items():
+        if hashlib.sha256(content).hexdigest() != manifest["files"][name]:
+            raise ValueError(f"模型包 {path} 中的 {name} 雜湊不符")
+    arrays = {name[:-4]: np.load(io.BytesIO(content), allow_pickle=False)
+              for name, content in files.items() if name.endswith(".npy")}
+    return manifest, files[manifest["model"]], arrays
+
+
+def patch_index(manifest, patch=None):
+    """
+    選擇版本統計表在 patch_stats 中的索引：patch 為空時使用 current_patch，
+    模型包中沒有該版本 (例如新版本剛推出) 時使用不晚於該版本的最新版本；沒有可用的版本時回傳 None (使用 champion_stats)
+    """
+    patch = patch or manifest.get("current_patch")
+    candidates = [i for i, name in enumerate(manifest.get("patches", [])) if patch_key(name) <= patch_key(patch)]
+    return candidates[-1] if patch and candidates else None
+
+
+def normalized_stats_table(arrays, index=None):
+    """正規化後的英雄統計表 (與 StandardScaler.transform 相同的計算)，index 為 patch_stats 的版本索引"""
+    table = (arrays["champion_stats"] if index is None else arrays["patch_stats"][index]).astype(np.float32)
+    table -= arrays["scaler_mean"]
+    table /= arrays["scaler_scale"]
+    return table
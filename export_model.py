@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+服務用模型匯出：把 advanced_aram_model_v2.h5 轉成 TFLite，並以保留的測試資料驗證各版本的排名品質
+
+匯出的版本 (都是只需要英雄 ID 輸入的 lookup 模型，英雄統計表存在模型內，服務端不需要 scaler 與統計資料)：
+    float32       TFLite 基準 (與 Keras 模型相同的權重)
+    float16       權重存成 float16，計算時還原成 float32
+    int8          動態範圍量化：權重 int8，啟用值在執行時量化
+    int8-full     全整數量化：以訓練資料校正啟用值範圍 (輸入的英雄 ID 與輸出的勝率不量化)
+    pruned-int8   依權重大小剪枝 (Dense 層 kernel 中最小的 --prune-sparsity 比例設為 0) 後動態範圍量化
+                  剪枝後不再訓練 (邊訓練邊剪枝需要 tensorflow-model-optimization，不在 requirements.txt 中)；
+                  TFLite 仍以密集格式儲存權重，只有壓縮後的大小 (gzip_kb，下載與模型包) 變小，執行時的記憶體不變
+
+驗證資料為訓練資料快取 (chatDeep.py 的 TRAINING_CACHE) 的 test 分組，報告 (report.json) 記錄：
+    檔案大小 (與 gzip 壓縮後的大小)、AUC、準確率、與 Keras float32 模型預測值的平均/最大差異、預測排名的 Spearman 相關係數，
+    並推薦 AUC 下降不超過 --max-auc-drop 的最小版本 (以未壓縮的大小比較，即載入後佔用的記憶體)
+驗證前先確認快取的英雄清單與模型一致 (英雄數等於 Embedding 的 input_dim，且與 champion_to_idx_v2.pkl 相同)，
+快取與模型來自不同的英雄版本時英雄 ID 對應不同，驗證結果沒有意義
+
+用法：
+    python export_model.py [--model advanced_aram_model_v2.h5] [--output model_export] [--samples 200000]
+                           [--max-auc-drop 0.002] [--prune-sparsity 0.5]
+flaskApi 的預測器以 MODEL_FILE 指定 .tflite 檔案時使用 TFLite 直譯器執行 (不需要載入完整的 TensorFlow/Keras)
+"""
+
+import argparse
+import gzip
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import chatDeep
+
+VARIANTS = ["float32", "float16", "int8", "int8-full", "pruned-int8"]
+CALIBRATION_SAMPLES = 2000
+PRUNE_SPARSITY = 0.5
+CHAMPION_TO_IDX_FILE = "champion_to_idx_v2.pkl"
+
+
+def load_split(meta, split, limit=None):
+    """讀取訓練資料快取某一組的英雄 ID 與標籤 (最多 limit 筆)"""
+    X_ids, y = [], []
+    for shard_ids, shard_y in chatDeep.open_cached_split(chatDeep.TRAINING_CACHE_DIR, meta, split):
+        X_ids.append(np.asarray(shard_ids))
+        y.append(np.asarray(shard_y))
+        if limit and sum(len(part) for part in y) >= limit:
+            break
+    X_ids, y = np.concatenate(X_ids), np.concatenate(y)
+    return (X_ids[:limit], y[:limit]) if limit else (X_ids, y)
+
+
+def iter_layers(model):
+    """依序回傳模型的所有層 (包含 lookup 模型內層的雙輸入模型)"""
+    for layer in model.layers:
+        yield layer
+        if hasattr(layer, "layers"):
+            yield from iter_layers(layer)
+
+
+def check_champions(model, meta, champion_to_idx_file=CHAMPION_TO_IDX_FILE):
+    """快取的英雄清單必須與模型的英雄 ID 一致，否則以 ValueError 停止"""
+    num_champions = len(meta["champions"])
+    for layer in iter_layers(model):
+        if isinstance(layer, tf.keras.layers.Embedding) and layer.input_dim != num_champions:
+            raise ValueError(f"訓練資料快取有 {num_champions} 個英雄，模型的 {layer.name} 為 {layer.input_dim} 個，"
+                             f"請以模型訓練時的快取驗證 (或重新訓練模型)")
+    if os.path.exists(champion_to_idx_file):
+        with open(champion_to_idx_file, "rb") as f:
+            champion_to_idx = pickle.load(f)
+        if sorted(champion_to_idx, key=champion_to_idx.get) != list(meta["champions"]):
+            raise ValueError(f"訓練資料快取的英雄清單與 {champion_to_idx_file} 不同，英雄 ID 對應不一致")
+
+
+def prune(model, sparsity):
+    """把每個 Dense 層 kernel 中絕對值最小的 sparsity 比例設為 0 (直接修改 model)，回傳設為 0 的權重數"""
+    pruned = 0
+    for layer in iter_layers(model):
+        if not isinstance(layer, tf.keras.layers.Dense):
+            continue
+        kernel = layer.kernel.numpy()
+        threshold = np.quantile(np.abs(kernel), sparsity)
+        mask = np.abs(kernel) < threshold
+        layer.kernel.assign(np.where(mask, 0.0, kernel).astype(kernel.dtype))
+        pruned += int(mask.sum())
+    return pruned
+
+
+def convert(model, variant, calibration_ids):
+    """把 lookup 模型轉成指定版本的 TFLite (回傳 bytes)"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant in ("int8", "pruned-int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif variant == "int8-full":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        def representative_dataset():
+            for start in range(0, len(calibration_ids), 100):
+                yield [calibration_ids[start:start + 100]]
+
+        converter.representative_dataset = representative_dataset
+    return converter.convert()
+
+
+def run_tflite(model_content, X_ids, batch_size=1024):
+    """以 TFLite 直譯器批次預測"""
+    interpreter = tf.lite.Interpreter(model_content=model_content)
+    input_index = interpreter.get_input_details()[0]["index"]
+    output_index = interpreter.get_output_details()[0]["index"]
+    predictions = []
+    current_size = None
+    for start in range(0, len(X_ids), batch_size):
+        batch = X_ids[start:start + batch_size]
+        if len(batch) != current_size:
+            interpreter.resize_tensor_input(input_index, batch.shape)
+            interpreter.allocate_tensors()
+            current_size = len(batch)
+        interpreter.set_tensor(input_index, batch)
+        interpreter.invoke()
+        predictions.append(interpreter.get_tensor(output_index)[:, 0].copy())
+    return np.concatenate(predictions)
+
+
+def roc_auc(y, scores):
+    """以排名計算 AUC (相同分數取平均排名)"""
+    order = np.argsort(scores, kind="mergesort")
+    ranks = np.empty(len(scores), dtype=np.float64)
+    sorted_scores = scores[order]
+    # 相同分數的區段取平均排名
+    boundaries = np.flatnonzero(np.diff(sorted_scores)) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(scores)]])
+    for start, end in zip(starts, ends):
+        ranks[order[start:end]] = (start + end + 1) / 2.0
+    positives = y == 1
+    num_pos, num_neg = positives.sum(), (~positives).sum()
+    return float((ranks[positives].sum() - num_pos * (num_pos + 1) / 2) / (num_pos * num_neg))
+
+
+def spearman(a, b):
+    rank_a = np.argsort(np.argsort(a)).astype(np.float64)
+    rank_b = np.argsort(np.argsort(b)).astype(np.float64)
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+def evaluate(name, predictions, reference, y, content, seconds):
+    return {
+        "variant": name,
+        "size_kb": round(len(content) / 1024, 1),
+        "gzip_kb": round(len(gzip.compress(content)) / 1024, 1),
+        "auc": round(roc_auc(y, predictions), 5),
+        "accuracy": round(float(((predictions >= 0.5) == (y == 1)).mean()), 5),
+        "mean_abs_delta": float(np.abs(predictions - reference).mean()),
+        "max_abs_delta": float(np.abs(predictions - reference).max()),
+        "spearman": round(spearman(predictions, reference), 6),
+        "seconds": round(seconds, 2),
+    }
+
+
+def export_models(model_file, output_dir, samples, max_auc_drop, prune_sparsity=PRUNE_SPARSITY):
+    os.makedirs(output_dir, exist_ok=True)
+    model = chatDeep.to_lookup_model(tf.keras.models.load_model(model_file))
+    meta = chatDeep.load_training_cache(chatDeep.TRAINING_CACHE_DIR)
+    check_champions(model, meta)
+    X_test, y_test = load_split(meta, "test", samples)
+    calibration_ids, _ = load_split(meta, "train", CALIBRATION_SAMPLES)
+    print(f"驗證資料: {len(y_test)} 筆 (test)，校正資料: {len(calibration_ids)} 筆 (train)")
+
+    started = time.time()
+    reference = model.predict(X_test, batch_size=1024, verbose=0)[:, 0]
+    with open(model_file, "rb") as f:
+        model_content = f.read()
+    results = [evaluate("keras-float32", reference, reference, y_test, model_content, time.time() - started)]
+
+    # 剪枝修改的是另外載入的一份模型，其他版本仍由原本的權重轉換
+    pruned_model = chatDeep.to_lookup_model(tf.keras.models.load_model(model_file))
+    pruned_weights = prune(pruned_model, prune_sparsity)
+    print(f"剪枝: Dense 層 {pruned_weights} 個權重設為 0 (sparsity {prune_sparsity})")
+
+    base_name = os.path.splitext(os.path.basename(model_file))[0]
+    for variant in VARIANTS:
+        content = convert(pruned_model if variant.startswith("pruned") else model, variant, calibration_ids)
+        path = os.path.join(output_dir, f"{base_name}_{variant.replace('-', '_')}.tflite")
+        with open(path, "wb") as f:
+            f.write(content)
+        started = time.time()
+        predictions = run_tflite(content, X_test)
+        result = evaluate(variant, predictions, reference, y_test, content, time.time() - started)
+        result["file"] = os.path.basename(path)
+        results.append(result)
+
+    # AUC 下降在容許範圍內的最小版本
+    baseline_auc = results[0]["auc"]
+    candidates = [result for result in results[1:] if baseline_auc - result["auc"] <= max_auc_drop]
+    recommended = min(candidates, key=lambda result: result["size_kb"]) if candidates else None
+
+    print(f"{'版本':<14}{'大小(KB)':>10}{'gzip(KB)':>10}{'AUC':>9}{'準確率':>9}{'平均差異':>12}{'最大差異':>12}"
+          f"{'Spearman':>10}")
+    for result in results:
+        print(f"{result['variant']:<14}{result['size_kb']:>10}{result['gzip_kb']:>10}{result['auc']:>9}"
+              f"{result['accuracy']:>9}"
+              f"{result['mean_abs_delta']:>12.2e}{result['max_abs_delta']:>12.2e}{result['spearman']:>10}")
+    if recommended:
+        print(f"推薦版本: {recommended['variant']} ({recommended['file']}，AUC 下降 "
+              f"{baseline_auc - recommended['auc']:.5f} <= {max_auc_drop})")
+    else:
+        print(f"沒有版本的 AUC 下降在 {max_auc_drop} 以內")
+
+    report = {
+        "model": model_file,
+        "samples": int(len(y_test)),
+        "max_auc_drop": max_auc_drop,
+        "prune_sparsity": prune_sparsity,
+        "results": results,
+        "recommended": recommended["file"] if recommended else None,
+    }
+    with open(os.path.join(output_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="匯出量化的 TFLite 模型並產生驗證報告")
+    parser.add_argument("--model", default="advanced_aram_model_v2.h5")
+    parser.add_argument("--output", default="model_export")
+    parser.add_argument("--samples", type=int, default=200000, help="驗證資料筆數上限")
+    parser.add_argument("--max-auc-drop", type=float, default=0.002, help="推薦版本可接受的 AUC 下降")
+    parser.add_argument("--prune-sparsity", type=float, default=PRUNE_SPARSITY,
+                        help="pruned-int8：Dense 層設為 0 的權重比例")
+    args = parser.parse_args()
+    export_models(args.model, args.output, args.samples, args.max_auc_drop, args.prune_sparsity)
@@ -1,10 +1,17 @@
 import configparser
+import json
+import os
+import socket
 import time
 from datetime import datetime
 
 import psycopg2
 import requests
-from psycopg2.extras import Json
+from psycopg2.extras import Json, execute_values
+
+from match_features import extract_features, extract_match_info
+from patch_versions import game_patch
+from seen_matches import load_seen_matches
 
 # 建立設定解析器
 config = configparser.ConfigParser()
@@ -16,6 +23,34 @@ REGION_ACCOUNT = config.get('api-key', 'REGION_ACCOUNT')
 REGION_MATCH = config.get('api-key', 'REGION_MATCH')
 GAME_NAME = config.get('api-key', 'GAME_NAME')
 TAG_LINE = config.get('api-key', 'TAG_LINE')
+# 對局 id 的平台前綴 (例如 TW2_123) -> match-v5 的區域 (routing value)
+PLATFORM_REGIONS = {
+    "NA1": "americas", "BR1": "americas", "LA1": "americas", "LA2": "americas",
+    "EUW1": "europe", "EUN1": "europe", "TR1": "europe", "RU": "europe", "ME1": "europe",
+    "KR": "asia", "JP1": "asia",
+    "OC1": "sea", "PH2": "sea", "SG2": "sea", "TH2": "sea", "TW2": "sea", "VN2": "sea",
+}
+
+# =========== 爬取佇列參數 ===========
+# 租用召喚師時記錄的爬蟲程序；設定固定的 WORKER_ID 時，重新啟動後會先接續自己上次未完成的召喚師
+WORKER_ID = config.get('crawler', 'WORKER_ID', fallback=f"{socket.gethostname()}-{os.getpid()}")
+LEASE_BATCH_SIZE = config.getint('crawler', 'LEASE_BATCH_SIZE', fallback=10)
+LEASE_MINUTES = config.getint('crawler', 'LEASE_MINUTES', fallback=30)
+# 設定後原始 JSON 改寫入 match_archive.py 的壓縮區段檔，model_matches.match_data 留空
+ARCHIVE_DIR = config.get('crawler', 'ARCHIVE_DIR', fallback=None)
+_archive_writer = None
+_known_patches = set()  # 已確認有分區的 model_matches 版本
+# 記憶體中的已收錄對局集合 (Bloom filter) 與存檔
+SEEN_FILE = config.get('crawler', 'SEEN_FILE', fallback='seen_matches.bloom')
+SEEN_CAPACITY = config.getint('crawler', 'SEEN_CAPACITY', fallback=10_000_000)
+SEEN_ERROR_RATE = config.getfloat('crawler', 'SEEN_ERROR_RATE', fallback=1e-4)
+SEEN_SAVE_ROUNDS = config.getint('crawler', 'SEEN_SAVE_ROUNDS', fallback=50)
+# 對局 id 清單：只取 summoners.crawled_until (上次收錄到的最新對局結束時間) 之後的對局，一頁 100 筆，最多取幾頁
+MATCH_ID_PAGE_SIZE = 100
+MATCH_ID_PAGES = config.getint('crawler', 'MATCH_ID_PAGES', fallback=5)
+MATCH_ID_WINDOW_DAYS = 60  # 第一次爬取時往回取幾天
+# 已搜尋過的召喚師出現在比 crawled_until 新幾天以上的對局時，重新放回爬取佇列
+RECRAWL_DAYS = config.getint('crawler', 'RECRAWL_DAYS', fallback=7)
 
 # =========== 資料庫連線參數 ===========
 DB_HOST = config.get('database', 'DB_HOST')
@@ -31,44 +66,155 @@ def get_db_connection():
     return conn
 
 
-def get_first_unsearched_summoner(conn):
+def match_region(match_id, default=REGION_MATCH):
+    """依對局 id 的平台前綴決定要向哪個區域請求 (不同平台的 gameId 可能相同，對局 id 一律保留前綴)"""
+    return PLATFORM_REGIONS.get(match_id.split("_", 1)[0].upper(), default)
+
+
+def lease_summoners(conn, batch_size=LEASE_BATCH_SIZE, region=REGION_MATCH):
+    """
+    從爬取佇列中 region 區域的分區租用一批尚未搜尋的召喚師 (優先度高、最近有對局的先處理)
+    FOR UPDATE SKIP LOCKED 讓多個爬蟲程序同時租用時不會拿到同一位召喚師，
+    租約到期 (程序中斷) 後其他程序可以接手
+    """
     with conn.cursor() as cur:
-        cur.execute("SELECT puuid FROM summoners WHERE is_searched = FALSE ORDER BY created_at LIMIT 1")
-        row = cur.fetchone()
-        if row:
-            return row[0]
-        else:
-            return None
+        cur.execute("""
+            WITH picked AS (
+                SELECT id FROM summoners
+                WHERE is_searched = FALSE AND region = %s AND (leased_until IS NULL OR leased_until < NOW())
+                ORDER BY priority DESC, last_played DESC NULLS LAST, created_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ), leased AS (
+                UPDATE summoners s
+                SET leased_by = %s, leased_until = NOW() + %s * INTERVAL '1 minute'
+                FROM picked
+                WHERE s.id = picked.id
+                RETURNING s.puuid, s.priority, s.last_played, s.created_at
+            )
+            SELECT puuid FROM leased ORDER BY priority DESC, last_played DESC NULLS LAST, created_at
+        """, (region, batch_size, WORKER_ID, LEASE_MINUTES))
+        puuids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    return puuids
 
 
-def mark_summoner_as_searched(conn, puuid):
+def reclaim_own_leases(conn, region=REGION_MATCH):
+    """取回同一個 WORKER_ID 上次中斷時仍在租用中的 region 區域召喚師 (有檢查點的優先)"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE summoners SET leased_until = NOW() + %s * INTERVAL '1 minute'
+            WHERE leased_by = %s AND region = %s AND is_searched = FALSE
+            RETURNING puuid, crawl_state IS NOT NULL
+        """, (LEASE_MINUTES, WORKER_ID, region))
+        rows = cur.fetchall()
+    conn.commit()
+    return [puuid for puuid, _ in sorted(rows, key=lambda row: not row[1])]
+
+
+def release_summoners(conn, puuids):
+    """程序結束時歸還尚未處理的租約，讓其他程序立即接手"""
+    if not puuids:
+        return
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE summoners SET leased_by = NULL, leased_until = NULL
+            WHERE puuid = ANY(%s) AND leased_by = %s AND is_searched = FALSE
+        """, (list(puuids), WORKER_ID))
+    conn.commit()
+
+
+def mark_summoner_as_searched(conn, puuid, newest_match_id=None):
+    """
+    召喚師的對局都已寫入後才標記為已搜尋，並清除檢查點與租約
+    newest_match_id 為這次清單中最新的對局，其結束時間記為 crawled_until，下次只取更新的對局
+    """
     with conn.cursor() as cur:
         cur.execute("""
             UPDATE summoners 
-            SET is_searched = TRUE, last_searched = NOW()
+            SET is_searched = TRUE, last_searched = NOW(), leased_by = NULL, leased_until = NULL, crawl_state = NULL,
+                crawled_until = COALESCE(
+                    (SELECT game_end_timestamp FROM model_matches WHERE match_id = %s), crawled_until)
             WHERE puuid = %s
-        """, (puuid,))
+        """, (newest_match_id, puuid))
+    conn.commit()
+
+
+def get_crawl_start_time(conn, puuid):
+    """對局 id 清單的 startTime (epoch 秒)：上次收錄到的最新對局結束時間，最多往回 MATCH_ID_WINDOW_DAYS 天"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT crawled_until FROM summoners WHERE puuid = %s", (puuid,))
+        row = cur.fetchone()
+    conn.commit()
+    start_time = int(time.time() - MATCH_ID_WINDOW_DAYS * 24 * 3600)
+    if row and row[0]:
+        # game_end_timestamp 以本地時間存入 (datetime.fromtimestamp)，timestamp() 同樣以本地時間換算
+        start_time = max(start_time, int(row[0].timestamp()))
+    return start_time
+
+
+def load_checkpoint(conn, puuid):
+    """讀取召喚師的爬取檢查點 {"match_ids": [...], "cursor": n}，沒有時回傳 None"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT crawl_state FROM summoners WHERE puuid = %s", (puuid,))
+        row = cur.fetchone()
     conn.commit()
+    return row[0] if row else None
 
 
-def insert_summoner_if_not_exists(conn, puuid, summoner_name=None, riot_id_game_name=None, riot_id_tagline=None):
+def save_checkpoint(conn, puuid, match_ids, cursor, newest=None):
+    """
+    記錄召喚師待處理的對局 id 與已寫入到的位置 (match_ids[:cursor] 已 commit)，同時延長租約
+    newest 為清單中最新的對局 id (可能已收錄而不在 match_ids 中)，完成時交給 mark_summoner_as_searched
+    程序中斷後由同一個 WORKER_ID 或租約到期後的其他程序從 cursor 接續
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE summoners
+            SET crawl_state = %s, leased_by = %s, leased_until = NOW() + %s * INTERVAL '1 minute'
+            WHERE puuid = %s
+        """, (Json({"match_ids": match_ids, "cursor": cursor, "newest": newest}), WORKER_ID, LEASE_MINUTES, puuid))
+    conn.commit()
+
+
+def insert_summoner_if_not_exists(conn, puuid, summoner_name=None, riot_id_game_name=None, riot_id_tagline=None,
+                                  region=REGION_MATCH):
     with conn.cursor() as cur:
         try:
             cur.execute("""
-                INSERT INTO summoners (puuid, summoner_name, riot_id_game_name, riot_id_tagline)
-                VALUES (%s, %s, %s, %s)
+                INSERT INTO summoners (puuid, summoner_name, riot_id_game_name, riot_id_tagline, region)
+                VALUES (%s, %s, %s, %s, %s)
                 ON CONFLICT (puuid) DO NOTHING
-            """, (puuid, summoner_name, riot_id_game_name, riot_id_tagline))
+            """, (puuid, summoner_name, riot_id_game_name, riot_id_tagline, region))
             conn.commit()
         except Exception as e:
             conn.rollback()
             print("insert_summoner_if_not_exists error:", e)
 
 
-def match_exists(conn, match_id):
+def find_existing_matches(conn, match_ids):
+    """一次查詢整頁對局 id 中已收錄 (包含已移入封存並刪除分區) 的部分，回傳已存在的 match_id 集合"""
+    if not match_ids:
+        return set()
     with conn.cursor() as cur:
-        cur.execute("SELECT 1 FROM model_matches WHERE match_id = %s", (match_id,))
-        return cur.fetchone() is not None
+        cur.execute("""
+            SELECT match_id FROM model_matches WHERE match_id = ANY(%s)
+            UNION
+            SELECT match_id FROM retired_match_ids WHERE match_id = ANY(%s)
+        """, (list(match_ids), list(match_ids)))
+        return {row[0] for row in cur.fetchall()}
+
+
+def filter_new_matches(conn, seen, match_ids):
+    """
+    先以記憶體中的已收錄集合過濾，只有可能是新的 id 才查資料庫 (一次查詢)，
+    查到已存在的 (其他爬蟲程序寫入的) 補進集合，回傳需要抓取的對局 id
+    """
+    candidates = seen.filter_new(match_ids)
+    existing = find_existing_matches(conn, candidates)
+    for match_id in existing:
+        seen.add(match_id)
+    return [match_id for match_id in candidates if match_id not in existing]
 
 
 def count_matches(conn):
@@ -89,218 +235,211 @@ def get_account_data(game_name, tag_line):
         return None
 
 
-def get_match_ids(puuid, count=200, queue=450):
+def get_match_ids(puuid, count=100, queue=450, start=0, start_time=None, end_time=None):
     """
-    取得前N筆兩個月內的對局 id
+    取得 start_time ~ end_time (epoch 秒) 間從第 start 筆起的 count 筆對局 id (新的在前)
+    未指定時間時取兩個月內的對局
     """
     url = f"https://{REGION_MATCH}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
-    two_months_ago = int(time.time() - 60 * 24 * 3600)  # 60 天前的 epoch timestamp
-    current_time = int(time.time())
+    if start_time is None:
+        start_time = int(time.time() - MATCH_ID_WINDOW_DAYS * 24 * 3600)  # 60 天前的 epoch timestamp
+    if end_time is None:
+        end_time = int(time.time())
     params = {
-        "start": 0,
+        "start": start,
         "count": count,
         "queue": queue,
-        "startTime": two_months_ago,
-        "endTime": current_time,
+        "startTime": start_time,
+        "endTime": end_time,
         "api_key": API_KEY
     }
     response = requests.get(url, params=params)
     if response.status_code == 200:
         return response.json()
-    else:
-        print("取得比賽 id 錯誤:", response.status_code, response.text)
+    print("取得比賽 id 錯誤:", response.status_code, response.text)
+    if response.status_code == 404:
         return None
+    # 限速或伺服器錯誤不是查無對局，交由主流程稍後重試
+    raise requests.HTTPError(f"取得比賽 id 錯誤: {response.status_code}", response=response)
+
+
+def list_match_ids(puuid, start_time):
+    """
+    逐頁取得 start_time 之後的所有對局 id (最多 MATCH_ID_PAGES 頁)，不足一頁表示已取完
+    endTime 固定為開始時間，翻頁期間有新對局也不會讓 start 位移；第一頁就查無資料 (404) 時回傳 None
+    請求失敗時 get_match_ids 拋出 requests.HTTPError，不回傳不完整的清單
+    """
+    end_time = int(time.time())
+    match_ids = []
+    for page in range(MATCH_ID_PAGES):
+        page_ids = get_match_ids(puuid, MATCH_ID_PAGE_SIZE, start=page * MATCH_ID_PAGE_SIZE,
+                                 start_time=start_time, end_time=end_time)
+        if page_ids is None:
+            return match_ids if page else None
+        match_ids.extend(page_ids)
+        if len(page_ids) < MATCH_ID_PAGE_SIZE:
+            break
+        time.sleep(1)
+    return match_ids
 
 
 def get_match_details(match_id):
-    url = f"https://{REGION_MATCH}.api.riotgames.com/lol/match/v5/matches/{match_id}"
+    url = f"https://{match_region(match_id)}.api.riotgames.com/lol/match/v5/matches/{match_id}"
     params = {"api_key": API_KEY}
     response = requests.get(url, params=params)
     if response.status_code == 200:
         return response.json()
-    else:
-        print(f"取得比賽 {match_id} 詳細資料錯誤:", response.status_code, response.text)
+    print(f"取得比賽 {match_id} 詳細資料錯誤:", response.status_code, response.text)
+    if response.status_code == 404:
         return None
+    # 只有 404 表示查無此對局可以略過；其他錯誤拋出，檢查點停在這場對局之前
+    raise requests.HTTPError(f"取得比賽 {match_id} 詳細資料錯誤: {response.status_code}", response=response)
 
 
-# =========== 資料擷取函式 ===========
-def extract_features(match_data):
-    """
-    從原始對局資料中擷取精細的特徵數據
-    """
-    features = {}
-    game_duration = match_data["info"].get("gameDuration", 0)
-    features["game_duration"] = game_duration
-
-    # 初始化隊伍統計（假設隊伍 ID 為 100 與 200）
-    team_features = {
-        100: {"total_gold": 0, "total_damage_dealt": 0, "total_kills": 0, "total_assists": 0, "total_deaths": 0},
-        200: {"total_gold": 0, "total_damage_dealt": 0, "total_kills": 0, "total_assists": 0, "total_deaths": 0}
-    }
+# =========== 資料庫資料插入函式 ===========
+def get_archive_writer():
+    """封存模式 (config.ini [crawler] ARCHIVE_DIR) 的區段檔寫入器，第一次使用時建立"""
+    global _archive_writer
+    if _archive_writer is None:
+        from match_archive import ArchiveWriter
+        _archive_writer = ArchiveWriter(ARCHIVE_DIR)
+    return _archive_writer
 
-    participant_features = []
-    cc_scale = 100.0
-
-    for participant in match_data["info"]["participants"]:
-        p_feats = {}
-        p_feats["puuid"] = participant.get("puuid", "")
-        p_feats["championName"] = participant.get("championName", "")
-        p_feats["teamId"] = participant.get("teamId", 0)
-
-        challenges = participant.get("challenges", {})
-        if "damagePerMinute" in challenges:
-            p_feats["damage_per_minute"] = challenges["damagePerMinute"]
-        else:
-            total_damage = participant.get("totalDamageDealtToChampions", 0)
-            p_feats["damage_per_minute"] = total_damage / (game_duration / 60.0) if game_duration > 0 else 0
-
-        p_feats["total_damage_dealt_to_champions"] = participant.get("totalDamageDealtToChampions", 0)
-        p_feats["total_damage_taken"] = participant.get("totalDamageTaken", 0)
-        p_feats["physical_damage_dealt_to_champions"] = participant.get("physicalDamageDealtToChampions", 0)
-        p_feats["magic_damage_dealt_to_champions"] = participant.get("magicDamageDealtToChampions", 0)
-        p_feats["damage_self_mitigated"] = participant.get("damageSelfMitigated", 0)
-        p_feats["total_heal"] = participant.get("totalHeal", 0)
-        p_feats["total_heals_on_teammates"] = participant.get("totalHealsOnTeammates", 0)
-        p_feats["total_damage_shielded_on_teammates"] = participant.get("totalDamageShieldedOnTeammates", 0)
-        p_feats["time_ccing_others"] = participant.get("timeCCingOthers", 0)
-        p_feats["gold_earned"] = participant.get("goldEarned", 0)
-        p_feats["gold_spent"] = participant.get("goldSpent", 0)
-
-        total_damage_output = p_feats["total_damage_dealt_to_champions"]
-        if total_damage_output > 0:
-            p_feats["gold_per_damage_dealt"] = p_feats["gold_earned"] / total_damage_output
-        else:
-            p_feats["gold_per_damage_dealt"] = 0
-
-        total_effort = (
-                p_feats["total_damage_dealt_to_champions"] +
-                p_feats["total_damage_taken"] +
-                (p_feats["time_ccing_others"] * cc_scale) +
-                (p_feats["total_heal"] + p_feats["total_heals_on_teammates"] + p_feats[
-                    "total_damage_shielded_on_teammates"]) +
-                p_feats["damage_self_mitigated"]
-        )
-        if total_effort > 0:
-            p_feats["gold_conversion_efficiency"] = p_feats["gold_earned"] / total_effort
-        else:
-            p_feats["gold_conversion_efficiency"] = 0
-
-        p_feats["kills"] = participant.get("kills", 0)
-        p_feats["deaths"] = participant.get("deaths", 0)
-        p_feats["assists"] = participant.get("assists", 0)
-        if p_feats["deaths"] > 0:
-            p_feats["kda"] = (p_feats["kills"] + p_feats["assists"]) / p_feats["deaths"]
-        else:
-            p_feats["kda"] = p_feats["kills"] + p_feats["assists"]
-
-        participant_features.append(p_feats)
-
-        team_id = participant.get("teamId", 0)
-        if team_id in team_features:
-            team_features[team_id]["total_gold"] += p_feats["gold_earned"]
-            team_features[team_id]["total_damage_dealt"] += p_feats["total_damage_dealt_to_champions"]
-            team_features[team_id]["total_kills"] += p_feats["kills"]
-            team_features[team_id]["total_assists"] += p_feats["assists"]
-            team_features[team_id]["total_deaths"] += p_feats["deaths"]
-
-    features["participants"] = participant_features
-
-    for team in match_data["info"].get("teams", []):
-        team_id = team.get("teamId")
-        if team_id in team_features:
-            team_features[team_id]["win"] = team.get("win", False)
-    features["teams"] = team_features
-
-    if 100 in team_features and 200 in team_features:
-        features["team_gold_diff"] = team_features[100]["total_gold"] - team_features[200]["total_gold"]
-        features["team_damage_diff"] = team_features[100]["total_damage_dealt"] - team_features[200][
-            "total_damage_dealt"]
-
-    return features
 
+# model_matches 欄位對應 extract_match_info 的鍵
+MATCH_INFO_KEYS = ["matchId", "gameMode", "gameType", "gameVersion", "mapId", "queueId", "platformId",
+                   "tournamentCode", "gameName", "gameCreation", "gameDuration", "gameStartTimestamp",
+                   "gameEndTimestamp"]
 
-# =========== 資料庫資料插入函式 ===========
-def extract_match_info(raw_match):
+
+def prepare_match(raw_match):
     """
-    從原始的 Riot 對局資料中擷取基本資訊
+    擷取 model_matches 欄位與精細資料並序列化 JSON (CPU 工作)
+    回傳值只含基本型別，可交給其他程序計算後再由寫入端使用
     """
-    info = raw_match.get("info", {})
-    metadata = raw_match.get("metadata", {})
-    match_info = {
-        "matchId": metadata.get("matchId"),
-        "gameMode": info.get("gameMode"),
-        "gameType": info.get("gameType"),
-        "gameVersion": info.get("gameVersion"),
-        "mapId": info.get("mapId"),
-        "queueId": info.get("queueId"),
-        "platformId": info.get("platformId"),
-        "tournamentCode": info.get("tournamentCode"),
-        "gameName": info.get("gameName"),
-        "gameCreation": datetime.fromtimestamp(info.get("gameCreation", 0) / 1000).strftime(
-            '%Y-%m-%d %H:%M:%S') if info.get("gameCreation") else None,
-        "gameDuration": info.get("gameDuration"),
-        "gameStartTimestamp": datetime.fromtimestamp(info.get("gameStartTimestamp", 0) / 1000).strftime(
-            '%Y-%m-%d %H:%M:%S') if info.get("gameStartTimestamp") else None,
-        "gameEndTimestamp": datetime.fromtimestamp(info.get("gameEndTimestamp", 0) / 1000).strftime(
-            '%Y-%m-%d %H:%M:%S') if info.get("gameEndTimestamp") else None,
+    match_info = extract_match_info(raw_match)
+    return {
+        "match_id": match_info.get("matchId"),
+        "columns": [match_info.get(key) for key in MATCH_INFO_KEYS],
+        "match_json": json.dumps(raw_match, separators=(",", ":"), ensure_ascii=False),
+        "extract_json": json.dumps(extract_features(raw_match), separators=(",", ":"), ensure_ascii=False),
+        "participants": raw_match.get("metadata", {}).get("participants", []),
+        "end_time": match_info.get("gameEndTimestamp"),
+        "region": PLATFORM_REGIONS.get((match_info.get("platformId") or "").upper(), REGION_MATCH),
+        "patch": game_patch(match_info.get("gameVersion")),
     }
-    return match_info
 
 
-def insert_match(conn, raw_match):
+def insert_matches(conn, raw_matches, seen=None):
+    """將一批原始對局寫入 model_matches (見 insert_prepared_matches)"""
+    return insert_prepared_matches(conn, [prepare_match(raw_match) for raw_match in raw_matches], seen)
+
+
+def ensure_patch_partitions(cur, patches):
+    """model_matches 依版本分區，寫入新版本的對局前先建立分區 (每個程序每個版本只檢查一次)"""
+    for patch in sorted(set(patches) - _known_patches):
+        cur.execute("SELECT ensure_model_matches_partition(%s)", (patch,))
+        _known_patches.add(patch)
+
+
+def insert_prepared_matches(conn, prepared, seen=None):
     """
-    將從 Riot 取得的原始對局資料連同擷取出的精細資料，
-    一併插入 model_matches 表中
+    將一批 prepare_match 的結果以多列 INSERT 寫入 model_matches，
+    並把對局中所有參與者 puuid 寫入 summoners 表（若不存在），整批只 commit 一次
+    commit 成功後把對局 id 加入已收錄集合 seen，回傳實際新增的對局數
     """
-    match_info = extract_match_info(raw_match)
-    features = extract_features(raw_match)
+    if not prepared:
+        return 0
+    # 參與者最近一次出現的對局結束時間，作為爬取優先順序；依 puuid 排序插入，多個爬蟲同時寫入時鎖定順序一致
+    # 新召喚師放入對局所在區域的爬取分區
+    last_played = {}
+    for match in prepared:
+        end_time = match["end_time"]
+        for p_puuid in match["participants"]:
+            if p_puuid not in last_played or (end_time or "") > (last_played[p_puuid][0] or ""):
+                last_played[p_puuid] = (end_time, match["region"])
+    # 封存模式先寫入區段檔 (已 fsync) 再寫資料表，原始 JSON 不存入資料表；重複的對局只會在區段檔留下未被引用的資料
+    if ARCHIVE_DIR:
+        archive_refs = get_archive_writer().append_serialized(
+            [(match["match_id"], match["match_json"].encode("utf-8")) for match in prepared])
+    else:
+        archive_refs = [None] * len(prepared)
+    rows = [(*match["columns"], None if archive_ref else match["match_json"], match["extract_json"], archive_ref,
+             match["patch"]) for match, archive_ref in zip(prepared, archive_refs)]
     with conn.cursor() as cur:
         try:
-            cur.execute("""
+            ensure_patch_partitions(cur, [match["patch"] for match in prepared])
+            # 同一場對局的版本固定，(match_id, patch) 唯一即等同 match_id 唯一
+            inserted = execute_values(cur, """
                 INSERT INTO model_matches (
                     is_searched_summoners, match_id, game_mode, game_type, game_version, map_id, queue_id, 
                     platform_id, tournament_code, game_name, game_creation, game_duration, game_start_timestamp, 
-                    game_end_timestamp, match_data, extract_data
-                ) VALUES (
-                    FALSE, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                )
-                ON CONFLICT (match_id) DO NOTHING
-            """, (
-                match_info.get("matchId"),
-                match_info.get("gameMode"),
-                match_info.get("gameType"),
-                match_info.get("gameVersion"),
-                match_info.get("mapId"),
-                match_info.get("queueId"),
-                match_info.get("platformId"),
-                match_info.get("tournamentCode"),
-                match_info.get("gameName"),
-                match_info.get("gameCreation"),
-                match_info.get("gameDuration"),
-                match_info.get("gameStartTimestamp"),
-                match_info.get("gameEndTimestamp"),
-                Json(raw_match),  # 儲存原始 JSON 資料
-                Json(features)  # 儲存擷取後的精細資料
-            ))
+                    game_end_timestamp, match_data, extract_data, archive_ref, patch
+                ) VALUES %s
+                ON CONFLICT (match_id, patch) DO NOTHING
+                RETURNING match_id
+            """, rows,
+                template="(FALSE, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s::jsonb, %s, %s)",
+                fetch=True)
+            if last_played:
+                # 已搜尋過的召喚師有比 crawled_until 新 RECRAWL_DAYS 天以上的對局時放回佇列，下次只取新對局
+                # (crawled_until 為 NULL 表示從未記錄收錄到哪裡，例如舊資料或查無對局，同樣放回佇列)
+                execute_values(cur, f"""
+                    INSERT INTO summoners (puuid, last_played, region) VALUES %s
+                    ON CONFLICT (puuid) DO UPDATE
+                    SET last_played = GREATEST(summoners.last_played, EXCLUDED.last_played), is_searched = FALSE
+                    WHERE (summoners.is_searched = FALSE
+                           AND (summoners.last_played IS NULL OR summoners.last_played < EXCLUDED.last_played))
+                       OR (summoners.is_searched = TRUE
+                           AND (summoners.crawled_until IS NULL
+                                OR summoners.crawled_until < EXCLUDED.last_played - {RECRAWL_DAYS} * INTERVAL '1 day'))
+                """, sorted((p_puuid, end_time, region) for p_puuid, (end_time, region) in last_played.items()),
+                    template="(%s, %s::timestamp, %s)")
             conn.commit()
+            if seen is not None:
+                for match in prepared:
+                    seen.add(match["match_id"])
+            return len(inserted)
         except Exception as e:
             conn.rollback()
-            print("insert_match error:", e)
+            # 建立分區的交易已回滾 (或分區已被 retire 刪除)，下次重新確認
+            _known_patches.clear()
+            print("insert_prepared_matches error:", e)
+            # 交由呼叫端處理：寫入失敗的批次不可更新檢查點或標記召喚師為已搜尋
+            raise
 
 
 # =========== 主流程 ===========
+INSERT_BATCH_SIZE = 20  # 每累積幾場對局寫入一次資料庫
+COUNT_REFRESH_ROUNDS = 100  # 每幾輪重新 COUNT(*) 一次，納入其他爬蟲程序寫入的對局
+
+
 def main():
     conn = get_db_connection()
     target_matches = 5_000_000
     consecutive_errors = 0  # 連續錯誤計數器
-
-    while count_matches(conn) < target_matches:
+    # COUNT(*) 需掃描整張表，只在啟動與定期校正時執行，其餘以本程序新增的數量累加
+    current_count = count_matches(conn)
+    rounds = 0
+    # 已租用尚未處理的召喚師，先接續同一個 WORKER_ID 上次未完成的
+    leased = reclaim_own_leases(conn)
+    current_puuid = None  # 處理中的召喚師
+    seen = load_seen_matches(conn, SEEN_FILE, SEEN_CAPACITY, SEEN_ERROR_RATE)
+
+    while current_count < target_matches:
         try:
-            current_count = count_matches(conn)
+            rounds += 1
+            if rounds % COUNT_REFRESH_ROUNDS == 0:
+                current_count = count_matches(conn)
+            if rounds % SEEN_SAVE_ROUNDS == 0:
+                seen.sync(conn)
+                seen.save()
             print("目前 matches 數量:", current_count)
 
-            # 1. 取得 summoners 表中 is_searched = FALSE 的第一筆 summoner
-            summoner_puuid = get_first_unsearched_summoner(conn)
+            # 1. 從爬取佇列取得召喚師 (一次租用一批，用完再租)
+            if not leased:
+                leased = lease_summoners(conn)
+            summoner_puuid = leased.pop(0) if leased else None
             if not summoner_puuid:
                 # 若找不到，則使用初始種子召喚師並插入 summoners 表（若尚未存在）
                 account_data = get_account_data(GAME_NAME, TAG_LINE)
@@ -310,34 +449,52 @@ def main():
                 summoner_puuid = account_data.get("puuid")
                 insert_summoner_if_not_exists(conn, summoner_puuid, GAME_NAME, GAME_NAME, TAG_LINE)
             print("處理召喚師 puuid:", summoner_puuid)
-
-            # 2. 將該召喚師設為已搜尋過
-            mark_summoner_as_searched(conn, summoner_puuid)
-
-            # 3. 依據此 summoner_puuid 取得前100筆兩個月內的 ARAM 對局 id
-            match_ids = get_match_ids(summoner_puuid, count=100)
-            if match_ids is None:
-                print("無法取得對局 id，跳過此召喚師")
-                continue
-
-            # 4. 依序處理每一筆對局
-            for match_id in match_ids:
-                if match_exists(conn, match_id):
-                    print("對局已存在:", match_id)
+            # 請求失敗時放回佇列最前面，稍後從檢查點重試
+            current_puuid = summoner_puuid
+
+            # 2. 有檢查點時從上次寫入的位置接續；否則逐頁取得上次收錄之後 (最多兩個月內) 的 ARAM 對局 id，過濾後記錄檢查點
+            checkpoint = load_checkpoint(conn, summoner_puuid)
+            if checkpoint:
+                match_ids, cursor, newest = checkpoint["match_ids"], checkpoint["cursor"], checkpoint.get("newest")
+                print(f"從檢查點接續：{cursor}/{len(match_ids)}")
+            else:
+                start_time = get_crawl_start_time(conn, summoner_puuid)
+                match_ids = list_match_ids(summoner_puuid, start_time)
+                if match_ids is None:
+                    print("查無此召喚師的對局 id，跳過此召喚師")
+                    mark_summoner_as_searched(conn, summoner_puuid)
+                    current_puuid = None
                     continue
-                print("取得對局資料:", match_id)
-                raw_match = get_match_details(match_id)
-                if raw_match is None:
-                    continue
-
-                # 插入原始資料與精細資料到 model_matches 表中
-                insert_match(conn, raw_match)
-
-                # 將對局中所有參與者 puuid 寫入 summoners 表（若不存在）
-                for p_puuid in raw_match.get("metadata", {}).get("participants", []):
-                    insert_summoner_if_not_exists(conn, p_puuid)
-                # 暫停 1 秒以避免 API 請求過快
-                time.sleep(1)
+                # 以已收錄集合與一次資料庫查詢過濾所有 id，只抓取未收錄的
+                all_count = len(match_ids)
+                newest = match_ids[0] if match_ids else None
+                match_ids, cursor = filter_new_matches(conn, seen, match_ids), 0
+                print(f"{datetime.fromtimestamp(start_time):%Y-%m-%d %H:%M} 之後的對局 {all_count} 筆，"
+                      f"未收錄 {len(match_ids)} 筆")
+                save_checkpoint(conn, summoner_puuid, match_ids, cursor, newest)
+
+            # 3. 依序抓取；每寫入一批就更新檢查點 (match_ids[:cursor] 已 commit)
+            # get_match_details 請求失敗時拋出例外，這一批不寫入、檢查點不越過失敗的對局
+            pending = []
+            for index in range(cursor, len(match_ids)):
+                match_id = match_ids[index]
+                # 上次中斷前已寫入但檢查點尚未更新的對局
+                if match_id not in seen:
+                    print("取得對局資料:", match_id)
+                    raw_match = get_match_details(match_id)
+                    if raw_match is not None:
+                        pending.append(raw_match)
+                    # 暫停 1 秒以避免 API 請求過快
+                    time.sleep(1)
+                # 累積一批後連同參與者一起寫入
+                if len(pending) >= INSERT_BATCH_SIZE or index == len(match_ids) - 1:
+                    current_count += insert_matches(conn, pending, seen)
+                    pending = []
+                    save_checkpoint(conn, summoner_puuid, match_ids, index + 1, newest)
+
+            # 4. 對局都寫入後才將該召喚師設為已搜尋過，並記錄收錄到的最新對局時間
+            mark_summoner_as_searched(conn, summoner_puuid, newest)
+            current_puuid = None
 
             # 每輪處理後暫停 2 秒
             time.sleep(2)
@@ -346,6 +503,11 @@ def main():
 
         except Exception as e:
             print("發生異常：", e)
+            conn.rollback()
+            # 處理到一半的召喚師放回佇列最前面，稍後從檢查點重試
+            if current_puuid:
+                leased.insert(0, current_puuid)
+                current_puuid = None
             consecutive_errors += 1
             if consecutive_errors >= 5:
                 print("連續異常達5次，程式停止。")
@@ -353,6 +515,10 @@ def main():
             print("等待1分鐘後再繼續...")
             time.sleep(60)
 
+    # 未完成的召喚師保留檢查點，歸還租約後由其他程序接續
+    release_summoners(conn, leased)
+    seen.sync(conn)
+    seen.save()
     print("達到目標對局數量:", count_matches(conn))
     conn.close()
 
@@ -13,6 +13,13 @@ from pureARAMPredictor import ARAMPredictor
 config = configparser.ConfigParser()
 config.read('config.ini', encoding='utf-8')
 bucket_name = config['gcs']['BUCKET_NAME']
+# 模型包 (model_bundle.py，例如 aram_model_bundle.zip)；沒有設定 (預設) 或 GCS 上沒有模型包時
+# 讀取 MODEL_FILE 與三個 .pkl 輔助檔案，既有只上傳個別檔案的部署不需要修改設定
+bundle_file = config['gcs'].get('BUNDLE_FILE', '')
+# 模型檔案 (.tflite 為 export_model.py 匯出的量化模型，以 TFLite 直譯器執行)
+model_file = config['gcs'].get('MODEL_FILE', 'advanced_aram_model_v2.h5')
+# 英雄統計使用的版本 (例如 15.9)，空值時使用模型包的最新版本
+stats_patch = config['gcs'].get('STATS_PATCH', '') or None
 
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_port=1)
@@ -43,7 +50,7 @@ db.init_app(app)
 register_api_logger(app)
 
 # 建立模型預測器實例
-predictor = ARAMPredictor(bucket_name)
+predictor = ARAMPredictor(bucket_name, model_file=model_file, bundle_file=bundle_file, patch=stats_patch)
 
 
 @predict_bp.route('/predict_team', methods=['POST'])
@@ -234,7 +241,7 @@ def reload_model():
 
     try:
         # 密碼驗證成功後，重新建立新的預測器實例
-        predictor = ARAMPredictor(bucket_name)
+        predictor = ARAMPredictor(bucket_name, model_file=model_file, bundle_file=bundle_file, patch=stats_patch)
         return jsonify({"message": "模型已成功重新加載"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -249,7 +256,7 @@ def example():
 def warmup():
     # 在此處可執行預先初始化的工作，例如重新加載模型、建立連線等
     global predictor
-    predictor = ARAMPredictor(bucket_name)
+    predictor = ARAMPredictor(bucket_name, model_file=model_file, bundle_file=bundle_file, patch=stats_patch)
     # 如果有其他需要初始化的資源，也可以在這裡處理
     return 'Warmup completed', 200
 
@@ -0,0 +1,172 @@
+"""
+ETL 效能測試：
+- python：讀取完整 match_data JSON 後在 Python 端解析與彙總
+- sql：在 PostgreSQL 端以 jsonb_to_recordset 拆解並 GROUP BY 彙總
+- store：讀取 participant_store.py 產生的欄位式參與者資料庫 (PARTICIPANT_STORE)
+- file：讀取 JSONL 對局檔 (MATCH_FILE，例如 generate_matches.py 的輸出)
+- archive：循序讀取 match_archive.py 的壓縮封存 (MATCH_ARCHIVE)
+每個模式在獨立的行程中執行，回報對局/秒、峰值記憶體 (RSS)、傳輸到 Python 端的資料量，
+以及 parse / aggregate / finalize / load 各階段耗時，並確認各模式的最終統計結果一致
+預設只讀取資料；加上 --load 才會寫入統計資料表 (請只對測試資料庫使用)
+
+用法：
+    python benchmark_etl.py [python sql store file archive ...] [--load]
+"""
+import json
+import logging
+import multiprocessing
+import sys
+import time
+
+import psycopg2.extensions
+import psycopg2.extras
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組，不回報峰值記憶體
+    resource = None
+
+from calculateData import (ETL_MODES, STAGE_TIMINGS, calculate_final_stats, create_db_connection,
+                           insert_champion_stats, load_champion_mapping, load_db_config, record_stage)
+
+STAGES = ['parse', 'aggregate', 'finalize', 'load']
+
+
+class TransferCounter:
+    """累計從資料庫取得的資料量 (以文字格式長度估算網路傳輸位元組)"""
+    bytes = 0
+    rows = 0
+
+
+def counting_json_loads(raw):
+    """JSONB 欄位在解析前先記錄原始字串長度"""
+    TransferCounter.bytes += len(raw)
+    return json.loads(raw)
+
+
+class ByteCountingCursor(psycopg2.extensions.cursor):
+    """記錄每次 fetch 取得的列數與資料量的游標"""
+
+    def _count(self, rows):
+        TransferCounter.rows += len(rows)
+        for row in rows:
+            for value in row:
+                # dict/list 為 JSONB，已在 counting_json_loads 計算過
+                if value is not None and not isinstance(value, (dict, list)):
+                    TransferCounter.bytes += len(str(value))
+        return rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count([row])
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        return self._count(rows)
+
+    def fetchall(self):
+        return self._count(super().fetchall())
+
+
+def peak_rss_mb():
+    """目前行程的峰值記憶體 (MB)，無法取得時回傳 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 回報，macOS 以 bytes 回報
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_mode(mode, db_config, load=False):
+    """執行指定模式的讀取、彙總與最終統計 (load=True 時寫入統計資料表)，回傳耗時、傳輸量與結果"""
+    conn = create_db_connection(db_config, cursor_factory=ByteCountingCursor)
+    psycopg2.extras.register_default_jsonb(conn, loads=counting_json_loads)
+    try:
+        champion_dict = load_champion_mapping(conn)
+        TransferCounter.bytes = 0
+        TransferCounter.rows = 0
+        STAGE_TIMINGS.clear()
+
+        start = time.perf_counter()
+        processed_stats, records_processed = ETL_MODES[mode](conn, champion_dict)
+        stage_start = time.perf_counter()
+        final_stats = calculate_final_stats(processed_stats)
+        stage_start = record_stage('finalize', stage_start)
+        if load:
+            insert_champion_stats(conn, final_stats)
+            record_stage('load', stage_start)
+        elapsed = time.perf_counter() - start
+
+        return {
+            'mode': mode,
+            'records': records_processed,
+            'seconds': elapsed,
+            'bytes': TransferCounter.bytes,
+            'rows': TransferCounter.rows,
+            'stages': dict(STAGE_TIMINGS),
+            'peak_rss_mb': peak_rss_mb(),
+            'final_stats': final_stats
+        }
+    finally:
+        conn.close()
+
+
+def run_mode_isolated(mode, db_config, load=False):
+    """在新的行程中執行 run_mode，讓每個模式的峰值記憶體互不影響"""
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(run_mode, (mode, db_config, load))
+
+
+def same_final_stats(a, b):
+    """比較兩份最終統計結果 (浮點數取到小數第 6 位)"""
+    def normalize(stats):
+        return {
+            table: sorted(json.dumps({k: round(v, 6) if isinstance(v, float) else v for k, v in row.items()},
+                                     sort_keys=True)
+                          for row in rows)
+            for table, rows in stats.items()
+        }
+
+    return normalize(a) == normalize(b)
+
+
+def main():
+    load = '--load' in sys.argv[1:]
+    modes = [arg for arg in sys.argv[1:] if not arg.startswith('--')] or ['python', 'sql']
+    unknown = [mode for mode in modes if mode not in ETL_MODES]
+    if unknown:
+        raise SystemExit(f"未知的模式: {unknown}，可用模式：{list(ETL_MODES)}")
+    db_config = load_db_config()
+
+    results = []
+    for mode in modes:
+        logging.info(f"執行 {mode} 模式...")
+        results.append(run_mode_isolated(mode, db_config, load))
+
+    header = f"\n{'模式':<8}{'對局數':>10}{'耗時(秒)':>10}{'對局/秒':>10}{'峰值RSS(MB)':>13}" \
+             f"{'傳輸列數':>12}{'傳輸量(MB)':>12}"
+    print(header + ''.join(f"{stage:>11}" for stage in STAGES))
+    for result in results:
+        throughput = result['records'] / result['seconds'] if result['seconds'] > 0 else 0
+        rss = f"{result['peak_rss_mb']:.0f}" if result['peak_rss_mb'] is not None else '-'
+        line = (f"{result['mode']:<8}{result['records']:>10}{result['seconds']:>10.2f}{throughput:>10.1f}"
+                f"{rss:>13}{result['rows']:>12}{result['bytes'] / 1024 / 1024:>12.2f}")
+        for stage in STAGES:
+            seconds = result['stages'].get(stage)
+            line += f"{seconds:>11.2f}" if seconds is not None else f"{'-':>11}"
+        print(line)
+
+    baseline = results[0]
+    for result in results[1:]:
+        speedup = baseline['seconds'] / result['seconds'] if result['seconds'] > 0 else float('inf')
+        ratio = baseline['bytes'] / result['bytes'] if result['bytes'] > 0 else float('inf')
+        same = same_final_stats(baseline['final_stats'], result['final_stats'])
+        print(f"{result['mode']} 相對 {baseline['mode']}：速度 {speedup:.2f}x，傳輸量減少 {ratio:.1f}x，"
+              f"結果{'一致' if same else '不一致'}")
+
+
+if __name__ == "__main__":
+    main()
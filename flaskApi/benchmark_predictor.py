@@ -0,0 +1,228 @@
+"""
+預測器效能與排名品質回歸測試 (ARAMPredictor)：
+- 冷啟動：在新的行程中計時 import 與建立 ARAMPredictor (不含 GCS 下載)
+- 單筆延遲：predict_team_strength 的中位數與 p95
+- 批量吞吐量：batch_predict 在 1/126/2002/3003 組陣容 (5/9/14/15 位英雄) 時的延遲與每秒陣容數
+- 峰值記憶體 (RSS)：載入後與測試結束時
+- 排名一致性：對凍結的英雄池 (golden set) 重算 /predict_team 的前 10 名，
+  與凍結時的結果比較前 10 名重疊率與所有組合勝率排名的 Kendall tau
+
+freeze 以目前 (已確認沒問題) 的模型產生 golden set 並記錄當下的效能作為基準；
+check 與基準比較，延遲或記憶體退步超過容許比例、或排名一致性低於門檻時以 exit code 1 結束
+
+用法：
+    python benchmark_predictor.py freeze [--pools 20] [--golden benchmark_golden.json]
+    python benchmark_predictor.py check [--golden benchmark_golden.json] [--bundle-file aram_model_bundle.zip]
+                                        [--bundle-file "" --model-file advanced_aram_model_v2.h5]
+加上 --offline 時不從 GCS 下載，直接使用暫存目錄中已有的檔案
+"""
+import argparse
+import configparser
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組，不回報峰值記憶體
+    resource = None
+
+# 批量測試的英雄池大小 (陣容數 C(n, 5) 為 1/126/2002/3003)
+BATCH_POOL_SIZES = (5, 9, 14, 15)
+GOLDEN_POOL_SIZE = 15
+TOP_K = 10
+# 預設門檻：效能以凍結時的基準為準，允許的退步比例；排名一致性為絕對門檻 (取所有英雄池中最差的值)
+THRESHOLDS = {
+    "latency_regression": 0.25,
+    "cold_load_regression": 0.25,
+    "rss_regression": 0.15,
+    "min_top10_overlap": 0.8,
+    "min_kendall_tau": 0.95,
+}
+
+
+def peak_rss_mb():
+    """目前行程的峰值記憶體 (MB)，無法取得時回傳 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 回報，macOS 以 bytes 回報
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def timed(func, repeat):
+    """執行 func repeat 次 (先預熱一次)，回傳每次耗時 (毫秒)"""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def pool_scores(predictor, pool):
+    """與 /predict_team 相同產生英雄池的所有 5 人組合並批量預測"""
+    teams = [list(team) for team in itertools.combinations(pool, 5)]
+    return np.array(predictor.batch_predict(teams), dtype=np.float64)
+
+
+def top_k(scores, k=TOP_K):
+    """勝率最高的 k 組 (組合索引，穩定排序)"""
+    return [int(i) for i in np.argsort(-scores, kind="stable")[:k]]
+
+
+def run_benchmark(bucket_name, model_file, bundle_file, offline, golden, pools=0, repeat=20, seed=42):
+    """在新的行程中執行：載入預測器、量測效能並計算 golden set (pools > 0 時產生新的英雄池)"""
+    start = time.perf_counter()
+    from pureARAMPredictor import ARAMPredictor
+    predictor = ARAMPredictor(bucket_name, model_file=model_file, download=not offline, bundle_file=bundle_file)
+    result = {"model_file": bundle_file or model_file, "cold_load_seconds": time.perf_counter() - start,
+              "load_rss_mb": peak_rss_mb()}
+
+    champions = sorted(predictor.champion_to_idx)
+    rng = np.random.default_rng(seed)
+    single_team = [str(champ) for champ in rng.choice(champions, 5, replace=False)]
+    single = timed(lambda: predictor.predict_team_strength(single_team), repeat)
+    result["single_ms"] = {"p50": float(np.median(single)), "p95": float(np.percentile(single, 95))}
+
+    result["batch"] = {}
+    for pool_size in BATCH_POOL_SIZES:
+        teams = [list(team) for team in itertools.combinations(rng.choice(champions, pool_size, replace=False), 5)]
+        timings = timed(lambda: predictor.batch_predict(teams), max(3, repeat // 4))
+        median = float(np.median(timings))
+        # 以實際預測的陣容數計算 (舊的基準以 "1001" 記錄 14 位英雄的結果，與 "2002" 不比較)
+        result["batch"][str(len(teams))] = {"p50_ms": median, "combos_per_second": len(teams) / median * 1000}
+
+    if pools:
+        golden = {"pools": [[str(champ) for champ in rng.choice(champions, GOLDEN_POOL_SIZE, replace=False)]
+                            for _ in range(pools)]}
+    from scipy.stats import kendalltau
+    ranking = []
+    scores_by_pool = []
+    for index, pool in enumerate(golden["pools"]):
+        scores = pool_scores(predictor, pool)
+        scores_by_pool.append([round(float(score), 6) for score in scores])
+        if "scores" in golden:
+            expected = np.array(golden["scores"][index])
+            overlap = len(set(top_k(scores)) & set(top_k(expected))) / TOP_K
+            ranking.append({"top10_overlap": overlap, "kendall_tau": float(kendalltau(scores, expected)[0]),
+                            "max_abs_delta": float(np.abs(scores - expected).max())})
+    result["pools"] = golden["pools"]
+    result["scores"] = scores_by_pool
+    result["ranking"] = ranking
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_isolated(*args, **kwargs):
+    """在新的行程中執行 run_benchmark，冷啟動時間與峰值記憶體不受目前行程影響"""
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(run_benchmark, args, kwargs)
+
+
+def performance_summary(result):
+    """golden set 中記錄的效能基準"""
+    return {
+        "cold_load_seconds": result["cold_load_seconds"],
+        "single_ms": result["single_ms"]["p50"],
+        "batch_ms": {size: batch["p50_ms"] for size, batch in result["batch"].items()},
+        "peak_rss_mb": result["peak_rss_mb"],
+    }
+
+
+def print_result(result):
+    rss = lambda value: f"{value:.0f}" if value is not None else "-"
+    print(f"\n模型: {result['model_file']}")
+    print(f"冷啟動: {result['cold_load_seconds']:.2f} 秒，載入後 RSS {rss(result['load_rss_mb'])} MB，"
+          f"峰值 RSS {rss(result['peak_rss_mb'])} MB")
+    print(f"單筆預測: p50 {result['single_ms']['p50']:.2f} ms，p95 {result['single_ms']['p95']:.2f} ms")
+    print(f"{'陣容數':>8}{'延遲(ms)':>12}{'陣容/秒':>12}")
+    for size, batch in result["batch"].items():
+        print(f"{size:>8}{batch['p50_ms']:>12.2f}{batch['combos_per_second']:>12.0f}")
+    if result["ranking"]:
+        overlaps = [item["top10_overlap"] for item in result["ranking"]]
+        taus = [item["kendall_tau"] for item in result["ranking"]]
+        deltas = [item["max_abs_delta"] for item in result["ranking"]]
+        print(f"排名一致性 ({len(overlaps)} 個英雄池)：前 10 名重疊率 平均 {np.mean(overlaps):.3f} / 最低 {min(overlaps):.2f}，"
+              f"Kendall tau 平均 {np.mean(taus):.4f} / 最低 {min(taus):.4f}，勝率最大差異 {max(deltas):.2e}")
+
+
+def check_thresholds(result, baseline, thresholds):
+    """回傳未通過的項目列表"""
+    failures = []
+
+    def regressed(name, value, base, tolerance):
+        if value is not None and base and value > base * (1 + tolerance):
+            failures.append(f"{name}: {value:.2f} 超過基準 {base:.2f} 的 {1 + tolerance:.2f} 倍")
+
+    current = performance_summary(result)
+    regressed("冷啟動(秒)", current["cold_load_seconds"], baseline["cold_load_seconds"],
+              thresholds["cold_load_regression"])
+    regressed("單筆延遲(ms)", current["single_ms"], baseline["single_ms"], thresholds["latency_regression"])
+    for size, value in current["batch_ms"].items():
+        regressed(f"{size} 組陣容延遲(ms)", value, baseline["batch_ms"].get(size), thresholds["latency_regression"])
+    regressed("峰值 RSS(MB)", current["peak_rss_mb"], baseline["peak_rss_mb"], thresholds["rss_regression"])
+
+    worst_overlap = min(item["top10_overlap"] for item in result["ranking"])
+    worst_tau = min(item["kendall_tau"] for item in result["ranking"])
+    if worst_overlap < thresholds["min_top10_overlap"]:
+        failures.append(f"前 10 名重疊率 {worst_overlap:.2f} 低於 {thresholds['min_top10_overlap']}")
+    if worst_tau < thresholds["min_kendall_tau"]:
+        failures.append(f"Kendall tau {worst_tau:.4f} 低於 {thresholds['min_kendall_tau']}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ARAMPredictor 效能與排名品質回歸測試")
+    parser.add_argument("command", choices=["freeze", "check"])
+    parser.add_argument("--golden", default="benchmark_golden.json")
+    parser.add_argument("--bundle-file", default="aram_model_bundle.zip", help="模型包，空字串時改用 --model-file")
+    parser.add_argument("--model-file", default="advanced_aram_model_v2.h5")
+    parser.add_argument("--pools", type=int, default=20, help="freeze 時產生的英雄池數 (每個 15 位英雄)")
+    parser.add_argument("--repeat", type=int, default=20, help="單筆延遲的量測次數")
+    parser.add_argument("--offline", action="store_true", help="不從 GCS 下載，使用暫存目錄中已有的檔案")
+    for name, value in THRESHOLDS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=value)
+    args = parser.parse_args()
+    thresholds = {name: getattr(args, name) for name in THRESHOLDS}
+
+    config = configparser.ConfigParser()
+    config.read('config.ini', encoding='utf-8')
+    bucket_name = config['gcs']['BUCKET_NAME'] if config.has_section('gcs') else None
+
+    if args.command == "freeze":
+        result = run_isolated(bucket_name, args.model_file, args.bundle_file, args.offline, None, pools=args.pools, repeat=args.repeat)
+        print_result(result)
+        golden = {
+            "model_file": result["model_file"],
+            "frozen_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "pools": result["pools"],
+            "scores": result["scores"],
+            "baseline": performance_summary(result),
+        }
+        with open(args.golden, "w", encoding="utf-8") as f:
+            json.dump(golden, f, ensure_ascii=False)
+        print(f"golden set 已寫入 {args.golden}")
+        return
+
+    with open(args.golden, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    result = run_isolated(bucket_name, args.model_file, args.bundle_file, args.offline, golden, repeat=args.repeat)
+    print_result(result)
+    failures = check_thresholds(result, golden["baseline"], thresholds)
+    if failures:
+        print("\n未通過：")
+        for failure in failures:
+            print(f"- {failure}")
+        sys.exit(1)
+    print("\n全部通過")
+
+
+if __name__ == "__main__":
+    main()
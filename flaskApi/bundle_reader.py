@@ -0,0 +1 @@
+../bundle_reader.py
\ No newline at end of file
@@ -1,8 +1,17 @@
+"""
+計算 ARAM 英雄統計並寫入統計資料表 (ETL_MODE 選擇資料來源，見 main)
+部分模式需要 requirements.txt 以外的選用套件 (只在使用該模式時才匯入)：
+    ETL_MODE=archive  zstandard (讀取 match_archive.py 的壓縮封存)
+    ETL_MODE=store    pyarrow (讀取 participant_store.py 的欄位式參與者資料庫)
+"""
+import csv
+import gzip
+import io
 import json
+import time
 import pandas as pd
 import psycopg2
 from psycopg2 import sql
-from psycopg2.extras import execute_batch
 import numpy as np
 from datetime import datetime
 from collections import defaultdict, Counter
@@ -10,11 +19,36 @@ import logging
 import os
 from tqdm import tqdm
 
+# 版本函式與爬蟲、訓練共用 (flaskApi/patch_versions.py 為指向根目錄 patch_versions.py 的符號連結)
+from patch_versions import game_patch, parse_version_window, patch_key
+
 # 設定日誌
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# 各階段累計耗時 (秒)：parse (讀取與拆解)、aggregate (彙總)、finalize (計算最終統計)、load (寫入統計資料表)
+STAGE_TIMINGS = defaultdict(float)
+
+
+def record_stage(stage, start):
+    """累計一個階段從 start 到現在的耗時，回傳現在時間作為下一階段的起點"""
+    now = time.perf_counter()
+    STAGE_TIMINGS[stage] += now - start
+    return now
+
+
 # 資料庫連線設定
-def create_db_connection(config):
+def load_db_config():
+    """設定資料庫連線資訊，實際使用時應從環境變數或設定檔讀取"""
+    return {
+        'host': os.environ.get('DB_HOST', 'localhost'),
+        'port': int(os.environ.get('DB_PORT', '5432')),
+        'user': os.environ.get('DB_USER', 'postgres'),
+        'password': os.environ.get('DB_PASSWORD', 'aa030566'),
+        'database': os.environ.get('DB_NAME', 'aram')
+    }
+
+
+def create_db_connection(config, cursor_factory=None):
     """建立 PostgreSQL 資料庫連線"""
     try:
         conn = psycopg2.connect(
@@ -22,7 +56,8 @@ def create_db_connection(config):
             port=config['port'],
             user=config['user'],
             password=config['password'],
-            database=config['database']
+            database=config['database'],
+            cursor_factory=cursor_factory
         )
         return conn
     except Exception as e:
@@ -40,13 +75,43 @@ def extract_match_data(row):
         return None
 
 
-def fetch_data_in_batches(conn, table_name, batch_size=5000):
-    """分批次從資料庫讀取資料"""
+def load_version_window(conn, spec=None):
+    """
+    ETL_VERSIONS 環境變數指定的版本區間 (見 parse_version_window)，區間與最新版本依 model_match_patches 計算
+    (包含已移入封存的版本，封存模式仍可讀取)
+    """
+    spec = spec if spec is not None else os.environ.get('ETL_VERSIONS', '')
+    if not spec.strip():
+        return None
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('model_match_patches') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute("SELECT patch FROM model_match_patches")
+            available = [row[0] for row in cursor.fetchall()]
+        else:
+            available = []
+    conn.commit()
+    versions = parse_version_window(spec, available)
+    logging.info(f"版本區間 {spec}: {versions}")
+    if not versions:
+        raise ValueError(f"版本區間 {spec} 沒有符合的版本，可用版本：{sorted(available, key=patch_key)}")
+    return versions
+
+
+def version_of(match_data):
+    """對局的主版本號，例如 "15.1.649.4112" -> "15.1" (與 model_matches.patch 相同)"""
+    return game_patch(match_data.get('info', {}).get('gameVersion'))
+
+
+def fetch_data_in_batches(conn, table_name, batch_size=5000, versions=None):
+    """分批次從資料庫讀取資料；指定 versions 時只掃描對應的版本分區"""
     cursor = conn.cursor()
     offset = 0
+    version_filter = "AND patch = ANY(%s) " if versions else ""
+    params = (list(versions),) if versions else ()
 
     # 先獲取總記錄數
-    cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+    cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE game_mode = 'ARAM' {version_filter}", params)
     total_rows = cursor.fetchone()[0]
 
     # 設定進度條
@@ -56,8 +121,10 @@ def fetch_data_in_batches(conn, table_name, batch_size=5000):
                 f"SELECT id, is_searched_summoners, match_id, game_mode, game_type, "
                 f"game_version, match_data FROM {table_name} "
                 f"WHERE game_mode = 'ARAM' "  # 只處理 ARAM 對局
+                f"{version_filter}"
                 f"ORDER BY id "
-                f"LIMIT {batch_size} OFFSET {offset}"
+                f"LIMIT {batch_size} OFFSET {offset}",
+                params
             )
 
             rows = cursor.fetchall()
@@ -136,18 +203,92 @@ def find_champion_in_dict(champion_name, champion_dict):
     return None
 
 
-def process_match_data_batch(batch_df, champion_dict):
-    """處理一批次的比賽資料"""
-    processed_stats = {
+def new_processed_stats():
+    """
+    建立中間統計資料的容器
+    版本、對位與協同資料只保留 [場次, 勝場] 計數器，各 ETL 模式共用同一格式
+    符文與裝備依分組鍵保留 [場次, 勝場, 範例 id]，範例 (完整符文頁/裝備) 以整數 tuple 儲存並共用 id
+    """
+    return {
         'champions': {},  # 英雄基本統計
-        'runes': defaultdict(list),  # 符文構建
-        'builds': defaultdict(list),  # 裝備構建
+        'runes': defaultdict(dict),  # 符文構建 {(主系, 主系第一個符文, 副系): [場次, 勝場, 符文頁 id]}
+        'builds': defaultdict(dict),  # 裝備構建 {前三件裝備排序後的 tuple: [場次, 勝場, 裝備 id]}
+        'rune_totals': Counter(),  # 各英雄有符文資料的場次 (符文選用率分母)
+        'build_totals': Counter(),  # 各英雄的總場次 (裝備選用率分母)
+        'rune_pages': {},  # 符文頁 (主系, 副系, (符文...), (能力碎片...)) -> id
+        'item_builds': {},  # 裝備 (依欄位順序的裝備 id...) -> id
         'skills': defaultdict(list),  # 技能順序
-        'versions': defaultdict(lambda: defaultdict(list)),  # 版本資料
-        'matchups': defaultdict(lambda: defaultdict(list)),  # 對位資料
-        'synergies': defaultdict(lambda: defaultdict(list))  # 協同資料
+        'versions': defaultdict(lambda: defaultdict(lambda: [0, 0])),  # 版本資料 [場次, 勝場]
+        'matchups': defaultdict(lambda: defaultdict(lambda: [0, 0])),  # 對位資料 [場次, 勝場]
+        'synergies': defaultdict(lambda: defaultdict(lambda: [0, 0]))  # 協同資料 [場次, 勝場]
     }
 
+
+def count_result(counter, wins, games=1):
+    """累加 [場次, 勝場] 計數器，wins 可為單場勝負 (bool) 或勝場數"""
+    counter[0] += games
+    counter[1] += int(wins)
+
+
+def intern_key(table, key):
+    """將整數 tuple 對應到小整數 id，相同內容共用同一個 id"""
+    key_id = table.get(key)
+    if key_id is None:
+        key_id = table[key] = len(table)
+    return key_id
+
+
+def count_loadout(groups, interned, key, exemplar, wins, games=1):
+    """累加符文/裝備分組的 [場次, 勝場]，分組第一次出現時保存範例 id"""
+    group = groups.get(key)
+    if group is None:
+        groups[key] = [games, int(wins), intern_key(interned, exemplar)]
+    else:
+        group[0] += games
+        group[1] += int(wins)
+
+
+def canonical_rune_page(perks):
+    """
+    將 perks 結構轉成 (分組鍵, 符文頁)：
+    分組鍵 = (主系, 主系第一個符文, 副系)，符文頁 = (主系, 副系, (所有符文...), (能力碎片...))
+    結構不完整時回傳 None
+    """
+    try:
+        styles = perks['styles']
+        key = (styles[0]['style'], styles[0]['selections'][0]['perk'], styles[1]['style'])
+        runes = tuple(selection['perk'] for style in styles for selection in style['selections'])
+    except (KeyError, IndexError, TypeError):
+        return None
+
+    shards = ()
+    if 'statPerks' in perks:
+        stat_perks = perks['statPerks']
+        shards = (stat_perks.get('offense', 0), stat_perks.get('flex', 0), stat_perks.get('defense', 0))
+    return key, (key[0], key[2], runes, shards)
+
+
+def count_rune_page(processed_stats, champion_id, win, rune_page):
+    """記錄一筆符文資料，rune_page 為 None (結構不完整) 時只計入總數"""
+    processed_stats['rune_totals'][champion_id] += 1
+    if rune_page:
+        key, page = rune_page
+        count_loadout(processed_stats['runes'][champion_id], processed_stats['rune_pages'], key, page, win)
+
+
+def count_build(processed_stats, champion_id, win, items):
+    """記錄一筆裝備資料 (items 為依欄位順序的有效裝備 id)，至少 3 件裝備才依前三件分組"""
+    processed_stats['build_totals'][champion_id] += 1
+    if len(items) >= 3:
+        count_loadout(processed_stats['builds'][champion_id], processed_stats['item_builds'],
+                      tuple(sorted(items[:3])), items, win)
+
+
+def process_match_data_batch(batch_df, champion_dict, processed_stats=None):
+    """處理一批次的比賽資料 (傳入 processed_stats 時直接累加到其中)"""
+    if processed_stats is None:
+        processed_stats = new_processed_stats()
+
     for _, row in batch_df.iterrows():
         match_data = extract_match_data(row)
         if not match_data:
@@ -206,7 +347,7 @@ def process_match_data_batch(batch_df, champion_dict):
                             champ1, champ2 = champ2, champ1
 
                         # 記錄協同資料
-                        processed_stats['synergies'][champ1][champ2].append(win)
+                        count_result(processed_stats['synergies'][champ1][champ2], win)
 
             # 處理每名參與者的詳細數據
             for participant in participants:
@@ -235,7 +376,7 @@ def process_match_data_batch(batch_df, champion_dict):
                         if opponent_champion:
                             opponent_std_id = find_champion_in_dict(opponent_champion, champion_dict)
                             if opponent_std_id:
-                                processed_stats['matchups'][std_champion_id][opponent_std_id].append(win)
+                                count_result(processed_stats['matchups'][std_champion_id][opponent_std_id], win)
 
                 # 累積基本統計
                 if std_champion_id not in processed_stats['champions']:
@@ -278,43 +419,22 @@ def process_match_data_batch(batch_df, champion_dict):
                     champ_stats['team_damage_percentage'] += damage_percent
                     champ_stats['team_damage_taken_percentage'] += damage_taken_percent
 
-                # 處理符文資料
+                # 符文與裝備在解析時就轉成整數 tuple 並分組計數
                 if 'perks' in participant:
-                    perks = participant['perks']
-                    rune_data = {
-                        'champion_id': std_champion_id,
-                        'version': game_version,
-                        'win': win,
-                        'perks': perks
-                    }
-                    processed_stats['runes'][std_champion_id].append(rune_data)
-
-                # 處理裝備資料
+                    count_rune_page(processed_stats, std_champion_id, win,
+                                    canonical_rune_page(participant['perks']))
                 items = []
                 for i in range(7):  # item0 - item6
                     item_id = participant.get(f'item{i}', 0)
                     if item_id and item_id > 0:
                         items.append(item_id)
-
-                build_data = {
-                    'champion_id': std_champion_id,
-                    'version': game_version,
-                    'win': win,
-                    'items': items
-                }
-                processed_stats['builds'][std_champion_id].append(build_data)
+                count_build(processed_stats, std_champion_id, win, tuple(items))
 
                 # 處理版本資料
                 # 只保留主版本號，例如 "15.1.649.4112" -> "15.1"
                 if game_version and '.' in game_version:
                     version_short = '.'.join(game_version.split('.')[:2])
-                    version_data = processed_stats['versions'][std_champion_id][version_short]
-                    version_data.append({
-                        'win': win,
-                        'damage_dealt': participant.get('totalDamageDealtToChampions', 0),
-                        'damage_taken': participant.get('totalDamageTaken', 0),
-                        'healing': total_heal + healing_done
-                    })
+                    count_result(processed_stats['versions'][std_champion_id][version_short], win)
 
         except Exception as e:
             logging.error(f"處理比賽資料錯誤: {e}, match_id: {row.get('match_id', 'unknown')}")
@@ -323,19 +443,558 @@ def process_match_data_batch(batch_df, champion_dict):
     return processed_stats
 
 
+def collect_stats_python(conn, champion_dict, batch_size=1000, versions=None):
+    """Python 模式：讀取完整 match_data JSON 後在 Python 端解析與彙總"""
+    all_processed_stats = new_processed_stats()
+    records_processed = 0
+
+    stage_start = time.perf_counter()
+    for batch_df in fetch_data_in_batches(conn, 'model_matches', batch_size, versions):
+        stage_start = record_stage('parse', stage_start)
+        records_processed += len(batch_df)
+        process_match_data_batch(batch_df, champion_dict, all_processed_stats)
+        stage_start = record_stage('aggregate', stage_start)
+    record_stage('parse', stage_start)
+
+    return all_processed_stats, records_processed
+
+
+def read_match_file(path, batch_size, versions=None):
+    """分批讀取 JSONL 對局檔 (每行一場 match-v5 JSON，可為 .gz)，只保留 ARAM 對局 (與 versions 中的版本)"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        rows = []
+        for line in f:
+            if not line.strip():
+                continue
+            match_data = json.loads(line)
+            if match_data.get('info', {}).get('gameMode') != 'ARAM':
+                continue
+            if versions and version_of(match_data) not in versions:
+                continue
+            rows.append({'match_id': match_data.get('metadata', {}).get('matchId'), 'match_data': match_data})
+            if len(rows) >= batch_size:
+                yield pd.DataFrame(rows)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows)
+
+
+def collect_stats_file(conn, champion_dict, path=None, batch_size=1000, versions=None):
+    """檔案模式：從 MATCH_FILE 指定的 JSONL 對局檔 (例如 generate_matches.py 的輸出) 讀取並以 Python 模式彙總"""
+    path = path or os.environ.get('MATCH_FILE', '../matches.jsonl.gz')
+    all_processed_stats = new_processed_stats()
+    records_processed = 0
+
+    logging.info(f"正在讀取對局檔: {path}")
+    stage_start = time.perf_counter()
+    for batch_df in read_match_file(path, batch_size, versions):
+        stage_start = record_stage('parse', stage_start)
+        records_processed += len(batch_df)
+        process_match_data_batch(batch_df, champion_dict, all_processed_stats)
+        stage_start = record_stage('aggregate', stage_start)
+    record_stage('parse', stage_start)
+
+    return all_processed_stats, records_processed
+
+
+def read_match_archive(archive_dir, batch_size, versions=None):
+    """
+    依區段與位移順序讀取 match_archive.py 的壓縮封存 (每個 zstd frame 一場對局，frame 標頭記錄字典 id)，
+    只保留 ARAM 對局 (與 versions 中的版本)；重複寫入的對局只取第一次
+    """
+    import zstandard as zstd
+
+    dictionaries = {}
+    dictionary_dir = os.path.join(archive_dir, 'dictionaries')
+    for filename in os.listdir(dictionary_dir) if os.path.isdir(dictionary_dir) else []:
+        if filename.endswith('.zdict'):
+            with open(os.path.join(dictionary_dir, filename), 'rb') as f:
+                dictionary = zstd.ZstdCompressionDict(f.read())
+            dictionaries[dictionary.dict_id()] = dictionary
+    decompressors = {}
+
+    segment_dir = os.path.join(archive_dir, 'segments')
+    seen = set()
+    rows = []
+    for index_name in sorted(name for name in os.listdir(segment_dir) if name.endswith('.idx')):
+        base = os.path.join(segment_dir, index_name[:-4])
+        with open(base + '.idx', 'r', encoding='utf-8') as index, open(base + '.zst', 'rb') as data:
+            for line in index:
+                match_id, offset, length = line.rstrip('\n').split('\t')
+                if match_id in seen:
+                    continue
+                seen.add(match_id)
+                data.seek(int(offset))
+                frame = data.read(int(length))
+                dict_id = zstd.get_frame_parameters(frame).dict_id
+                if dict_id not in decompressors:
+                    decompressors[dict_id] = zstd.ZstdDecompressor(dict_data=dictionaries.get(dict_id))
+                match_data = json.loads(decompressors[dict_id].decompress(frame))
+                if match_data.get('info', {}).get('gameMode') != 'ARAM':
+                    continue
+                if versions and version_of(match_data) not in versions:
+                    continue
+                rows.append({'match_id': match_id, 'match_data': match_data})
+                if len(rows) >= batch_size:
+                    yield pd.DataFrame(rows)
+                    rows = []
+    if rows:
+        yield pd.DataFrame(rows)
+
+
+def collect_stats_archive(conn, champion_dict, archive_dir=None, batch_size=1000, versions=None):
+    """封存模式：循序讀取 MATCH_ARCHIVE 目錄的壓縮對局 (model_matches 不再存 match_data 時使用)"""
+    archive_dir = archive_dir or os.environ.get('MATCH_ARCHIVE', '../match_archive')
+    all_processed_stats = new_processed_stats()
+    records_processed = 0
+
+    logging.info(f"正在讀取對局封存: {archive_dir}")
+    stage_start = time.perf_counter()
+    for batch_df in read_match_archive(archive_dir, batch_size, versions):
+        stage_start = record_stage('parse', stage_start)
+        records_processed += len(batch_df)
+        process_match_data_batch(batch_df, champion_dict, all_processed_stats)
+        stage_start = record_stage('aggregate', stage_start)
+    record_stage('parse', stage_start)
+
+    return all_processed_stats, records_processed
+
+
+# ==================== SQL 下推模式 ====================
+# 在 PostgreSQL 端用 jsonb_to_recordset 把每場對局拆成參與者資料列，
+# 英雄統計、版本、對位、協同、符文與裝備直接以 GROUP BY 彙總，Python 端只接收精簡的結果集
+
+# 每位參與者一列的暫存表 (交易結束時自動刪除)
+# 英雄統計依首次出場順序回傳，讓同勝率英雄的排名與 Python 模式一致
+SQL_CREATE_PARTICIPANTS = """
+    CREATE TEMP TABLE etl_participants ON COMMIT DROP AS
+    -- match_data 只解壓一次 (MATERIALIZED)，避免每個 -> 運算都重新讀取整份 TOAST 資料
+    WITH raw_matches AS MATERIALIZED (
+        SELECT m.id AS match_row_id, m.match_data -> 'info' AS info
+        FROM model_matches m
+        WHERE m.game_mode = 'ARAM'
+          -- 版本區間：常數陣列讓規劃器只掃描對應的分區
+          AND (%(versions)s::text[] IS NULL OR m.patch = ANY(%(versions)s::text[]))
+    ), aram_matches AS (
+        SELECT match_row_id, info,
+               jsonb_path_query_first(info, '$.teams[*] ? (@.win == true).teamId')::int AS winning_team_id
+        FROM raw_matches
+        WHERE COALESCE((info ->> 'gameDuration')::int, 0) >= 300
+    )
+    SELECT am.match_row_id,
+           p.ordinality AS participant_order,
+           am.info ->> 'gameVersion' AS game_version,
+           p."championName" AS champion_name,
+           p."teamId" AS team_id,
+           p."teamId" = am.winning_team_id AS win,
+           COALESCE(p.kills, 0) AS kills,
+           COALESCE(p.deaths, 0) AS deaths,
+           COALESCE(p.assists, 0) AS assists,
+           COALESCE(p."totalDamageDealtToChampions", 0) AS damage_dealt,
+           COALESCE(p."totalDamageTaken", 0) AS damage_taken,
+           COALESCE(p."totalHeal", 0) AS healing,
+           COALESCE(p."totalHealsOnTeammates", 0) AS healing_done,
+           COALESCE((p.challenges ->> 'teamDamagePercentage')::float8, 0) AS team_damage_percentage,
+           COALESCE((p.challenges ->> 'damageTakenOnTeamPercentage')::float8, 0) AS team_damage_taken_percentage,
+           p.perks,
+           -- 有效裝備 (依欄位順序，略過空欄位)
+           ARRAY(SELECT item
+                 FROM unnest(ARRAY[p.item0, p.item1, p.item2, p.item3, p.item4, p.item5, p.item6])
+                      WITH ORDINALITY AS slot(item, n)
+                 WHERE item > 0
+                 ORDER BY n) AS items
+    FROM aram_matches am
+    CROSS JOIN LATERAL ROWS FROM (jsonb_to_recordset(am.info -> 'participants') AS (
+        "championId" int, "championName" text, "teamId" int,
+        kills float8, deaths float8, assists float8,
+        "totalDamageDealtToChampions" float8, "totalDamageTaken" float8,
+        "totalHeal" float8, "totalHealsOnTeammates" float8,
+        challenges jsonb, perks jsonb,
+        item0 int, item1 int, item2 int, item3 int, item4 int, item5 int, item6 int
+    )) WITH ORDINALITY AS p
+    WHERE am.winning_team_id IS NOT NULL
+      AND COALESCE(p."championId", 0) <> 0
+      AND COALESCE(p."championName", '') <> ''
+"""
+
+SQL_CHAMPION_TOTALS = """
+    SELECT champion_name, count(*), count(*) FILTER (WHERE win),
+           sum(kills), sum(deaths), sum(assists), sum(damage_dealt), sum(damage_taken),
+           sum(healing), sum(healing_done), sum(team_damage_percentage), sum(team_damage_taken_percentage)
+    FROM etl_participants
+    GROUP BY champion_name
+    ORDER BY min(ARRAY[match_row_id, participant_order])
+"""
+
+# 只保留主版本號，例如 "15.1.649.4112" -> "15.1"
+SQL_VERSION_TOTALS = """
+    SELECT champion_name, split_part(game_version, '.', 1) || '.' || split_part(game_version, '.', 2),
+           count(*), count(*) FILTER (WHERE win)
+    FROM etl_participants
+    WHERE strpos(game_version, '.') > 0
+    GROUP BY 1, 2
+"""
+
+SQL_MATCHUP_TOTALS = """
+    SELECT a.champion_name, b.champion_name, count(*), count(*) FILTER (WHERE a.win)
+    FROM etl_participants a
+    JOIN etl_participants b
+      ON b.match_row_id = a.match_row_id
+     AND b.team_id = CASE WHEN a.team_id = 100 THEN 200 ELSE 100 END
+    GROUP BY 1, 2
+"""
+
+# 同隊英雄兩兩配對，每組只取一次 (名稱較小者在前)
+SQL_SYNERGY_TOTALS = """
+    SELECT a.champion_name, b.champion_name, count(*), count(*) FILTER (WHERE a.win)
+    FROM etl_participants a
+    JOIN etl_participants b
+      ON b.match_row_id = a.match_row_id
+     AND b.team_id = a.team_id
+     AND a.champion_name < b.champion_name
+    WHERE a.team_id IN (100, 200)
+    GROUP BY 1, 2
+"""
+
+# 各英雄的符文與裝備總場次 (選用率分母)
+SQL_LOADOUT_TOTALS = """
+    SELECT champion_name, count(*) FILTER (WHERE perks IS NOT NULL), count(*)
+    FROM etl_participants
+    GROUP BY champion_name
+"""
+
+# 符文依 (主系, 主系第一個符文, 副系) 分組，範例取每組最早出現的一筆
+SQL_RUNE_GROUPS = """
+    WITH pages AS (
+        SELECT champion_name, win, match_row_id, participant_order,
+               (perks #>> '{styles,0,style}')::int AS primary_style,
+               (perks #>> '{styles,0,selections,0,perk}')::int AS primary_rune,
+               (perks #>> '{styles,1,style}')::int AS secondary_style,
+               jsonb_path_query_array(perks, '$.styles[*].selections[*].perk') AS rune_options,
+               CASE WHEN perks ? 'statPerks' THEN jsonb_build_array(
+                   COALESCE((perks #>> '{statPerks,offense}')::int, 0),
+                   COALESCE((perks #>> '{statPerks,flex}')::int, 0),
+                   COALESCE((perks #>> '{statPerks,defense}')::int, 0)
+               ) ELSE '[]'::jsonb END AS shard_options
+        FROM etl_participants
+        WHERE perks IS NOT NULL
+    ), valid_pages AS (
+        SELECT * FROM pages
+        WHERE primary_style IS NOT NULL AND primary_rune IS NOT NULL AND secondary_style IS NOT NULL
+    ), groups AS (
+        SELECT champion_name, primary_style, primary_rune, secondary_style,
+               count(*) AS games, count(*) FILTER (WHERE win) AS wins,
+               min(ARRAY[match_row_id, participant_order]) AS first_seen
+        FROM valid_pages
+        GROUP BY 1, 2, 3, 4
+    ), exemplars AS (
+        SELECT DISTINCT ON (champion_name, primary_style, primary_rune, secondary_style)
+               champion_name, primary_style, primary_rune, secondary_style, rune_options, shard_options
+        FROM valid_pages
+        ORDER BY champion_name, primary_style, primary_rune, secondary_style, match_row_id, participant_order
+    )
+    SELECT g.champion_name, g.primary_style, g.primary_rune, g.secondary_style, g.games, g.wins,
+           e.rune_options, e.shard_options
+    FROM groups g
+    JOIN exemplars e USING (champion_name, primary_style, primary_rune, secondary_style)
+    ORDER BY g.first_seen
+"""
+
+# 裝備依前三件 (排序後) 分組，範例取每組最早出現的一筆
+SQL_BUILD_GROUPS = """
+    WITH builds AS (
+        SELECT champion_name, win, match_row_id, participant_order, items,
+               ARRAY(SELECT item FROM unnest(items[1:3]) AS item ORDER BY item) AS build_key
+        FROM etl_participants
+        WHERE cardinality(items) >= 3
+    ), groups AS (
+        SELECT champion_name, build_key, count(*) AS games, count(*) FILTER (WHERE win) AS wins,
+               min(ARRAY[match_row_id, participant_order]) AS first_seen
+        FROM builds
+        GROUP BY 1, 2
+    ), exemplars AS (
+        SELECT DISTINCT ON (champion_name, build_key) champion_name, build_key, items
+        FROM builds
+        ORDER BY champion_name, build_key, match_row_id, participant_order
+    )
+    SELECT g.champion_name, g.build_key, g.games, g.wins, e.items
+    FROM groups g
+    JOIN exemplars e USING (champion_name, build_key)
+    ORDER BY g.first_seen
+"""
+
+
+def count_aram_matches(conn, versions=None):
+    """計算 ARAM 對局總數 (對應 Python 模式讀取的記錄數)"""
+    with conn.cursor() as cursor:
+        if versions:
+            cursor.execute("SELECT COUNT(*) FROM model_matches WHERE game_mode = 'ARAM' AND patch = ANY(%s)",
+                           (list(versions),))
+        else:
+            cursor.execute("SELECT COUNT(*) FROM model_matches WHERE game_mode = 'ARAM'")
+        return cursor.fetchone()[0]
+
+
+def collect_stats_sql(conn, champion_dict, versions=None):
+    """SQL 模式：在資料庫端拆解 JSON 並彙總，回傳與 Python 模式相同格式的中間統計資料"""
+    processed_stats = new_processed_stats()
+    records_processed = count_aram_matches(conn, versions)
+
+    # 英雄名稱只有一百多種，每個名稱只查找一次
+    name_cache = {}
+
+    def std_id(champion_name):
+        if champion_name not in name_cache:
+            name_cache[champion_name] = find_champion_in_dict(champion_name, champion_dict)
+        return name_cache[champion_name]
+
+    cursor = conn.cursor()
+    try:
+        logging.info("正在資料庫端拆解參與者資料...")
+        stage_start = time.perf_counter()
+        cursor.execute(SQL_CREATE_PARTICIPANTS, {'versions': list(versions) if versions else None})
+        cursor.execute("CREATE INDEX ON etl_participants (match_row_id, team_id)")
+        cursor.execute("ANALYZE etl_participants")
+        stage_start = record_stage('parse', stage_start)
+
+        # 英雄基本統計
+        cursor.execute(SQL_CHAMPION_TOTALS)
+        stat_keys = ['games', 'wins', 'kills', 'deaths', 'assists', 'damage_dealt', 'damage_taken',
+                     'healing', 'healing_done', 'team_damage_percentage', 'team_damage_taken_percentage']
+        for champion_name, *values in cursor.fetchall():
+            champion_id = std_id(champion_name)
+            if not champion_id:
+                logging.warning(f"找不到英雄字典對應: {champion_name}")
+                continue
+            champ_stats = processed_stats['champions'].setdefault(champion_id, {key: 0 for key in stat_keys})
+            for key, value in zip(stat_keys, values):
+                champ_stats[key] += value
+
+        # 版本資料
+        cursor.execute(SQL_VERSION_TOTALS)
+        for champion_name, version_short, games, wins in cursor.fetchall():
+            champion_id = std_id(champion_name)
+            if champion_id:
+                count_result(processed_stats['versions'][champion_id][version_short], wins, games)
+
+        # 對位資料
+        cursor.execute(SQL_MATCHUP_TOTALS)
+        for champion_name, opponent_name, games, wins in cursor.fetchall():
+            champion_id, opponent_id = std_id(champion_name), std_id(opponent_name)
+            if champion_id and opponent_id:
+                count_result(processed_stats['matchups'][champion_id][opponent_id], wins, games)
+
+        # 協同資料 (確保順序一致)
+        cursor.execute(SQL_SYNERGY_TOTALS)
+        for name1, name2, games, wins in cursor.fetchall():
+            champ1, champ2 = std_id(name1), std_id(name2)
+            if not champ1 or not champ2:
+                continue
+            if champ1 > champ2:
+                champ1, champ2 = champ2, champ1
+            count_result(processed_stats['synergies'][champ1][champ2], wins, games)
+
+        # 符文與裝備：資料庫端分組，只傳輸每組的計數與一筆範例
+        cursor.execute(SQL_LOADOUT_TOTALS)
+        for champion_name, rune_games, build_games in cursor.fetchall():
+            champion_id = std_id(champion_name)
+            if champion_id:
+                processed_stats['rune_totals'][champion_id] += rune_games
+                processed_stats['build_totals'][champion_id] += build_games
+
+        cursor.execute(SQL_RUNE_GROUPS)
+        for champion_name, primary_style, primary_rune, secondary_style, games, wins, rune_options, shard_options \
+                in cursor.fetchall():
+            champion_id = std_id(champion_name)
+            if champion_id:
+                page = (primary_style, secondary_style, tuple(rune_options), tuple(shard_options))
+                count_loadout(processed_stats['runes'][champion_id], processed_stats['rune_pages'],
+                              (primary_style, primary_rune, secondary_style), page, wins, games)
+
+        cursor.execute(SQL_BUILD_GROUPS)
+        for champion_name, build_key, games, wins, items in cursor.fetchall():
+            champion_id = std_id(champion_name)
+            if champion_id:
+                count_loadout(processed_stats['builds'][champion_id], processed_stats['item_builds'],
+                              tuple(build_key), tuple(items), wins, games)
+
+        # 結束交易並刪除暫存表
+        conn.commit()
+        record_stage('aggregate', stage_start)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    return processed_stats, records_processed
+
+
+# ==================== 欄位式資料庫模式 ====================
+# 讀取 participant_store.py 產生的 Arrow IPC 參與者資料表 (memory-mapped)，
+# 只載入彙總需要的欄位，完全不解析 JSON
+
+STORE_STAT_COLUMNS = {
+    'kills': 'kills',
+    'deaths': 'deaths',
+    'assists': 'assists',
+    'damage_dealt': 'total_damage_dealt_to_champions',
+    'damage_taken': 'total_damage_taken',
+    'healing': 'total_heal',
+    'healing_done': 'total_heals_on_teammates',
+    'team_damage_percentage': 'team_damage_percentage',
+    'team_damage_taken_percentage': 'damage_taken_on_team_percentage'
+}
+STORE_LOADOUT_COLUMNS = ['has_perks', 'primary_style', 'sub_style', 'perk0', 'perk1', 'perk2', 'perk3', 'perk4',
+                         'perk5', 'stat_offense', 'stat_flex', 'stat_defense',
+                         'item0', 'item1', 'item2', 'item3', 'item4', 'item5', 'item6']
+STORE_COLUMNS = ['match_row_id', 'participant_order', 'game_version', 'champion_name', 'team_id', 'win'] + \
+                list(STORE_STAT_COLUMNS.values()) + STORE_LOADOUT_COLUMNS
+
+
+def open_participant_store(store_dir):
+    """以 memory-map 開啟欄位式參與者資料庫 (patch 為分區欄位)"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+
+    partitioning = ds.partitioning(pa.schema([('patch', pa.string())]), flavor='hive')
+    return ds.dataset(store_dir, format='ipc', partitioning=partitioning,
+                      filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+def read_store_participants(store_dir, versions=None):
+    """
+    讀取有效 ARAM 對局的參與者 (篩選條件與 Python 模式相同)，依對局與參與者順序排序
+    指定 versions 時只讀取對應的 patch 分區
+    """
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    dataset = open_participant_store(store_dir)
+    aram = ds.field('game_mode') == 'ARAM'
+    if versions:
+        aram = aram & ds.field('patch').isin(list(versions))
+    records_processed = pc.count_distinct(
+        dataset.to_table(columns=['match_row_id'], filter=aram).column('match_row_id')).as_py()
+
+    row_filter = aram & (ds.field('game_duration') >= 300) & (ds.field('winning_team_id') != 0) & \
+        (ds.field('champion_id') != 0) & (ds.field('champion_name') != '')
+    table = dataset.to_table(columns=STORE_COLUMNS, filter=row_filter)
+    table = table.sort_by([('match_row_id', 'ascending'), ('participant_order', 'ascending')])
+    # 可為空的整數欄位 (符文、裝備) 保留為 Python int / None
+    return table.to_pandas(integer_object_nulls=True), records_processed
+
+
+def store_rune_page(primary_style, sub_style, perks, shards):
+    """由攤平的符文欄位組成 (分組鍵, 符文頁)，格式與 canonical_rune_page 相同"""
+    if primary_style is None or sub_style is None or perks[0] is None:
+        return None
+    runes = tuple(perk for perk in perks if perk is not None)
+    shards = tuple(shards) if shards[0] is not None else ()
+    return (primary_style, perks[0], sub_style), (primary_style, sub_style, runes, shards)
+
+
+def count_groups(df, keys):
+    """依 keys 分組計算 [場次, 勝場]，逐組回傳 (*keys, 場次, 勝場)"""
+    counts = df.groupby(keys)['win'].agg(['size', 'sum'])
+    for key, games, wins in zip(counts.index, counts['size'].tolist(), counts['sum'].tolist()):
+        yield (*key, games, wins)
+
+
+def collect_stats_store(conn, champion_dict, store_dir=None, versions=None):
+    """欄位式資料庫模式：從 PARTICIPANT_STORE 目錄讀取參與者資料並以 pandas 彙總"""
+    store_dir = store_dir or os.environ.get('PARTICIPANT_STORE', '../participant_store')
+    processed_stats = new_processed_stats()
+
+    logging.info(f"正在讀取欄位式參與者資料庫: {store_dir}")
+    stage_start = time.perf_counter()
+    df, records_processed = read_store_participants(store_dir, versions)
+    stage_start = record_stage('parse', stage_start)
+    if df.empty:
+        return processed_stats, records_processed
+
+    # 英雄名稱只有一百多種，每個名稱只查找一次
+    df['champion_name'] = df['champion_name'].astype(object)
+    name_to_id = {name: find_champion_in_dict(name, champion_dict) for name in df['champion_name'].unique()}
+    df['std_id'] = df['champion_name'].map(name_to_id)
+    for name, champion_id in name_to_id.items():
+        if not champion_id:
+            logging.warning(f"找不到英雄字典對應: {name}")
+    df = df[df['std_id'].notna()]
+
+    # 英雄基本統計 (依首次出場順序，讓同勝率英雄的排名與 Python 模式一致)
+    stat_columns = list(STORE_STAT_COLUMNS.values())
+    grouped = df.groupby('std_id', sort=False)
+    totals = grouped[stat_columns].sum()
+    totals['games'] = grouped.size()
+    totals['wins'] = grouped['win'].sum()
+    for champion_id, row in zip(totals.index, totals.to_dict('records')):
+        champ_stats = {'games': int(row['games']), 'wins': int(row['wins'])}
+        for key, column in STORE_STAT_COLUMNS.items():
+            champ_stats[key] = row[column]
+        processed_stats['champions'][champion_id] = champ_stats
+
+    # 版本資料：只保留主版本號，例如 "15.1.649.4112" -> "15.1"
+    version_short = {version: '.'.join(version.split('.')[:2])
+                     for version in df['game_version'].unique() if version and '.' in version}
+    versioned = df.assign(version_short=df['game_version'].map(version_short)).dropna(subset=['version_short'])
+    for champion_id, version, games, wins in count_groups(versioned, ['std_id', 'version_short']):
+        count_result(processed_stats['versions'][champion_id][version], wins, games)
+
+    # 對位資料：同場對局中敵方隊伍的每位英雄
+    players = df[['match_row_id', 'participant_order', 'team_id', 'std_id', 'win']]
+    pairs = players.merge(players, on='match_row_id', suffixes=('', '_other'))
+    opponent_team = np.where(pairs['team_id'] == 100, 200, 100)
+    opponents = pairs[pairs['team_id_other'] == opponent_team]
+    for champ1, champ2, games, wins in count_groups(opponents, ['std_id', 'std_id_other']):
+        count_result(processed_stats['matchups'][champ1][champ2], wins, games)
+
+    # 協同資料：同隊英雄兩兩配對，每組只取一次 (確保順序一致)
+    allies = pairs[(pairs['team_id_other'] == pairs['team_id']) & pairs['team_id'].isin([100, 200]) &
+                   (pairs['participant_order'] < pairs['participant_order_other'])]
+    allies = allies.assign(champ1=np.minimum(allies['std_id'], allies['std_id_other']),
+                           champ2=np.maximum(allies['std_id'], allies['std_id_other']))
+    for champ1, champ2, games, wins in count_groups(allies, ['champ1', 'champ2']):
+        count_result(processed_stats['synergies'][champ1][champ2], wins, games)
+
+    # 符文與裝備：逐列轉成整數 tuple 並分組計數
+    loadouts = zip(df['std_id'].tolist(), df['win'].tolist(), df['has_perks'].tolist(),
+                   df['primary_style'].tolist(), df['sub_style'].tolist(),
+                   zip(*(df[f'perk{i}'].tolist() for i in range(6))),
+                   zip(df['stat_offense'].tolist(), df['stat_flex'].tolist(), df['stat_defense'].tolist()),
+                   zip(*(df[f'item{i}'].tolist() for i in range(7))))
+    for champion_id, win, has_perks, primary_style, sub_style, perks, shards, items in loadouts:
+        if has_perks:
+            count_rune_page(processed_stats, champion_id, win, store_rune_page(primary_style, sub_style, perks, shards))
+        count_build(processed_stats, champion_id, win, tuple(item for item in items if item and item > 0))
+    record_stage('aggregate', stage_start)
+
+    return processed_stats, records_processed
+
+
+ETL_MODES = {
+    'python': collect_stats_python,
+    'sql': collect_stats_sql,
+    'store': collect_stats_store,
+    'file': collect_stats_file,
+    'archive': collect_stats_archive,
+}
+
+
 def calculate_final_stats(processed_stats):
     """計算最終統計數據"""
     # 英雄統計
     champions_final = []
+    # 計算所有英雄遊戲場次總和 (用於計算選用率)
+    total_games = sum(c['games'] for c in processed_stats['champions'].values())
     for champion_id, stats in processed_stats['champions'].items():
         if stats['games'] == 0:
             continue
 
         win_rate = stats['wins'] / stats['games'] * 100
 
-        # 計算所有英雄遊戲場次總和 (用於計算選用率)
-        total_games = sum(c['games'] for c in processed_stats['champions'].values())
-
         champions_final.append({
             'champion_id': champion_id,
             'win_rate': win_rate,
@@ -373,115 +1032,66 @@ def calculate_final_stats(processed_stats):
 
     # 版本趨勢
     trends_final = []
+    # 計算每個版本的總遊戲場次 (用於計算選用率)
+    version_total_games = Counter()
+    for champ_versions in processed_stats['versions'].values():
+        for version, (games, _) in champ_versions.items():
+            version_total_games[version] += games
+
     for champion_id, versions in processed_stats['versions'].items():
-        for version, data_list in versions.items():
-            if not data_list:
+        for version, (games, wins) in versions.items():
+            if not games:
                 continue
 
-            games = len(data_list)
-            wins = sum(1 for d in data_list if d['win'])
             win_rate = wins / games * 100 if games > 0 else 0
 
-            # 計算這個版本的總遊戲場次 (用於計算選用率)
-            version_total_games = sum(
-                len(v) for champ_versions in processed_stats['versions'].values() for ver, v in champ_versions.items()
-                if ver == version)
-
             trends_final.append({
                 'champion_id': champion_id,
                 'version': version,
                 'win_rate': win_rate,
-                'pick_rate': games / version_total_games * 100 if version_total_games > 0 else 0,
+                'pick_rate': games / version_total_games[version] * 100 if version_total_games[version] > 0 else 0,
                 'sample_size': games
             })
 
-    # 符文統計
+    # 符文統計 (分組與範例已在解析時完成)
     runes_final = []
-    for champion_id, rune_list in processed_stats['runes'].items():
-        # 按照符文配置分組
-        rune_configs = defaultdict(list)
-        for rune_data in rune_list:
-            # 簡化的符文鍵生成 (實際應用中應更精確)
-            try:
-                primary_style = rune_data['perks']['styles'][0]['style']
-                primary_selection = rune_data['perks']['styles'][0]['selections'][0]['perk']
-                secondary_style = rune_data['perks']['styles'][1]['style']
-                key = f"{primary_style}_{primary_selection}_{secondary_style}"
-                rune_configs[key].append(rune_data)
-            except (KeyError, IndexError):
+    rune_pages = list(processed_stats['rune_pages'])  # id -> 符文頁
+    for champion_id, rune_groups in processed_stats['runes'].items():
+        rune_total = processed_stats['rune_totals'][champion_id]
+        for (primary_path, primary_rune, secondary_path), (games, wins, page_id) in rune_groups.items():
+            if games < 5:  # 樣本太小跳過
                 continue
 
-        # 計算每種符文配置的勝率
-        for config_key, config_data in rune_configs.items():
-            if len(config_data) < 5:  # 樣本太小跳過
-                continue
-
-            games = len(config_data)
-            wins = sum(1 for d in config_data if d['win'])
             win_rate = wins / games * 100 if games > 0 else 0
+            # 簡化的符文選項 (實際應用中應映射到名稱)
+            _, _, rune_options, shard_options = rune_pages[page_id]
 
-            # 解析符文配置
-            try:
-                example = config_data[0]
-                primary_path = example['perks']['styles'][0]['style']
-                primary_rune = example['perks']['styles'][0]['selections'][0]['perk']
-                secondary_path = example['perks']['styles'][1]['style']
-
-                # 簡化的符文選項提取 (實際應用中應映射到名稱)
-                rune_options = []
-                for style in example['perks']['styles']:
-                    for selection in style['selections']:
-                        rune_options.append(selection['perk'])
-
-                shard_options = []
-                if 'statPerks' in example['perks']:
-                    statPerks = example['perks']['statPerks']
-                    shard_options = [
-                        statPerks.get('offense', 0),
-                        statPerks.get('flex', 0),
-                        statPerks.get('defense', 0)
-                    ]
-
-                runes_final.append({
-                    'champion_id': champion_id,
-                    'primary_path': str(primary_path),
-                    'primary_rune': str(primary_rune),
-                    'secondary_path': str(secondary_path),
-                    'rune_options': json.dumps(rune_options),
-                    'shard_options': json.dumps(shard_options),
-                    'win_rate': win_rate,
-                    'pick_rate': games / len(rune_list) * 100,
-                    'sample_size': games,
-                    'version': 'aggregate'  # 簡化版本處理
-                })
-            except (KeyError, IndexError):
-                continue
+            runes_final.append({
+                'champion_id': champion_id,
+                'primary_path': str(primary_path),
+                'primary_rune': str(primary_rune),
+                'secondary_path': str(secondary_path),
+                'rune_options': json.dumps(list(rune_options)),
+                'shard_options': json.dumps(list(shard_options)),
+                'win_rate': win_rate,
+                'pick_rate': games / rune_total * 100,
+                'sample_size': games,
+                'version': 'aggregate'  # 簡化版本處理
+            })
 
-    # 裝備統計
+    # 裝備統計 (簡化的裝備處理: 只依前三件核心裝備分組)
     builds_final = []
-    for champion_id, build_list in processed_stats['builds'].items():
-        # 簡化的裝備處理: 只考慮前三件核心裝備
-        build_configs = defaultdict(list)
-        for build_data in build_list:
-            items = build_data['items']
-            if len(items) >= 3:  # 至少有3件裝備
-                key = '_'.join(str(item) for item in sorted(items[:3]))
-                build_configs[key].append(build_data)
-
-        # 計算每種裝備配置的勝率
-        for config_key, config_data in build_configs.items():
-            if len(config_data) < 5:  # 樣本太小跳過
+    item_builds = list(processed_stats['item_builds'])  # id -> 裝備
+    for champion_id, build_groups in processed_stats['builds'].items():
+        build_total = processed_stats['build_totals'][champion_id]
+        for games, wins, build_id in build_groups.values():
+            if games < 5:  # 樣本太小跳過
                 continue
 
-            games = len(config_data)
-            wins = sum(1 for d in config_data if d['win'])
             win_rate = wins / games * 100 if games > 0 else 0
 
-            # 解析裝備配置
-            example = config_data[0]
-
             # 簡單區分起始、核心和選擇性裝備
-            items = example['items']
+            items = list(item_builds[build_id])
             starting_items = []
             core_items = []
             optional_items = []
@@ -501,7 +1111,7 @@ def calculate_final_stats(processed_stats):
                 'core_items': json.dumps(core_items if core_items else items[:3]),  # 至少有3件核心裝備
                 'optional_items': json.dumps(optional_items),
                 'win_rate': win_rate,
-                'pick_rate': games / len(build_list) * 100,
+                'pick_rate': games / build_total * 100,
                 'sample_size': games,
                 'version': 'aggregate'  # 簡化版本處理
             })
@@ -509,12 +1119,10 @@ def calculate_final_stats(processed_stats):
     # 英雄對位統計
     matchups_final = []
     for champ1, opponents in processed_stats['matchups'].items():
-        for champ2, results in opponents.items():
-            if len(results) < 5:  # 樣本太小跳過
+        for champ2, (games, wins) in opponents.items():
+            if games < 5:  # 樣本太小跳過
                 continue
 
-            games = len(results)
-            wins = sum(1 for result in results if result)
             win_rate = wins / games * 100 if games > 0 else 0
 
             matchups_final.append({
@@ -527,12 +1135,10 @@ def calculate_final_stats(processed_stats):
     # 英雄協同統計
     synergies_final = []
     for champ1, allies in processed_stats['synergies'].items():
-        for champ2, results in allies.items():
-            if len(results) < 5:  # 樣本太小跳過
+        for champ2, (games, wins) in allies.items():
+            if games < 5:  # 樣本太小跳過
                 continue
 
-            games = len(results)
-            wins = sum(1 for result in results if result)
             win_rate = wins / games * 100 if games > 0 else 0
 
             # 基於勝率計算協同分數 (簡單模型)
@@ -593,211 +1199,322 @@ def load_champion_mapping(conn):
         cursor.close()
 
 
+# 統計結果資料表與 COPY 欄位順序 (依此順序載入與切換)
+STATS_TABLE_COLUMNS = {
+    'champion_stats': [
+        'champion_id', 'win_rate', 'pick_rate', 'ban_rate', 'avg_kills', 'avg_deaths', 'avg_assists',
+        'kda_ratio', 'avg_damage', 'avg_damage_percentage', 'avg_healing', 'avg_healing_percentage',
+        'avg_damage_taken', 'avg_damage_taken_percentage', 'tier', 'rank', 'sample_size', 'version'
+    ],
+    'champion_trends': ['champion_id', 'version', 'win_rate', 'pick_rate', 'sample_size'],
+    'champion_runes': [
+        'champion_id', 'primary_path', 'primary_rune', 'secondary_path', 'rune_options', 'shard_options',
+        'win_rate', 'pick_rate', 'sample_size', 'version'
+    ],
+    'champion_builds': [
+        'champion_id', 'starting_items', 'core_items', 'optional_items',
+        'win_rate', 'pick_rate', 'sample_size', 'version'
+    ],
+    'champion_matchups': ['champion_id', 'opponent_id', 'win_rate', 'sample_size'],
+    'team_synergies': ['champion1_id', 'champion2_id', 'win_rate', 'synergy_score', 'sample_size'],
+}
+
+# 原本以 ON CONFLICT 更新的資料表與其唯一鍵：這次沒有計算到的資料列 (例如 ETL_VERSIONS 區間外或已封存版本的趨勢、
+# 區間內沒有對局的英雄的對位與協同) 保留原本的內容；champion_runes/champion_builds 原本就是整張表重建
+STATS_TABLE_KEYS = {
+    'champion_stats': ['champion_id'],
+    'champion_trends': ['champion_id', 'version'],
+    'champion_matchups': ['champion_id', 'opponent_id'],
+    'team_synergies': ['champion1_id', 'champion2_id'],
+}
+
+
+def build_stats_table_rows(data):
+    """將最終統計資料轉換為各資料表的資料列 (欄位順序同 STATS_TABLE_COLUMNS)"""
+    return {
+        'champion_stats': [
+            (
+                champ['champion_id'],
+                champ['win_rate'],
+                champ['pick_rate'],
+                champ['ban_rate'],
+                champ['avg_kills'],
+                champ['avg_deaths'],
+                champ['avg_assists'],
+                champ['kda_ratio'],
+                champ['avg_damage'],
+                champ['avg_damage_percentage'],
+                champ['avg_healing'],
+                champ.get('avg_healing_percentage', 0),
+                champ['avg_damage_taken'],
+                champ['avg_damage_taken_percentage'],
+                champ['tier'],
+                champ['rank'],
+                champ['sample_size'],
+                'current'
+            )
+            for champ in data['champions']
+        ],
+        'champion_trends': [
+            (
+                trend['champion_id'],
+                trend['version'],
+                trend['win_rate'],
+                trend['pick_rate'],
+                trend['sample_size']
+            )
+            for trend in data['trends']
+        ],
+        'champion_runes': [
+            (
+                rune['champion_id'],
+                rune['primary_path'],
+                rune['primary_rune'],
+                rune['secondary_path'],
+                rune['rune_options'],
+                rune['shard_options'],
+                rune['win_rate'],
+                rune['pick_rate'],
+                rune['sample_size'],
+                rune['version']
+            )
+            for rune in data['runes']
+        ],
+        'champion_builds': [
+            (
+                build['champion_id'],
+                build['starting_items'],
+                build['core_items'],
+                build['optional_items'],
+                build['win_rate'],
+                build['pick_rate'],
+                build['sample_size'],
+                build['version']
+            )
+            for build in data['builds']
+        ],
+        'champion_matchups': [
+            (
+                matchup['champion_id'],
+                matchup['opponent_id'],
+                matchup['win_rate'],
+                matchup['sample_size']
+            )
+            for matchup in data['matchups']
+        ],
+        'team_synergies': [
+            (
+                synergy['champion1_id'],
+                synergy['champion2_id'],
+                synergy['win_rate'],
+                synergy['synergy_score'],
+                synergy['sample_size']
+            )
+            for synergy in data['synergies']
+        ],
+    }
+
+
+def copy_rows(cursor, table_name, columns, rows):
+    """以 COPY 從記憶體緩衝區批次寫入資料列"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(rows)
+    buffer.seek(0)
+
+    copy_query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(table_name),
+        sql.SQL(', ').join(map(sql.Identifier, columns))
+    )
+    cursor.copy_expert(copy_query.as_string(cursor), buffer)
+
+
+def carry_over_rows(cursor, table_name, staging_name, keys, serial_columns):
+    """
+    把正式資料表中唯一鍵 (keys) 不在暫存資料表的資料列複製到暫存資料表 (等同原本 upsert 保留的資料列)，
+    保留原本的 updated_at 等欄位，SERIAL 欄位由暫存資料表的序列重新編號
+    """
+    cursor.execute("""
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """, (table_name,))
+    columns = [row[0] for row in cursor.fetchall() if row[0] not in serial_columns]
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    cursor.execute(sql.SQL("INSERT INTO {staging} ({columns}) SELECT {columns} FROM {live} AS live "
+                           "WHERE NOT EXISTS (SELECT 1 FROM {staging} AS new WHERE {match})").format(
+        staging=sql.Identifier(staging_name), live=sql.Identifier(table_name), columns=column_list,
+        match=sql.SQL(' AND ').join(sql.SQL("new.{key} = live.{key}").format(key=sql.Identifier(key))
+                                    for key in keys)))
+    return cursor.rowcount
+
+
+def create_staging_table(cursor, table_name, columns, rows, keys=None):
+    """
+    建立暫存資料表並載入資料，載入完成後才建立索引與約束
+    指定 keys 時保留正式資料表中這次沒有計算到的資料列 (見 carry_over_rows)
+    索引與約束名稱加上 _staging 後綴，切換後再改回原名
+    回傳切換時需要改名的 (類型, 暫存名稱, 原名) 列表
+    """
+    staging_name = f"{table_name}_staging"
+    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(staging_name)))
+    cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(
+        sql.Identifier(staging_name), sql.Identifier(table_name)))
+
+    # SERIAL 欄位改用暫存資料表自己的序列，從 1 開始編號 (等同原本 TRUNCATE ... RESTART IDENTITY)
+    # 正式資料表的序列不受影響 (setval 不隨交易回復)，切換後新序列改為原本的序列名稱
+    cursor.execute("""
+        SELECT s.relname, a.attname
+        FROM pg_depend d
+        JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+        JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.refobjid = %s::regclass AND d.deptype = 'a'
+    """, (table_name,))
+    serial_columns = cursor.fetchall()
+    serial_sequences = []
+    for sequence_name, column_name in serial_columns:
+        staging_sequence = f"{staging_name}_{column_name}_seq"
+        cursor.execute(sql.SQL("DROP SEQUENCE IF EXISTS {}").format(sql.Identifier(staging_sequence)))
+        cursor.execute(sql.SQL("CREATE SEQUENCE {} OWNED BY {}.{}").format(
+            sql.Identifier(staging_sequence), sql.Identifier(staging_name), sql.Identifier(column_name)))
+        cursor.execute(sql.SQL("ALTER TABLE {} ALTER COLUMN {} SET DEFAULT nextval({})").format(
+            sql.Identifier(staging_name), sql.Identifier(column_name),
+            sql.Literal(sql.Identifier(staging_sequence).as_string(cursor))))
+        serial_sequences.append((staging_sequence, sequence_name))
+
+    copy_rows(cursor, staging_name, columns, rows)
+    if keys:
+        kept = carry_over_rows(cursor, table_name, staging_name, keys,
+                               [column_name for _, column_name in serial_columns])
+        logging.info(f"{table_name} 保留 {kept} 筆這次沒有計算到的資料")
+
+    renames = []
+
+    # 依正式資料表的定義建立主鍵、唯一與外鍵約束
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')
+        ORDER BY contype DESC
+    """, (table_name,))
+    for constraint_name, definition in cursor.fetchall():
+        staging_constraint = f"{constraint_name}_staging"
+        cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} " + definition).format(
+            sql.Identifier(staging_name), sql.Identifier(staging_constraint)))
+        renames.append(('constraint', staging_constraint, constraint_name))
+
+    # 依正式資料表的定義建立一般索引 (不含約束建立的索引)
+    cursor.execute("""
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+    """, (table_name,))
+    for index_name, definition in cursor.fetchall():
+        staging_index = f"{index_name}_staging"
+        index_body = definition.split(' USING ', 1)[1]
+        cursor.execute(sql.SQL("CREATE INDEX {} ON {} USING " + index_body).format(
+            sql.Identifier(staging_index), sql.Identifier(staging_name)))
+        renames.append(('index', staging_index, index_name))
+
+    cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(staging_name)))
+    return staging_name, serial_sequences, renames
+
+
+def fetch_dependent_views(cursor, table_names):
+    """取得依賴這些資料表的 view 名稱與定義 (切換資料表時需重建)"""
+    cursor.execute("""
+        SELECT DISTINCT v.oid::regclass::text, v.relname, pg_get_viewdef(v.oid)
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.classid = 'pg_rewrite'::regclass
+          AND d.refobjid = ANY(%s::regclass[])
+          AND v.relkind = 'v'
+    """, (list(table_names),))
+    return cursor.fetchall()
+
+
+def fetch_table_grants(cursor, table_name):
+    """取得資料表 (或 view) 的授權，切換後套用到新資料表"""
+    cursor.execute("""
+        SELECT grantee, privilege_type
+        FROM information_schema.role_table_grants
+        WHERE table_schema = current_schema() AND table_name = %s AND grantee <> current_user
+    """, (table_name,))
+    return cursor.fetchall()
+
+
+def apply_grants(cursor, object_name, grants):
+    """把 fetch_table_grants 取得的授權套用到 object_name (已加上引號的名稱)"""
+    for grantee, privilege in grants:
+        cursor.execute(sql.SQL("GRANT {} ON {} TO {}").format(
+            sql.SQL(privilege), object_name,
+            sql.SQL('PUBLIC') if grantee == 'PUBLIC' else sql.Identifier(grantee)))
+
+
+def swap_staging_tables(cursor, staged_tables):
+    """
+    在同一個交易內以改名方式切換所有暫存資料表，
+    讀取端只會看到舊資料或完整的新資料
+    """
+    views = [(view_name, definition, fetch_table_grants(cursor, relname))
+             for view_name, relname, definition in fetch_dependent_views(cursor, staged_tables.keys())]
+    for view_name, _, _ in views:
+        cursor.execute(f"DROP VIEW IF EXISTS {view_name}")
+
+    for table_name, (staging_name, serial_sequences, renames) in staged_tables.items():
+        old_name = f"{table_name}_old"
+        grants = fetch_table_grants(cursor, table_name)
+
+        cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+            sql.Identifier(table_name), sql.Identifier(old_name)))
+        cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+            sql.Identifier(staging_name), sql.Identifier(table_name)))
+
+        # 舊資料表連同它的序列一起刪除，新資料表的序列改為原本的序列名稱
+        cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(old_name)))
+        for staging_sequence, sequence_name in serial_sequences:
+            cursor.execute(sql.SQL("ALTER SEQUENCE {} RENAME TO {}").format(
+                sql.Identifier(staging_sequence), sql.Identifier(sequence_name)))
+
+        for kind, staging_object, final_name in renames:
+            if kind == 'constraint':
+                cursor.execute(sql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+                    sql.Identifier(table_name), sql.Identifier(staging_object), sql.Identifier(final_name)))
+            else:
+                cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                    sql.Identifier(staging_object), sql.Identifier(final_name)))
+
+        apply_grants(cursor, sql.Identifier(table_name), grants)
+
+    for view_name, definition, grants in views:
+        cursor.execute(f"CREATE VIEW {view_name} AS {definition}")
+        apply_grants(cursor, sql.SQL(view_name), grants)
+
+
 def insert_champion_stats(conn, data):
-    """插入英雄統計資料到資料庫"""
+    """
+    插入英雄統計資料到資料庫
+    每張資料表先以 COPY 載入暫存表並建立索引，最後在同一個交易內改名切換，
+    API 不會讀到只寫入一半的資料；有唯一鍵的資料表 (STATS_TABLE_KEYS) 與原本的 upsert 相同保留這次沒有計算到的資料列
+    """
     try:
         cursor = conn.cursor()
 
-        # 插入英雄統計資料
-        if data['champions']:
-            logging.info(f"正在插入 {len(data['champions'])} 筆英雄統計資料...")
-
-            insert_query = """
-                INSERT INTO champion_stats 
-                (champion_id, win_rate, pick_rate, ban_rate, avg_kills, avg_deaths, avg_assists, 
-                kda_ratio, avg_damage, avg_damage_percentage, avg_healing, avg_healing_percentage,
-                avg_damage_taken, avg_damage_taken_percentage, tier, rank, sample_size, version)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (champion_id) DO UPDATE SET
-                win_rate = EXCLUDED.win_rate,
-                pick_rate = EXCLUDED.pick_rate,
-                ban_rate = EXCLUDED.ban_rate,
-                avg_kills = EXCLUDED.avg_kills,
-                avg_deaths = EXCLUDED.avg_deaths,
-                avg_assists = EXCLUDED.avg_assists,
-                kda_ratio = EXCLUDED.kda_ratio,
-                avg_damage = EXCLUDED.avg_damage,
-                avg_damage_percentage = EXCLUDED.avg_damage_percentage,
-                avg_healing = EXCLUDED.avg_healing,
-                avg_healing_percentage = EXCLUDED.avg_healing_percentage,
-                avg_damage_taken = EXCLUDED.avg_damage_taken,
-                avg_damage_taken_percentage = EXCLUDED.avg_damage_taken_percentage,
-                tier = EXCLUDED.tier,
-                rank = EXCLUDED.rank,
-                sample_size = EXCLUDED.sample_size,
-                version = EXCLUDED.version,
-                updated_at = CURRENT_TIMESTAMP
-            """
-
-            stats_data = [
-                (
-                    champ['champion_id'],
-                    champ['win_rate'],
-                    champ['pick_rate'],
-                    champ['ban_rate'],
-                    champ['avg_kills'],
-                    champ['avg_deaths'],
-                    champ['avg_assists'],
-                    champ['kda_ratio'],
-                    champ['avg_damage'],
-                    champ['avg_damage_percentage'],
-                    champ['avg_healing'],
-                    champ.get('avg_healing_percentage', 0),
-                    champ['avg_damage_taken'],
-                    champ['avg_damage_taken_percentage'],
-                    champ['tier'],
-                    champ['rank'],
-                    champ['sample_size'],
-                    'current'
-                )
-                for champ in data['champions']
-            ]
-
-            execute_batch(cursor, insert_query, stats_data, page_size=100)
-
-        # 插入版本趨勢資料
-        if data['trends']:
-            logging.info(f"正在插入 {len(data['trends'])} 筆版本趨勢資料...")
-
-            insert_query = """
-                INSERT INTO champion_trends 
-                (champion_id, version, win_rate, pick_rate, sample_size)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (champion_id, version) DO UPDATE SET
-                win_rate = EXCLUDED.win_rate,
-                pick_rate = EXCLUDED.pick_rate,
-                sample_size = EXCLUDED.sample_size,
-                updated_at = CURRENT_TIMESTAMP
-            """
-
-            trends_data = [
-                (
-                    trend['champion_id'],
-                    trend['version'],
-                    trend['win_rate'],
-                    trend['pick_rate'],
-                    trend['sample_size']
-                )
-                for trend in data['trends']
-            ]
-
-            execute_batch(cursor, insert_query, trends_data, page_size=100)
-
-        # 插入符文資料
-        if data['runes']:
-            logging.info(f"正在插入 {len(data['runes'])} 筆符文資料...")
-
-            # 先刪除現有的資料 (因為沒有唯一鍵可以用於UPSERT)
-            cursor.execute("TRUNCATE TABLE champion_runes RESTART IDENTITY")
-
-            insert_query = """
-                INSERT INTO champion_runes 
-                (champion_id, primary_path, primary_rune, secondary_path, rune_options, shard_options,
-                win_rate, pick_rate, sample_size, version)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-
-            runes_data = [
-                (
-                    rune['champion_id'],
-                    rune['primary_path'],
-                    rune['primary_rune'],
-                    rune['secondary_path'],
-                    rune['rune_options'],
-                    rune['shard_options'],
-                    rune['win_rate'],
-                    rune['pick_rate'],
-                    rune['sample_size'],
-                    rune['version']
-                )
-                for rune in data['runes']
-            ]
-
-            execute_batch(cursor, insert_query, runes_data, page_size=100)
-
-        # 插入裝備資料
-        if data['builds']:
-            logging.info(f"正在插入 {len(data['builds'])} 筆裝備構建資料...")
-
-            # 先刪除現有的資料 (因為沒有唯一鍵可以用於UPSERT)
-            cursor.execute("TRUNCATE TABLE champion_builds RESTART IDENTITY")
-
-            insert_query = """
-                INSERT INTO champion_builds 
-                (champion_id, starting_items, core_items, optional_items,
-                win_rate, pick_rate, sample_size, version)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """
-
-            builds_data = [
-                (
-                    build['champion_id'],
-                    build['starting_items'],
-                    build['core_items'],
-                    build['optional_items'],
-                    build['win_rate'],
-                    build['pick_rate'],
-                    build['sample_size'],
-                    build['version']
-                )
-                for build in data['builds']
-            ]
-
-            execute_batch(cursor, insert_query, builds_data, page_size=100)
-
-        # 插入對位資料
-        if data['matchups']:
-            logging.info(f"正在插入 {len(data['matchups'])} 筆對位資料...")
-
-            insert_query = """
-                INSERT INTO champion_matchups 
-                (champion_id, opponent_id, win_rate, sample_size)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (champion_id, opponent_id) DO UPDATE SET
-                win_rate = EXCLUDED.win_rate,
-                sample_size = EXCLUDED.sample_size,
-                updated_at = CURRENT_TIMESTAMP
-            """
-
-            matchups_data = [
-                (
-                    matchup['champion_id'],
-                    matchup['opponent_id'],
-                    matchup['win_rate'],
-                    matchup['sample_size']
-                )
-                for matchup in data['matchups']
-            ]
-
-            execute_batch(cursor, insert_query, matchups_data, page_size=100)
-
-        # 插入協同資料
-        if data['synergies']:
-            logging.info(f"正在插入 {len(data['synergies'])} 筆協同資料...")
-
-            insert_query = """
-                INSERT INTO team_synergies 
-                (champion1_id, champion2_id, win_rate, synergy_score, sample_size)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (champion1_id, champion2_id) DO UPDATE SET
-                win_rate = EXCLUDED.win_rate,
-                synergy_score = EXCLUDED.synergy_score,
-                sample_size = EXCLUDED.sample_size,
-                updated_at = CURRENT_TIMESTAMP
-            """
-
-            synergies_data = [
-                (
-                    synergy['champion1_id'],
-                    synergy['champion2_id'],
-                    synergy['win_rate'],
-                    synergy['synergy_score'],
-                    synergy['sample_size']
-                )
-                for synergy in data['synergies']
-            ]
-
-            execute_batch(cursor, insert_query, synergies_data, page_size=100)
+        staged_tables = {}
+        for table_name, rows in build_stats_table_rows(data).items():
+            # 沒有資料的資料表保留原內容
+            if not rows:
+                continue
+            logging.info(f"正在載入 {len(rows)} 筆 {table_name} 資料...")
+            staged_tables[table_name] = create_staging_table(
+                cursor, table_name, STATS_TABLE_COLUMNS[table_name], rows, STATS_TABLE_KEYS.get(table_name))
+
+        if staged_tables:
+            logging.info(f"正在切換 {len(staged_tables)} 張統計資料表...")
+            swap_staging_tables(cursor, staged_tables)
 
         conn.commit()
         logging.info("所有資料已成功插入資料庫")
@@ -846,14 +1563,7 @@ def main():
     error_message = None
 
     try:
-        # 設定資料庫連線資訊，實際使用時應從環境變數或設定檔讀取
-        db_config = {
-            'host': os.environ.get('DB_HOST', 'localhost'),
-            'port': int(os.environ.get('DB_PORT', '5432')),
-            'user': os.environ.get('DB_USER', 'postgres'),
-            'password': os.environ.get('DB_PASSWORD', 'aa030566'),
-            'database': os.environ.get('DB_NAME', 'aram')
-        }
+        db_config = load_db_config()
 
         # 建立資料庫連線
         conn = create_db_connection(db_config)
@@ -864,48 +1574,15 @@ def main():
         if not champion_dict:
             raise ValueError("無法載入英雄映射，請確保 champions 表已正確設定")
 
-        # 初始化合併統計資料的容器
-        all_processed_stats = {
-            'champions': {},
-            'runes': defaultdict(list),
-            'builds': defaultdict(list),
-            'versions': defaultdict(lambda: defaultdict(list)),
-            'matchups': defaultdict(lambda: defaultdict(list)),
-            'synergies': defaultdict(lambda: defaultdict(list))
-        }
-
-        # 分批次讀取和處理資料
-        for batch_df in fetch_data_in_batches(conn, 'model_matches', 1000):
-            records_processed += len(batch_df)
-
-            # 處理這一批次的資料
-            batch_stats = process_match_data_batch(batch_df, champion_dict)
-
-            # 合併到總統計資料中
-            for champion_id, stats in batch_stats['champions'].items():
-                if champion_id not in all_processed_stats['champions']:
-                    all_processed_stats['champions'][champion_id] = stats
-                else:
-                    for key, value in stats.items():
-                        all_processed_stats['champions'][champion_id][key] += value
-
-            for champion_id, rune_list in batch_stats['runes'].items():
-                all_processed_stats['runes'][champion_id].extend(rune_list)
-
-            for champion_id, build_list in batch_stats['builds'].items():
-                all_processed_stats['builds'][champion_id].extend(build_list)
-
-            for champion_id, versions in batch_stats['versions'].items():
-                for version, data_list in versions.items():
-                    all_processed_stats['versions'][champion_id][version].extend(data_list)
-
-            for champ1, opponents in batch_stats['matchups'].items():
-                for champ2, results in opponents.items():
-                    all_processed_stats['matchups'][champ1][champ2].extend(results)
-
-            for champ1, allies in batch_stats['synergies'].items():
-                for champ2, results in allies.items():
-                    all_processed_stats['synergies'][champ1][champ2].extend(results)
+        # ETL 模式：python (預設，Python 端解析 JSON)、sql (資料庫端彙總)、store (欄位式參與者資料庫) 或 file (JSONL 對局檔)
+        etl_mode = os.environ.get('ETL_MODE', 'python').lower()
+        if etl_mode not in ETL_MODES:
+            raise ValueError(f"未知的 ETL_MODE: {etl_mode}，可用模式：{list(ETL_MODES)}")
+        logging.info(f"使用 {etl_mode} 模式讀取與彙總資料")
+
+        # ETL_VERSIONS：只彙總指定的版本區間，例如 "15.1-15.4"、"15.3,15.4" 或 "latest:3" (預設為全部版本)
+        versions = load_version_window(conn)
+        all_processed_stats, records_processed = ETL_MODES[etl_mode](conn, champion_dict, versions=versions)
 
         # 如果沒有處理任何資料，則退出
         if records_processed == 0:
@@ -914,19 +1591,23 @@ def main():
         else:
             # 計算最終統計資料
             logging.info("正在計算最終統計資料...")
+            stage_start = time.perf_counter()
             final_stats = calculate_final_stats(all_processed_stats)
+            stage_start = record_stage('finalize', stage_start)
 
             # 插入資料到資料庫
             insert_champion_stats(conn, final_stats)
+            record_stage('load', stage_start)
             update_status = "success"
 
         # 記錄更新
         end_time = datetime.now()
-        current_version = "current"
+        current_version = versions[-1] if versions else "current"
         log_data_update(conn, "aram_stats", current_version, records_processed, update_status, start_time, end_time,
                         error_message)
 
         logging.info(f"資料處理完成，共處理 {records_processed} 筆記錄，耗時 {end_time - start_time}")
+        logging.info("各階段耗時: " + "，".join(f"{stage} {seconds:.2f} 秒" for stage, seconds in STAGE_TIMINGS.items()))
 
     except Exception as e:
         end_time = datetime.now()
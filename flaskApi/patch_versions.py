@@ -0,0 +1 @@
+../patch_versions.py
\ No newline at end of file
@@ -4,9 +4,9 @@ import pickle
 import sys
 
 import numpy as np
-import tensorflow as tf
 
 from gcsWorker import download_blob
+from bundle_reader import BUNDLE_FILE, normalized_stats_table, patch_index, read_bundle
 
 
 # -------------------- 英雄名稱正規化類別 --------------------
@@ -73,28 +73,131 @@ def resource_path(filename):
     return os.path.join(temp_dir, filename)
 
 
+# -------------------- TFLite 模型 --------------------
+class TFLiteModel:
+    """
+    以 TFLite 直譯器執行 export_model.py 匯出的 .tflite 模型 (只需要英雄 ID 的 lookup 模型)，
+    提供與 Keras 模型相同的 inputs 與 predict，不需要載入完整的 TensorFlow
+    直譯器依序使用 ai-edge-litert、tflite-runtime，都沒有安裝時使用 tf.lite
+    """
+
+    def __init__(self, model_path=None, model_content=None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=model_path, model_content=model_content)
+        self.inputs = self.interpreter.get_input_details()
+        self.input_index = self.inputs[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.batch_size = None
+
+    def predict(self, X_ids):
+        X_ids = np.asarray(X_ids, dtype=np.int32)
+        # 批次大小改變時才重新配置張量
+        if len(X_ids) != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, X_ids.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = len(X_ids)
+        self.interpreter.set_tensor(self.input_index, X_ids)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+
+def load_model(model_path):
+    """.tflite 使用 TFLite 直譯器，其他格式以 Keras 載入"""
+    if model_path.endswith(".tflite"):
+        return TFLiteModel(model_path)
+    import tensorflow as tf
+    return tf.keras.models.load_model(model_path)
+
+
 # -------------------- ARAM 勝率預測器類別 --------------------
 class ARAMPredictor:
-    def __init__(self, bucket_name, gcs_prefix=""):
+    def __init__(self, bucket_name, gcs_prefix="", model_file="advanced_aram_model_v2.h5", download=True,
+                 bundle_file=BUNDLE_FILE, patch=None):
         """
         參數:
         bucket_name (str): GCS Bucket 名稱
         gcs_prefix (str): GCS 上的資料路徑前置字串（例如 "models/"），若無則可設為空字串
+        model_file (str): 模型檔案名稱，.tflite 為 export_model.py 匯出的量化模型 (只在不使用模型包時使用)
+        download (bool): False 時直接使用暫存目錄中已有的檔案 (效能測試 benchmark_predictor.py 使用)
+        bundle_file (str): 模型包檔案名稱 (model_bundle.py)，設為空值或找不到模型包時改為讀取模型與三個 .pkl 輔助檔案
+        patch (str): 使用哪個版本的英雄統計表 (例如 "15.9")，空值時使用模型包的 current_patch；
+                     模型包中沒有該版本時使用不晚於該版本的最新版本 (只在使用模型包時有效)
         """
         self.bucket_name = bucket_name
+        self.patch = None
+        loaded = False
+        if bundle_file:
+            try:
+                self._load_bundle(bucket_name, gcs_prefix, bundle_file, download, patch)
+                loaded = True
+            except FileNotFoundError as e:
+                # 尚未上傳模型包的部署沿用個別檔案
+                print(f"{e}\n改為讀取 {model_file} 與 .pkl 輔助檔案")
+        if not loaded:
+            self._load_files(bucket_name, gcs_prefix, model_file, download)
+
+        # 建立名稱正規化器
+        self.normalizer = ChampionNormalizer()
+        # 建立正規化後名稱對應到英雄索引的字典
+        self.norm_to_idx = {}
+        for champ, idx in self.champion_to_idx.items():
+            norm_name = self.normalizer.normalize(champ)
+            self.norm_to_idx[norm_name] = idx
+
+    def _load_bundle(self, bucket_name, gcs_prefix, bundle_file, download, patch):
+        """從單一模型包載入模型、英雄索引與正規化後的英雄統計表 (不需要 scikit-learn)"""
+        if download:
+            download_blob(bucket_name, bundle_file, os.path.join(gcs_prefix, bundle_file))
+        bundle_full_path = resource_path(bundle_file)
+        if not os.path.exists(bundle_full_path):
+            raise FileNotFoundError(f"檔案 {bundle_full_path} 不存在，請確認 GCS 上有對應檔案並檢查下載權限。")
 
+        manifest, model_content, arrays = read_bundle(bundle_full_path)
+        self.model_version = manifest["version"]
+        self.feature_columns = manifest["feature_columns"]
+        self.champion_to_idx = {champ: idx for idx, champ in enumerate(manifest["champions"])}
+        if manifest["model"].endswith(".tflite"):
+            self.model = TFLiteModel(model_content=model_content)
+        else:
+            # Keras 只能從檔案載入 h5 模型
+            model_full_path = resource_path(f"bundle_{manifest['model']}")
+            with open(model_full_path, "wb") as f:
+                f.write(model_content)
+            self.model = load_model(model_full_path)
+        self.ids_only = len(self.model.inputs) == 1
+        index = patch_index(manifest, patch)
+        self.patch = manifest["patches"][index] if index is not None else manifest.get("current_patch")
+        self.stats_table = normalized_stats_table(arrays, index)
+        if self.ids_only and self.patch != manifest.get("current_patch"):
+            # lookup 模型的英雄統計表在模型內 (為 current_patch 的統計表)，改用其他版本時替換該層的權重
+            if isinstance(self.model, TFLiteModel):
+                print(f"TFLite 模型無法替換英雄統計表，使用模型內 {manifest.get('current_patch')} 版本的統計")
+                self.patch = manifest.get("current_patch")
+            else:
+                self.model.get_layer("champion_stats_table").set_weights([self.stats_table])
+
+    def _load_files(self, bucket_name, gcs_prefix, model_file, download):
+        """從模型與三個 .pkl 輔助檔案載入 (舊格式)"""
         # 定義本機檔案名稱與 GCS 上的對應檔案路徑
-        self.model_file = "advanced_aram_model_v2.h5"
+        self.model_file = model_file
         self.mapping_file = "champion_to_idx_v2.pkl"
         self.scaler_file = "scaler_v2.pkl"
         self.champion_stats_file = "champion_stats_dict_v2.pkl"
 
         # 下載資源（下載時已根據作業系統動態選擇暫存目錄）
-        download_blob(bucket_name, self.model_file, os.path.join(gcs_prefix, self.model_file))
-        download_blob(bucket_name, self.mapping_file, os.path.join(gcs_prefix, self.mapping_file))
-        download_blob(bucket_name, self.scaler_file, os.path.join(gcs_prefix, self.scaler_file))
-        download_blob(bucket_name, self.champion_stats_file,
-                      os.path.join(gcs_prefix, self.champion_stats_file))
+        if download:
+            download_blob(bucket_name, self.model_file, os.path.join(gcs_prefix, self.model_file))
+            download_blob(bucket_name, self.mapping_file, os.path.join(gcs_prefix, self.mapping_file))
+            download_blob(bucket_name, self.scaler_file, os.path.join(gcs_prefix, self.scaler_file))
+            download_blob(bucket_name, self.champion_stats_file,
+                          os.path.join(gcs_prefix, self.champion_stats_file))
 
         # 取得正確的本機路徑（從暫存目錄中讀取）
         model_full_path = resource_path(self.model_file)
@@ -108,7 +211,7 @@ class ARAMPredictor:
                 raise FileNotFoundError(f"檔案 {path} 不存在，請確認 GCS 上有對應檔案並檢查下載權限。")
 
         # 載入模型與資源
-        self.model = tf.keras.models.load_model(model_full_path)
+        self.model = load_model(model_full_path)
         with open(mapping_full_path, "rb") as f:
             self.champion_to_idx = pickle.load(f)
         with open(scaler_full_path, "rb") as f:
@@ -116,13 +219,15 @@ class ARAMPredictor:
         with open(champion_stats_full_path, "rb") as f:
             self.champion_stats_dict = pickle.load(f)
 
-        # 建立名稱正規化器
-        self.normalizer = ChampionNormalizer()
-        # 建立正規化後名稱對應到英雄索引的字典
-        self.norm_to_idx = {}
+        # lookup 模型 (chatDeep 的 MODEL_VARIANT=lookup) 只需要英雄 ID，英雄統計在模型內查表
+        self.ids_only = len(self.model.inputs) == 1
+        # 依英雄 ID 排列的正規化英雄統計表 (與訓練時相同以英雄原始名稱查詢，沒有統計數據的英雄以 0 代入)
+        num_features = len(next(iter(self.champion_stats_dict.values())))
+        stats_table = np.zeros((len(self.champion_to_idx), num_features), dtype=np.float32)
         for champ, idx in self.champion_to_idx.items():
-            norm_name = self.normalizer.normalize(champ)
-            self.norm_to_idx[norm_name] = idx
+            if champ in self.champion_stats_dict:
+                stats_table[idx] = self.champion_stats_dict[champ]
+        self.stats_table = self.scaler.transform(stats_table).astype(np.float32)
 
     def predict_team_strength(self, champion_names):
         """
@@ -139,17 +244,7 @@ class ARAMPredictor:
         except KeyError as e:
             raise ValueError(f"未知的英雄名稱: {e}")
         X_ids = np.array([ids], dtype=np.int32)
-        stats = []
-        for champ in comp_sorted:
-            if champ in self.champion_stats_dict:
-                stats.append(self.champion_stats_dict[champ])
-            else:
-                stats.append(np.zeros(len(next(iter(self.champion_stats_dict.values()))), dtype=np.float32))
-        stats = np.array(stats, dtype=np.float32)  # shape: (5, 特徵數)
-        # 對每位英雄的統計數據進行正規化
-        stats = self.scaler.transform(stats)
-        X_stats = np.expand_dims(stats, axis=0)  # shape: (1, 5, 特徵數)
-        prediction = self.model.predict([X_ids, X_stats])
+        prediction = self.model.predict(self.model_inputs(X_ids))
         score = prediction[0][0]
         return score
 
@@ -159,7 +254,6 @@ class ARAMPredictor:
         輸入多組陣容（每組包含 5 位英雄名稱），返回預測結果列表
         """
         X_ids = []
-        X_stats = []
         for comp in compositions:
             if len(comp) != 5:
                 raise ValueError("每個陣容必須包含五位英雄")
@@ -170,20 +264,13 @@ class ARAMPredictor:
             except KeyError as e:
                 raise ValueError(f"未知的英雄名稱: {e}")
             X_ids.append(ids)
-            stats = []
-            for champ in comp_sorted:
-                if champ in self.champion_stats_dict:
-                    stats.append(self.champion_stats_dict[champ])
-                else:
-                    stats.append(np.zeros(len(next(iter(self.champion_stats_dict.values()))), dtype=np.float32))
-            X_stats.append(stats)
         X_ids = np.array(X_ids, dtype=np.int32)
-        X_stats = np.array(X_stats, dtype=np.float32)  # shape: (批次數, 5, 特徵數)
-        # 將統計數據展平後進行正規化，再還原原矩陣形狀
-        batch_size, num_champs, num_features = X_stats.shape
-        X_stats_flat = X_stats.reshape(-1, num_features)
-        X_stats_flat = self.scaler.transform(X_stats_flat)
-        X_stats = X_stats_flat.reshape(batch_size, num_champs, num_features)
-        predictions = self.model.predict([X_ids, X_stats])
+        predictions = self.model.predict(self.model_inputs(X_ids))
         results = predictions[:, 0].tolist()
         return results
+
+    def model_inputs(self, X_ids):
+        """lookup 模型只需要英雄 ID；雙輸入模型再依英雄 ID 查正規化後的英雄統計表，shape: (批次數, 5, 特徵數)"""
+        if self.ids_only:
+            return X_ids
+        return [X_ids, self.stats_table[X_ids]]
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模擬 Riot match-v5 對局資料產生器 (格式與 match_data.json 相同)，用於 ETL 與訓練流程的效能測試：
+1. 英雄取自 champion_mapping.json，每位英雄有固定的強度、定位 (輸出/坦克/輔助)、常用符文頁與核心裝備
+2. 勝負依雙方英雄強度決定，數值依定位與遊戲時間產生，challenges 的比例欄位依隊伍總和計算
+3. 寫入 PostgreSQL 的 model_matches (COPY，同時寫入 extract_data) 或 JSONL 檔案 (.gz 會壓縮)
+同樣的 --seed 與 --id-offset 會產生完全相同的資料
+
+用法：
+    python generate_matches.py --matches 100000 --output matches.jsonl.gz
+    python generate_matches.py --matches 100000 --db [--workers 4]
+"""
+
+import argparse
+import configparser
+import csv
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import time
+
+from match_features import extract_features, extract_match_info
+
+TEMPLATE_FILE = "match_data.json"
+CHAMPION_FILE = "champion_mapping.json"
+DEFAULT_PATCHES = ["15.3", "15.4", "15.5", "15.6"]
+CHUNK_SIZE = 1000
+
+# -------------------- 符文與裝備 --------------------
+# 符文系：(主系第一列的基石, 其餘三列的選項)
+RUNE_TREES = {
+    8000: ([8005, 8008, 8021, 8010], [[9101, 9111, 8009], [9104, 9105, 9103], [8014, 8017, 8299]]),
+    8100: ([8112, 8128, 9923], [[8126, 8139, 8143], [8136, 8120, 8138], [8135, 8105, 8106]]),
+    8200: ([8214, 8229, 8230], [[8224, 8226, 8275], [8210, 8234, 8233], [8237, 8232, 8236]]),
+    8300: ([8351, 8360, 8369], [[8306, 8304, 8321], [8313, 8352, 8345], [8347, 8410, 8316]]),
+    8400: ([8437, 8439, 8465], [[8446, 8463, 8401], [8429, 8444, 8473], [8451, 8453, 8242]]),
+}
+STAT_SHARDS = ([5008, 5005, 5007], [5008, 5010, 5001], [5011, 5013, 5001])
+
+ROLE_ITEMS = {
+    "damage": [3031, 3089, 3157, 3135, 6653, 6655, 3153, 3071, 6672, 3036, 3094, 4645, 3100, 3115, 6692],
+    "tank": [3068, 3075, 3143, 3083, 6665, 3065, 3742, 3001, 4401, 3193, 2502, 6662],
+    "support": [3504, 3107, 6616, 3222, 2065, 3011, 4005, 3190, 6617, 3050],
+}
+BOOTS = [3006, 3020, 3047, 3111, 3158, 3009]
+TRINKET = 2052  # 大亂鬥的魄羅餅乾
+
+# 各定位每分鐘的數值基準：(輸出, 承受傷害, 自身治療, 隊友治療, 護盾, 減免傷害, 控場秒數)
+ROLE_RATES = {
+    "damage": (1500, 1100, 250, 20, 10, 700, 1.0),
+    "tank": (850, 1900, 450, 30, 40, 2600, 2.5),
+    "support": (700, 1000, 150, 500, 450, 500, 2.0),
+}
+
+
+# -------------------- 英雄設定 --------------------
+def random_rune_page(rng):
+    """產生一組合法的符文頁：主系基石 + 三列各一，副系兩個不同列各一，加上三個能力碎片"""
+    primary, secondary = rng.sample(sorted(RUNE_TREES), 2)
+    keystones, rows = RUNE_TREES[primary]
+    selections = [rng.choice(keystones)] + [rng.choice(row) for row in rows]
+    sub_rows = rng.sample(RUNE_TREES[secondary][1], 2)
+    selections += [rng.choice(row) for row in sub_rows]
+    shards = [rng.choice(options) for options in STAT_SHARDS]
+    return primary, secondary, selections, shards
+
+
+def build_champion_profiles(seed):
+    """依 seed 建立每位英雄固定的強度、定位、符文頁與核心裝備"""
+    with open(CHAMPION_FILE, "r", encoding="utf-8") as f:
+        champion_data = json.load(f)
+
+    rng = random.Random(seed)
+    profiles = []
+    for name, info in sorted(champion_data.items()):
+        role = rng.choices(["damage", "tank", "support"], weights=[0.55, 0.3, 0.15])[0]
+        profiles.append({
+            "name": name,
+            "key": int(info["key"]),
+            "role": role,
+            "strength": rng.gauss(0, 0.25),
+            "physical_ratio": rng.random(),
+            "popularity": rng.lognormvariate(0, 0.6),
+            "rune_pages": [random_rune_page(rng) for _ in range(2)],
+            "core_items": rng.sample(ROLE_ITEMS[role], 3),
+        })
+    return profiles
+
+
+# -------------------- 對局產生 --------------------
+class MatchGenerator:
+    """以 match_data.json 為樣板產生單場對局，只替換與統計相關的欄位"""
+
+    def __init__(self, seed, patches, id_offset, platform="TW2"):
+        with open(TEMPLATE_FILE, "r", encoding="utf-8") as f:
+            template = json.load(f)
+        self.template_info = {k: v for k, v in template["info"].items() if k not in ("participants", "teams")}
+        self.template_metadata = template["metadata"]
+        self.template_participant = template["info"]["participants"][0]
+        self.template_teams = template["info"]["teams"]
+        self.profiles = build_champion_profiles(seed)
+        self.cum_weights = list(itertools.accumulate(profile["popularity"] for profile in self.profiles))
+        self.seed = seed
+        self.patches = patches
+        self.id_offset = id_offset
+        self.platform = platform
+        self.base_timestamp = 1735689600000  # 2025-01-01
+
+    def player_puuid(self, player):
+        """第 player 位玩家的 puuid；TW2 以外的平台使用不同的玩家，模擬不同區域的玩家群"""
+        key = f"player-{player}" if self.platform == "TW2" else f"{self.platform}-player-{player}"
+        return hashlib.sha512(key.encode()).hexdigest()[:78]
+
+    def chunk_rng(self, chunk_index):
+        return random.Random(self.seed * 1000003 + chunk_index)
+
+    def pick_champions(self, rng):
+        """依熱門程度抽出 10 位不重複的英雄"""
+        picked = {}
+        while len(picked) < 10:
+            profile = rng.choices(self.profiles, cum_weights=self.cum_weights)[0]
+            picked[profile["name"]] = profile
+        return list(picked.values())
+
+    def participant(self, rng, profile, order, team_id, win, minutes, puuid):
+        """產生單一參與者的資料 (樣板複製後覆寫數值欄位)"""
+        damage_rate, taken_rate, heal_rate, ally_heal_rate, shield_rate, mitigated_rate, cc_rate = \
+            ROLE_RATES[profile["role"]]
+        form = rng.lognormvariate(0.08 if win else -0.08, 0.25)
+
+        damage = int(damage_rate * minutes * form)
+        physical = int(damage * profile["physical_ratio"])
+        kills = max(0, int(rng.gauss(minutes * (0.55 if win else 0.4) * form, 2.5)))
+        deaths = max(0, int(rng.gauss(minutes * (0.4 if win else 0.55), 2.5)))
+        assists = max(0, int(rng.gauss(minutes * (1.3 if win else 1.0), 4)))
+        gold_earned = int(500 + minutes * rng.gauss(720 if win else 650, 60))
+
+        p = dict(self.template_participant)
+        p.update({
+            "puuid": puuid,
+            "summonerId": puuid[:47],
+            "riotIdGameName": f"player{puuid[:8]}",
+            "summonerName": "",
+            "participantId": order + 1,
+            "championName": profile["name"],
+            "championId": profile["key"],
+            "teamId": team_id,
+            "win": win,
+            "kills": kills,
+            "deaths": deaths,
+            "assists": assists,
+            "totalDamageDealtToChampions": damage,
+            "physicalDamageDealtToChampions": physical,
+            "magicDamageDealtToChampions": damage - physical,
+            "totalDamageTaken": int(taken_rate * minutes * rng.lognormvariate(0, 0.25)),
+            "damageSelfMitigated": int(mitigated_rate * minutes * rng.lognormvariate(0, 0.3)),
+            "totalHeal": int(heal_rate * minutes * rng.lognormvariate(0, 0.4)),
+            "totalHealsOnTeammates": int(ally_heal_rate * minutes * rng.lognormvariate(0, 0.4)),
+            "totalDamageShieldedOnTeammates": int(shield_rate * minutes * rng.lognormvariate(0, 0.4)),
+            "timeCCingOthers": int(cc_rate * minutes * rng.lognormvariate(0, 0.3)),
+            "goldEarned": gold_earned,
+            "goldSpent": int(gold_earned * rng.uniform(0.85, 1.0)),
+        })
+
+        # 符文：八成使用第一套常用符文頁
+        primary, secondary, selections, shards = profile["rune_pages"][0 if rng.random() < 0.8 else 1]
+        p["perks"] = {
+            "styles": [
+                {"style": primary, "description": "primaryStyle",
+                 "selections": [{"perk": perk, "var1": 0, "var2": 0, "var3": 0} for perk in selections[:4]]},
+                {"style": secondary, "description": "subStyle",
+                 "selections": [{"perk": perk, "var1": 0, "var2": 0, "var3": 0} for perk in selections[4:]]},
+            ],
+            "statPerks": {"offense": shards[0], "flex": shards[1], "defense": shards[2]},
+        }
+
+        # 裝備：核心裝備 + 鞋子 + 同定位的其他裝備，遊戲越久裝備越多
+        slots = min(6, max(1, int(minutes / 3.5)))
+        core = profile["core_items"] if rng.random() < 0.7 else rng.sample(ROLE_ITEMS[profile["role"]], 3)
+        items = list(core[:slots])
+        if len(items) < slots:
+            items.append(rng.choice(BOOTS))
+        extras = [item for item in ROLE_ITEMS[profile["role"]] if item not in items]
+        items += rng.sample(extras, slots - len(items))
+        items += [0] * (6 - len(items))
+        for i, item_id in enumerate(items):
+            p[f"item{i}"] = item_id
+        p["item6"] = TRINKET
+        return p
+
+    def match(self, rng, index, total):
+        """產生第 index 場對局 (依序分配版本與時間)"""
+        patch_index = min(len(self.patches) - 1, index * len(self.patches) // max(1, total))
+        patch = self.patches[patch_index]
+        # 約 2% 為提前結束的對局 (少於 5 分鐘)
+        if rng.random() < 0.02:
+            duration = rng.randint(180, 290)
+        else:
+            duration = int(min(2400, max(480, rng.gauss(1140, 240))))
+        minutes = duration / 60
+
+        champions = self.pick_champions(rng)
+        blue_strength = sum(profile["strength"] for profile in champions[:5])
+        red_strength = sum(profile["strength"] for profile in champions[5:])
+        blue_wins = rng.random() < 1 / (1 + math.exp(-(blue_strength - red_strength)))
+
+        participants = []
+        for order, profile in enumerate(champions):
+            team_id = 100 if order < 5 else 200
+            win = blue_wins == (team_id == 100)
+            player = rng.randrange(max(10, total * 2))
+            puuid = self.player_puuid(player)
+            participants.append(self.participant(rng, profile, order, team_id, win, minutes, puuid))
+
+        # 依隊伍總和計算 challenges 的比例欄位
+        for team_id in (100, 200):
+            team = [p for p in participants if p["teamId"] == team_id]
+            team_damage = sum(p["totalDamageDealtToChampions"] for p in team) or 1
+            team_taken = sum(p["totalDamageTaken"] for p in team) or 1
+            for p in team:
+                challenges = dict(p.get("challenges", {}))
+                challenges["damagePerMinute"] = p["totalDamageDealtToChampions"] / minutes
+                challenges["teamDamagePercentage"] = p["totalDamageDealtToChampions"] / team_damage
+                challenges["damageTakenOnTeamPercentage"] = p["totalDamageTaken"] / team_taken
+                challenges["kda"] = (p["kills"] + p["assists"]) / max(1, p["deaths"])
+                p["challenges"] = challenges
+
+        game_id = self.id_offset + index
+        end_timestamp = self.base_timestamp + index * 20000
+        info = dict(self.template_info)
+        info.update({
+            "gameId": game_id,
+            "gameMode": "ARAM",
+            "queueId": 450,
+            "platformId": self.platform,
+            "gameVersion": f"{patch}.{650 + patch_index}.{6600 + patch_index * 13}",
+            "gameDuration": duration,
+            "gameCreation": end_timestamp - duration * 1000 - 60000,
+            "gameStartTimestamp": end_timestamp - duration * 1000,
+            "gameEndTimestamp": end_timestamp,
+            "participants": participants,
+            "teams": [dict(team, win=(team["teamId"] == 100) == blue_wins) for team in self.template_teams],
+        })
+        metadata = dict(self.template_metadata)
+        metadata["matchId"] = f"{self.platform}_{game_id}"
+        metadata["participants"] = [p["puuid"] for p in participants]
+        return {"metadata": metadata, "info": info}
+
+
+# -------------------- 平行產生 --------------------
+_generator = None
+
+
+def init_worker(seed, patches, id_offset):
+    global _generator
+    _generator = MatchGenerator(seed, patches, id_offset)
+
+
+def generate_chunk(args):
+    """產生一個區塊的對局，回傳序列化後的資料 (DB 模式同時計算 model_matches 欄位與 extract_data)"""
+    chunk_index, start, end, total, with_columns = args
+    rng = _generator.chunk_rng(chunk_index)
+    results = []
+    for index in range(start, end):
+        raw_match = _generator.match(rng, index, total)
+        match_json = json.dumps(raw_match, separators=(",", ":"))
+        if with_columns:
+            results.append((extract_match_info(raw_match), match_json,
+                            json.dumps(extract_features(raw_match), separators=(",", ":"))))
+        else:
+            results.append(match_json)
+    return results
+
+
+def generate(total, seed, patches, id_offset, workers, with_columns=False):
+    """依區塊產生全部對局 (保持順序)，逐區塊回傳"""
+    chunks = [(i, start, min(total, start + CHUNK_SIZE), total, with_columns)
+              for i, start in enumerate(range(0, total, CHUNK_SIZE))]
+    if workers <= 1:
+        init_worker(seed, patches, id_offset)
+        for chunk in chunks:
+            yield generate_chunk(chunk)
+        return
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(seed, patches, id_offset)) as pool:
+        for result in pool.imap(generate_chunk, chunks):
+            yield result
+
+
+# -------------------- 輸出 --------------------
+MATCH_COLUMNS = ["match_id", "game_mode", "game_type", "game_version", "map_id", "queue_id", "platform_id",
+                 "tournament_code", "game_name", "game_creation", "game_duration", "game_start_timestamp",
+                 "game_end_timestamp", "match_data", "extract_data"]
+INFO_KEYS = ["matchId", "gameMode", "gameType", "gameVersion", "mapId", "queueId", "platformId",
+             "tournamentCode", "gameName", "gameCreation", "gameDuration", "gameStartTimestamp", "gameEndTimestamp"]
+
+
+SQL_PATCH = """CASE WHEN strpos(game_version, '.') > 0
+                  THEN split_part(game_version, '.', 1) || '.' || split_part(game_version, '.', 2)
+                  ELSE 'unknown' END"""
+
+
+def get_db_connection():
+    """依 config.ini 的 [database] 設定建立連線"""
+    import psycopg2
+
+    config = configparser.ConfigParser()
+    config.read('config.ini', encoding='utf-8')
+    return psycopg2.connect(
+        host=config.get('database', 'DB_HOST'),
+        port=config.getint('database', 'DB_PORT'),
+        dbname=config.get('database', 'DB_NAME'),
+        user=config.get('database', 'DB_USER'),
+        password=config.get('database', 'DB_PASSWORD'),
+    )
+
+
+def write_chunk_to_db(cursor, chunk):
+    """以 COPY 寫入暫存表，再插入 model_matches (已存在的 match_id 略過)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for match_info, match_json, features_json in chunk:
+        writer.writerow([match_info.get(key) for key in INFO_KEYS] + [match_json, features_json])
+    buffer.seek(0)
+
+    columns = ", ".join(MATCH_COLUMNS)
+    cursor.copy_expert(f"COPY generated_matches ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+    # model_matches 依主版本號分區 (與 patch_versions.game_patch 相同)，先建立這批對局需要的分區
+    cursor.execute(f"SELECT ensure_model_matches_partition(patch) "
+                   f"FROM (SELECT DISTINCT {SQL_PATCH} AS patch FROM generated_matches) p")
+    cursor.execute(f"""
+        INSERT INTO model_matches ({columns}, patch)
+        SELECT {columns}, {SQL_PATCH} FROM generated_matches
+        ON CONFLICT (match_id, patch) DO NOTHING
+    """)
+    inserted = cursor.rowcount
+    cursor.execute("TRUNCATE generated_matches")
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="產生模擬的 ARAM 對局資料")
+    parser.add_argument("--matches", type=int, default=10000, help="對局數量")
+    parser.add_argument("--output", help="輸出的 JSONL 檔案 (.gz 結尾會壓縮)")
+    parser.add_argument("--db", action="store_true", help="寫入 config.ini 設定的 model_matches")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--id-offset", type=int, default=9000000000, help="gameId 起始值 (追加資料時避免重複)")
+    parser.add_argument("--patches", default=",".join(DEFAULT_PATCHES), help="依序分配的版本，以逗號分隔")
+    parser.add_argument("--workers", type=int, default=1, help="產生資料的行程數")
+    args = parser.parse_args()
+
+    if bool(args.output) == args.db:
+        parser.error("請指定 --output 或 --db 其中之一")
+    patches = [patch.strip() for patch in args.patches.split(",") if patch.strip()]
+
+    start = time.perf_counter()
+    written = 0
+    if args.db:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TEMP TABLE generated_matches ON COMMIT PRESERVE ROWS AS
+                    SELECT * FROM model_matches WITH NO DATA
+                """)
+                for chunk in generate(args.matches, args.seed, patches, args.id_offset, args.workers,
+                                      with_columns=True):
+                    written += write_chunk_to_db(cursor, chunk)
+                    conn.commit()
+                    print(f"已寫入 {written} 場對局 ({written / (time.perf_counter() - start):.0f} 場/秒)")
+        finally:
+            conn.close()
+    else:
+        # 壓縮等級 1：檔案約為未壓縮的一成，寫入速度不會成為瓶頸
+        if args.output.endswith(".gz"):
+            output = gzip.open(args.output, "wt", encoding="utf-8", compresslevel=1)
+        else:
+            output = open(args.output, "w", encoding="utf-8")
+        with output as f:
+            for chunk in generate(args.matches, args.seed, patches, args.id_offset, args.workers):
+                for match_json in chunk:
+                    f.write(match_json)
+                    f.write("\n")
+                written += len(chunk)
+                print(f"已產生 {written} 場對局 ({written / (time.perf_counter() - start):.0f} 場/秒)")
+
+    print(f"完成：{written} 場對局，耗時 {time.perf_counter() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+原始對局 JSON 壓縮封存：
+model_matches 只保留擷取後的欄位與 extract_data，Riot 回傳的完整 JSON 改寫入只附加 (append-only) 的區段檔，
+每場對局是一個獨立的 zstd frame，使用以對局 JSON 訓練的共用字典壓縮 (單場對局也能有高壓縮率)
+
+目錄結構：
+    ARCHIVE_DIR/dictionaries/<dict_id>.zdict   訓練好的字典 (frame 標頭記錄 dict_id，讀取時自動選用)
+    ARCHIVE_DIR/dictionaries/CURRENT           寫入時使用的字典 id
+    ARCHIVE_DIR/segments/<name>.zst            壓縮後的對局 (多個 frame 直接串接)
+    ARCHIVE_DIR/segments/<name>.idx            位移索引，每行 match_id<TAB>offset<TAB>length
+model_matches.archive_ref 記錄 "<name>:<offset>:<length>"，可直接隨機讀取單場對局
+需要選用套件 zstandard (不在 requirements.txt 中，pip install zstandard)
+
+用法：
+    python match_archive.py train [--samples 5000]     以 model_matches 的 match_data 抽樣訓練字典
+    python match_archive.py migrate [--batch 500]      把既有的 match_data 移入封存並清空欄位
+    python match_archive.py stats                      比較封存與資料表的大小
+    python match_archive.py retire --keep 4 [--dry-run]
+        只保留最新的 4 個版本分區：較舊版本的原始 JSON 移入封存後卸離並刪除 model_matches 的分區
+        (extract_data 可由封存重新計算；calculateData.py 的 archive 模式以 ETL_VERSIONS 讀取舊版本)
+        刪除前對局 id 記錄到 retired_match_ids，爬蟲的已收錄集合重新建立時不會遺失
+    python match_archive.py backfill-retired          以封存索引補上 retired_match_ids 建立前已刪除的對局 id
+"""
+
+import argparse
+import configparser
+import json
+import os
+import socket
+import time
+
+import psycopg2
+import zstandard as zstd
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+from patch_versions import patch_key
+
+DICTIONARY_DIR = "dictionaries"
+SEGMENT_DIR = "segments"
+DICTIONARY_SIZE = 112 * 1024
+COMPRESSION_LEVEL = 9
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024  # 區段檔超過此大小就換新檔
+
+
+def format_ref(segment, offset, length):
+    return f"{segment}:{offset}:{length}"
+
+
+def parse_ref(archive_ref):
+    segment, offset, length = archive_ref.rsplit(":", 2)
+    return segment, int(offset), int(length)
+
+
+# -------------------- 字典 --------------------
+def load_dictionaries(archive_dir):
+    """讀取所有字典，回傳 {dict_id: ZstdCompressionDict}"""
+    dictionaries = {}
+    dictionary_dir = os.path.join(archive_dir, DICTIONARY_DIR)
+    if not os.path.isdir(dictionary_dir):
+        return dictionaries
+    for filename in os.listdir(dictionary_dir):
+        if filename.endswith(".zdict"):
+            with open(os.path.join(dictionary_dir, filename), "rb") as f:
+                dictionary = zstd.ZstdCompressionDict(f.read())
+            dictionaries[dictionary.dict_id()] = dictionary
+    return dictionaries
+
+
+def current_dictionary(archive_dir):
+    """寫入時使用的字典 (尚未訓練時回傳 None，以不帶字典的 zstd 壓縮)"""
+    path = os.path.join(archive_dir, DICTIONARY_DIR, "CURRENT")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        dict_id = int(f.read().strip())
+    return load_dictionaries(archive_dir)[dict_id]
+
+
+def train_dictionary(archive_dir, samples, dict_size=DICTIONARY_SIZE):
+    """以對局 JSON (bytes) 樣本訓練字典並設為 CURRENT；舊字典保留，已封存的對局仍可讀取"""
+    dictionary = zstd.train_dictionary(dict_size, samples, level=COMPRESSION_LEVEL)
+    dictionary_dir = os.path.join(archive_dir, DICTIONARY_DIR)
+    os.makedirs(dictionary_dir, exist_ok=True)
+    with open(os.path.join(dictionary_dir, f"{dictionary.dict_id()}.zdict"), "wb") as f:
+        f.write(dictionary.as_bytes())
+    tmp_path = os.path.join(dictionary_dir, "CURRENT.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(dictionary.dict_id()))
+    os.replace(tmp_path, os.path.join(dictionary_dir, "CURRENT"))
+    return dictionary
+
+
+def serialize(raw_match):
+    return json.dumps(raw_match, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+# -------------------- 寫入 --------------------
+class ArchiveWriter:
+    """
+    附加寫入區段檔；每個程序寫自己的區段檔 (檔名含主機與 pid)，多個爬蟲可共用同一個封存目錄
+    append_batch 回傳前會 fsync，資料庫 commit 的 archive_ref 一定指向已落地的資料
+    """
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        os.makedirs(os.path.join(archive_dir, SEGMENT_DIR), exist_ok=True)
+        dictionary = current_dictionary(archive_dir)
+        self.compressor = zstd.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=dictionary, write_checksum=True)
+        self.segment = None
+        self.data_file = None
+        self.index_file = None
+        self.offset = 0
+
+    def open_segment(self):
+        self.close()
+        self.segment = f"{time.strftime('%Y%m%d%H%M%S')}-{socket.gethostname()}-{os.getpid()}"
+        base = os.path.join(self.archive_dir, SEGMENT_DIR, self.segment)
+        self.data_file = open(base + ".zst", "ab")
+        self.index_file = open(base + ".idx", "a", encoding="utf-8")
+        self.offset = self.data_file.tell()
+
+    def append_batch(self, raw_matches):
+        """寫入一批對局，回傳對應的 archive_ref 列表"""
+        return self.append_serialized([(raw_match.get("metadata", {}).get("matchId", ""), serialize(raw_match))
+                                       for raw_match in raw_matches])
+
+    def append_serialized(self, items):
+        """寫入一批已序列化的對局 [(match_id, JSON bytes)]，回傳對應的 archive_ref 列表"""
+        if self.data_file is None or self.offset >= SEGMENT_MAX_BYTES:
+            self.open_segment()
+        refs = []
+        index_lines = []
+        for match_id, payload in items:
+            frame = self.compressor.compress(payload)
+            self.data_file.write(frame)
+            index_lines.append(f"{match_id}\t{self.offset}\t{len(frame)}\n")
+            refs.append(format_ref(self.segment, self.offset, len(frame)))
+            self.offset += len(frame)
+        self.index_file.writelines(index_lines)
+        for f in (self.data_file, self.index_file):
+            f.flush()
+            os.fsync(f.fileno())
+        return refs
+
+    def close(self):
+        for f in (self.data_file, self.index_file):
+            if f is not None:
+                f.close()
+        self.data_file = None
+        self.index_file = None
+
+
+# -------------------- 讀取 --------------------
+class ArchiveReader:
+    """依 archive_ref 隨機讀取，或依區段順序讀取全部對局"""
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.dictionaries = load_dictionaries(archive_dir)
+        self.decompressors = {}
+        self.files = {}
+
+    def decompress(self, frame):
+        dict_id = zstd.get_frame_parameters(frame).dict_id
+        if dict_id not in self.decompressors:
+            self.decompressors[dict_id] = zstd.ZstdDecompressor(dict_data=self.dictionaries.get(dict_id))
+        return json.loads(self.decompressors[dict_id].decompress(frame))
+
+    def read_frame(self, segment, offset, length):
+        if segment not in self.files:
+            self.files[segment] = open(os.path.join(self.archive_dir, SEGMENT_DIR, segment + ".zst"), "rb")
+        f = self.files[segment]
+        f.seek(offset)
+        return f.read(length)
+
+    def read(self, archive_ref):
+        return self.decompress(self.read_frame(*parse_ref(archive_ref)))
+
+    def segments(self):
+        segment_dir = os.path.join(self.archive_dir, SEGMENT_DIR)
+        if not os.path.isdir(segment_dir):
+            return []
+        return sorted(filename[:-4] for filename in os.listdir(segment_dir) if filename.endswith(".idx"))
+
+    def iter_match_ids(self):
+        """只讀取位移索引，依序回傳封存中的 match_id"""
+        for segment in self.segments():
+            with open(os.path.join(self.archive_dir, SEGMENT_DIR, segment + ".idx"), "r", encoding="utf-8") as index:
+                for line in index:
+                    yield line.split("\t", 1)[0]
+
+    def iter_matches(self):
+        """依區段與位移順序讀取全部對局 (循序讀檔)，回傳 (match_id, 對局 JSON)"""
+        for segment in self.segments():
+            with open(os.path.join(self.archive_dir, SEGMENT_DIR, segment + ".idx"), "r", encoding="utf-8") as index, \
+                    open(os.path.join(self.archive_dir, SEGMENT_DIR, segment + ".zst"), "rb") as data:
+                for line in index:
+                    match_id, offset, length = line.rstrip("\n").split("\t")
+                    data.seek(int(offset))
+                    yield match_id, self.decompress(data.read(int(length)))
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+
+# -------------------- 維護指令 --------------------
+def get_db_connection():
+    """依 config.ini 的 [database] 設定建立連線"""
+    config = configparser.ConfigParser()
+    config.read('config.ini', encoding='utf-8')
+    return psycopg2.connect(
+        host=config.get('database', 'DB_HOST'),
+        port=config.getint('database', 'DB_PORT'),
+        dbname=config.get('database', 'DB_NAME'),
+        user=config.get('database', 'DB_USER'),
+        password=config.get('database', 'DB_PASSWORD'),
+    )
+
+
+def train_from_database(conn, archive_dir, sample_count):
+    """從資料表 (或既有封存) 隨機抽樣對局訓練字典"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT match_data::text FROM model_matches
+            WHERE match_data IS NOT NULL
+            ORDER BY random() LIMIT %s
+        """, (sample_count,))
+        samples = [row[0].encode("utf-8") for row in cur.fetchall()]
+    if not samples:
+        reader = ArchiveReader(archive_dir)
+        for _, raw_match in reader.iter_matches():
+            samples.append(serialize(raw_match))
+            if len(samples) >= sample_count:
+                break
+    if not samples:
+        raise SystemExit("沒有可用來訓練字典的對局")
+    # 重新序列化成與寫入時相同的格式 (JSONB 輸出的空白與鍵順序不同)
+    samples = [serialize(json.loads(sample)) for sample in samples]
+    dictionary = train_dictionary(archive_dir, samples)
+    print(f"以 {len(samples)} 場對局訓練字典 {dictionary.dict_id()} ({len(dictionary.as_bytes()) / 1024:.0f} KB)")
+
+
+def migrate_to_archive(conn, archive_dir, batch_size, table="model_matches"):
+    """把 match_data 仍在資料表 (或某個版本分區) 的對局寫入封存，更新 archive_ref 並清空 match_data (每批 commit)"""
+    writer = ArchiveWriter(archive_dir)
+    migrated = 0
+    try:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("""
+                    SELECT id, match_data FROM {}
+                    WHERE match_data IS NOT NULL AND archive_ref IS NULL
+                    ORDER BY id LIMIT %s
+                """).format(sql.Identifier(table)), (batch_size,))
+                batch = cur.fetchall()
+                if not batch:
+                    break
+                refs = writer.append_batch([match_data for _, match_data in batch])
+                execute_values(cur, sql.SQL("""
+                    UPDATE {} m SET archive_ref = v.archive_ref, match_data = NULL
+                    FROM (VALUES %s) AS v(id, archive_ref)
+                    WHERE m.id = v.id
+                """).format(sql.Identifier(table)), [(row_id, ref) for (row_id, _), ref in zip(batch, refs)])
+            conn.commit()
+            migrated += len(batch)
+            print(f"已封存 {migrated} 場對局 (至 id {batch[-1][0]})")
+    finally:
+        writer.close()
+    return migrated
+
+
+def list_patch_partitions(conn):
+    """仍在資料表中的版本分區 [(patch, 分區名稱, 對局數)]，由舊到新 (unknown 在最前面)"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT patch, partition_name FROM model_match_patches
+            WHERE retired_at IS NULL AND to_regclass(partition_name) IS NOT NULL
+        """)
+        partitions = []
+        for patch, partition_name in cur.fetchall():
+            cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(partition_name)))
+            partitions.append((patch, partition_name, cur.fetchone()[0]))
+    conn.commit()
+    return sorted(partitions, key=lambda partition: patch_key(partition[0]))
+
+
+def retire_patches(conn, archive_dir, keep, batch_size, dry_run=False):
+    """
+    保留最新的 keep 個版本分區，較舊的版本：原始 JSON 移入封存 -> 確認每場對局都有 archive_ref ->
+    對局 id 記錄到 retired_match_ids -> 卸離 (DETACH) 並刪除分區，model_match_patches 記錄 retired_at
+    (同一個交易並鎖定 model_matches 的寫入：分區刪除後 retired_match_ids 是已收錄集合重新建立時唯一的去重來源)
+    unknown 分區 (無法解析版本的對局) 不處理
+    """
+    partitions = [partition for partition in list_patch_partitions(conn) if partition[0] != "unknown"]
+    retired = partitions[:-keep] if keep > 0 else partitions
+    for patch, partition_name, count in partitions:
+        action = " -> 移入封存" if partition_name in {name for _, name, _ in retired} else ""
+        print(f"{patch:>8} {partition_name}: {count} 場{action}")
+    if dry_run or not retired:
+        return
+
+    for patch, partition_name, _ in retired:
+        migrate_to_archive(conn, archive_dir, batch_size, partition_name)
+        with conn.cursor() as cur:
+            # 檢查到刪除分區之間不能有爬蟲寫入 (新寫入的對局沒有 archive_ref，也不在 retired_match_ids)：
+            # 鎖定 model_matches (包含所有分區) 阻擋寫入、不阻擋讀取；寫入時會先鎖定 model_matches 再鎖定分區，
+            # 只鎖定分區時與 DETACH 需要的 model_matches 鎖可能互相等待 (deadlock)
+            cur.execute("LOCK TABLE model_matches IN SHARE ROW EXCLUSIVE MODE")
+            cur.execute(sql.SQL("SELECT COUNT(*), COUNT(*) FILTER (WHERE archive_ref IS NULL) FROM {}").format(
+                sql.Identifier(partition_name)))
+            count, missing = cur.fetchone()
+            if missing:
+                # 沒有原始 JSON 可封存的對局 (match_data 與 archive_ref 都是空的)，刪除分區會遺失資料
+                print(f"{patch}: {missing} 場對局沒有原始資料，保留分區")
+                conn.rollback()
+                continue
+            cur.execute(sql.SQL("""
+                INSERT INTO retired_match_ids (match_id, patch)
+                SELECT match_id, patch FROM {}
+                ON CONFLICT (match_id) DO NOTHING
+            """).format(sql.Identifier(partition_name)))
+            cur.execute(sql.SQL("ALTER TABLE model_matches DETACH PARTITION {}").format(sql.Identifier(partition_name)))
+            cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(partition_name)))
+            cur.execute("""
+                UPDATE model_match_patches SET retired_at = NOW(), retired_matches = %s WHERE patch = %s
+            """, (count, patch))
+        conn.commit()
+        print(f"{patch}: {count} 場對局已移入封存，分區 {partition_name} 已刪除")
+
+
+def backfill_retired_ids(conn, archive_dir, batch_size):
+    """
+    retired_match_ids 建立前已 retire 的版本：封存索引中不在 model_matches 的對局 id 補進 retired_match_ids
+    (仍在資料表中的對局由 model_matches 去重，不重複記錄)，回傳補上的筆數
+    """
+    reader = ArchiveReader(archive_dir)
+    inserted = 0
+    batch = []
+
+    def flush():
+        with conn.cursor() as cur:
+            rows = execute_values(cur, """
+                INSERT INTO retired_match_ids (match_id)
+                SELECT v.match_id FROM (VALUES %s) AS v(match_id)
+                WHERE NOT EXISTS (SELECT 1 FROM model_matches m WHERE m.match_id = v.match_id)
+                ON CONFLICT (match_id) DO NOTHING
+                RETURNING match_id
+            """, [(match_id,) for match_id in batch], fetch=True)
+        conn.commit()
+        return len(rows)
+
+    for match_id in reader.iter_match_ids():
+        batch.append(match_id)
+        if len(batch) >= batch_size:
+            inserted += flush()
+            batch = []
+    if batch:
+        inserted += flush()
+    print(f"retired_match_ids 補上 {inserted} 筆對局 id")
+    return inserted
+
+
+def print_stats(conn, archive_dir):
+    archive_bytes = 0
+    archived = 0
+    segment_dir = os.path.join(archive_dir, SEGMENT_DIR)
+    if os.path.isdir(segment_dir):
+        for filename in os.listdir(segment_dir):
+            path = os.path.join(segment_dir, filename)
+            archive_bytes += os.path.getsize(path)
+            if filename.endswith(".idx"):
+                with open(path, "r", encoding="utf-8") as f:
+                    archived += sum(1 for _ in f)
+    with conn.cursor() as cur:
+        # 分區資料表本身沒有資料，大小為各分區的總和
+        cur.execute("""
+            SELECT (SELECT COALESCE(SUM(pg_total_relation_size(relid)), 0)
+                    FROM pg_partition_tree('model_matches') WHERE isleaf),
+                   COUNT(*) FILTER (WHERE match_data IS NOT NULL),
+                   COALESCE(SUM(pg_column_size(match_data)), 0),
+                   COALESCE(SUM(pg_column_size(extract_data)), 0)
+            FROM model_matches
+        """)
+        table_bytes, in_table, match_data_bytes, extract_data_bytes = cur.fetchone()
+    print(f"model_matches 總大小: {table_bytes / 1024 / 1024:.1f} MB "
+          f"(match_data {match_data_bytes / 1024 / 1024:.1f} MB / {in_table} 場，"
+          f"extract_data {extract_data_bytes / 1024 / 1024:.1f} MB)")
+    print(f"封存: {archived} 場，{archive_bytes / 1024 / 1024:.1f} MB"
+          + (f"，平均每場 {archive_bytes / archived / 1024:.1f} KB" if archived else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="原始對局 JSON 壓縮封存")
+    parser.add_argument("command", choices=["train", "migrate", "stats", "retire", "backfill-retired"])
+    parser.add_argument("--archive", default=None, help="封存目錄 (預設為 config.ini [crawler] ARCHIVE_DIR)")
+    parser.add_argument("--samples", type=int, default=5000, help="訓練字典的樣本數")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--keep", type=int, default=4, help="retire：保留最新的幾個版本分區")
+    parser.add_argument("--dry-run", action="store_true", help="retire：只列出會移入封存的版本")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read('config.ini', encoding='utf-8')
+    archive_dir = args.archive or config.get('crawler', 'ARCHIVE_DIR', fallback='match_archive')
+
+    conn = get_db_connection()
+    try:
+        if args.command == "train":
+            train_from_database(conn, archive_dir, args.samples)
+        elif args.command == "migrate":
+            migrate_to_archive(conn, archive_dir, args.batch)
+            print("完成；執行 VACUUM FULL model_matches 釋放資料表空間")
+        elif args.command == "retire":
+            retire_patches(conn, archive_dir, args.keep, args.batch, args.dry_run)
+        elif args.command == "backfill-retired":
+            backfill_retired_ids(conn, archive_dir, args.batch)
+        else:
+            print_stats(conn, archive_dir)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
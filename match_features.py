@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+對局特徵擷取的共用函式 (不依賴資料庫)：
+爬蟲寫入 model_matches、欄位式資料庫 participant_store 與測試資料產生器 generate_matches 使用同一份計算
+"""
+
+from datetime import datetime
+
+# 遊戲時間控制換算成與傷害同量級的係數
+CC_SCALE = 100.0
+
+
+def participant_features(participant, game_duration):
+    """
+    擷取單一參與者的精細特徵 (extract_data 中 participants 的格式)
+    find_data.extract_features 與 participant_store 共用這份計算
+    """
+    p_feats = {}
+    p_feats["puuid"] = participant.get("puuid", "")
+    p_feats["championName"] = participant.get("championName", "")
+    p_feats["teamId"] = participant.get("teamId", 0)
+
+    challenges = participant.get("challenges", {})
+    if "damagePerMinute" in challenges:
+        p_feats["damage_per_minute"] = challenges["damagePerMinute"]
+    else:
+        total_damage = participant.get("totalDamageDealtToChampions", 0)
+        p_feats["damage_per_minute"] = total_damage / (game_duration / 60.0) if game_duration > 0 else 0
+
+    p_feats["total_damage_dealt_to_champions"] = participant.get("totalDamageDealtToChampions", 0)
+    p_feats["total_damage_taken"] = participant.get("totalDamageTaken", 0)
+    p_feats["physical_damage_dealt_to_champions"] = participant.get("physicalDamageDealtToChampions", 0)
+    p_feats["magic_damage_dealt_to_champions"] = participant.get("magicDamageDealtToChampions", 0)
+    p_feats["damage_self_mitigated"] = participant.get("damageSelfMitigated", 0)
+    p_feats["total_heal"] = participant.get("totalHeal", 0)
+    p_feats["total_heals_on_teammates"] = participant.get("totalHealsOnTeammates", 0)
+    p_feats["total_damage_shielded_on_teammates"] = participant.get("totalDamageShieldedOnTeammates", 0)
+    p_feats["time_ccing_others"] = participant.get("timeCCingOthers", 0)
+    p_feats["gold_earned"] = participant.get("goldEarned", 0)
+    p_feats["gold_spent"] = participant.get("goldSpent", 0)
+
+    total_damage_output = p_feats["total_damage_dealt_to_champions"]
+    if total_damage_output > 0:
+        p_feats["gold_per_damage_dealt"] = p_feats["gold_earned"] / total_damage_output
+    else:
+        p_feats["gold_per_damage_dealt"] = 0
+
+    total_effort = (
+            p_feats["total_damage_dealt_to_champions"] +
+            p_feats["total_damage_taken"] +
+            (p_feats["time_ccing_others"] * CC_SCALE) +
+            (p_feats["total_heal"] + p_feats["total_heals_on_teammates"] + p_feats[
+                "total_damage_shielded_on_teammates"]) +
+            p_feats["damage_self_mitigated"]
+    )
+    if total_effort > 0:
+        p_feats["gold_conversion_efficiency"] = p_feats["gold_earned"] / total_effort
+    else:
+        p_feats["gold_conversion_efficiency"] = 0
+
+    p_feats["kills"] = participant.get("kills", 0)
+    p_feats["deaths"] = participant.get("deaths", 0)
+    p_feats["assists"] = participant.get("assists", 0)
+    if p_feats["deaths"] > 0:
+        p_feats["kda"] = (p_feats["kills"] + p_feats["assists"]) / p_feats["deaths"]
+    else:
+        p_feats["kda"] = p_feats["kills"] + p_feats["assists"]
+
+    return p_feats
+
+
+def extract_features(match_data):
+    """
+    從原始對局資料中擷取精細的特徵數據
+    """
+    features = {}
+    game_duration = match_data["info"].get("gameDuration", 0)
+    features["game_duration"] = game_duration
+
+    # 初始化隊伍統計（假設隊伍 ID 為 100 與 200）
+    team_features = {
+        100: {"total_gold": 0, "total_damage_dealt": 0, "total_kills": 0, "total_assists": 0, "total_deaths": 0},
+        200: {"total_gold": 0, "total_damage_dealt": 0, "total_kills": 0, "total_assists": 0, "total_deaths": 0}
+    }
+
+    participants_features = []
+
+    for participant in match_data["info"]["participants"]:
+        p_feats = participant_features(participant, game_duration)
+        participants_features.append(p_feats)
+
+        team_id = participant.get("teamId", 0)
+        if team_id in team_features:
+            team_features[team_id]["total_gold"] += p_feats["gold_earned"]
+            team_features[team_id]["total_damage_dealt"] += p_feats["total_damage_dealt_to_champions"]
+            team_features[team_id]["total_kills"] += p_feats["kills"]
+            team_features[team_id]["total_assists"] += p_feats["assists"]
+            team_features[team_id]["total_deaths"] += p_feats["deaths"]
+
+    features["participants"] = participants_features
+
+    for team in match_data["info"].get("teams", []):
+        team_id = team.get("teamId")
+        if team_id in team_features:
+            team_features[team_id]["win"] = team.get("win", False)
+    features["teams"] = team_features
+
+    if 100 in team_features and 200 in team_features:
+        features["team_gold_diff"] = team_features[100]["total_gold"] - team_features[200]["total_gold"]
+        features["team_damage_diff"] = team_features[100]["total_damage_dealt"] - team_features[200][
+            "total_damage_dealt"]
+
+    return features
+
+
+def extract_match_info(raw_match):
+    """
+    從原始的 Riot 對局資料中擷取基本資訊
+    """
+    info = raw_match.get("info", {})
+    metadata = raw_match.get("metadata", {})
+    match_info = {
+        "matchId": metadata.get("matchId"),
+        "gameMode": info.get("gameMode"),
+        "gameType": info.get("gameType"),
+        "gameVersion": info.get("gameVersion"),
+        "mapId": info.get("mapId"),
+        "queueId": info.get("queueId"),
+        "platformId": info.get("platformId"),
+        "tournamentCode": info.get("tournamentCode"),
+        "gameName": info.get("gameName"),
+        "gameCreation": datetime.fromtimestamp(info.get("gameCreation", 0) / 1000).strftime(
+            '%Y-%m-%d %H:%M:%S') if info.get("gameCreation") else None,
+        "gameDuration": info.get("gameDuration"),
+        "gameStartTimestamp": datetime.fromtimestamp(info.get("gameStartTimestamp", 0) / 1000).strftime(
+            '%Y-%m-%d %H:%M:%S') if info.get("gameStartTimestamp") else None,
+        "gameEndTimestamp": datetime.fromtimestamp(info.get("gameEndTimestamp", 0) / 1000).strftime(
+            '%Y-%m-%d %H:%M:%S') if info.get("gameEndTimestamp") else None,
+    }
+    return match_info
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+本機模擬 Riot API (aiohttp.web)，用來測試 async_crawler.py / riot_client.py：
+- /riot/account/v1/accounts/by-riot-id/{name}/{tag}
+- /lol/match/v5/matches/by-puuid/{puuid}/ids
+- /lol/match/v5/matches/{match_id}      (以 generate_matches.MatchGenerator 產生，同一個 id 內容固定)
+- /stats                                 (請求數與 429 次數)
+與 Riot 相同使用固定視窗限速，回傳 X-App-Rate-Limit(-Count)、X-Method-Rate-Limit(-Count)，
+超過時回傳 429 並附上 Retry-After 與 X-Rate-Limit-Type
+需在有 match_data.json 與 champion_mapping.json 的目錄執行；需要選用套件 aiohttp (pip install aiohttp)
+
+用法：
+    python mock_riot_server.py --port 8089 --app-limit 20:1,100:120 --method-limit 500:10 --latency 0.2
+    (爬蟲的 config.ini [api-key] 設定 API_BASE_URL = http://127.0.0.1:8089)
+"""
+
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from generate_matches import DEFAULT_PATCHES, MatchGenerator
+from riot_client import parse_rate_limit
+
+class FixedWindowLimiter:
+    """Riot 式固定視窗計數：每個視窗從第一個請求開始計時，視窗結束後歸零"""
+
+    def __init__(self, header):
+        self.header = header
+        self.limits = parse_rate_limit(header)
+        self.windows = {}  # window -> [開始時間, 次數]
+
+    def hit(self, now):
+        """記錄一次請求，回傳 (是否超過限速, 需等待秒數)；超過時不計入次數"""
+        retry_after = 0
+        for limit, window in self.limits:
+            start, count = self.windows.get(window, (now, 0))
+            if now - start >= window:
+                start, count = now, 0
+            self.windows[window] = [start, count]
+            if count >= limit:
+                retry_after = max(retry_after, math.ceil(start + window - now))
+        if retry_after:
+            return True, retry_after
+        for window in self.windows:
+            self.windows[window][1] += 1
+        return False, 0
+
+    def count_header(self):
+        return ",".join(f"{self.windows.get(window, (0, 0))[1]}:{window}" for _, window in self.limits)
+
+
+class MockRiotServer:
+    def __init__(self, total, seed, patches, id_offset, app_limit, method_limit, latency, service_error_rate,
+                 platform="TW2"):
+        self.total = total
+        self.generator = MatchGenerator(seed, patches, id_offset, platform)
+        self.match_id_prefix = f"{platform}_"
+        self.id_offset = id_offset
+        self.seed = seed
+        self.app_limit = app_limit
+        self.method_limit = method_limit
+        self.app_limiter = FixedWindowLimiter(app_limit)
+        self.method_limiters = {}
+        self.latency = latency
+        self.service_error_rate = service_error_rate
+        self.stats = Counter()
+
+    # -------------------- 限速 --------------------
+    def rate_limit_headers(self, method_limiter):
+        return {
+            "X-App-Rate-Limit": self.app_limit,
+            "X-App-Rate-Limit-Count": self.app_limiter.count_header(),
+            "X-Method-Rate-Limit": method_limiter.header,
+            "X-Method-Rate-Limit-Count": method_limiter.count_header(),
+        }
+
+    def check_rate_limit(self, method):
+        """回傳 (429 回應或 None, 限速標頭)"""
+        if method not in self.method_limiters:
+            self.method_limiters[method] = FixedWindowLimiter(self.method_limit)
+        method_limiter = self.method_limiters[method]
+        now = time.monotonic()
+
+        limited, retry_after = self.app_limiter.hit(now)
+        limit_type = "application"
+        if not limited:
+            limited, retry_after = method_limiter.hit(now)
+            limit_type = "method"
+        headers = self.rate_limit_headers(method_limiter)
+        if limited:
+            self.stats["429_" + limit_type] += 1
+            headers.update({"Retry-After": str(retry_after), "X-Rate-Limit-Type": limit_type})
+            return web.json_response({"status": {"status_code": 429, "message": "Rate limit exceeded"}},
+                                     status=429, headers=headers), headers
+        if random.random() < self.service_error_rate:
+            # 模擬上游服務限速：沒有 Retry-After 時用戶端自行等待
+            self.stats["429_service"] += 1
+            headers["X-Rate-Limit-Type"] = "service"
+            return web.json_response({"status": {"status_code": 429, "message": "Rate limit exceeded"}},
+                                     status=429, headers=headers), headers
+        return None, headers
+
+    async def respond(self, request, method, build):
+        self.stats["requests"] += 1
+        if not request.headers.get("X-Riot-Token") and not request.query.get("api_key"):
+            return web.json_response({"status": {"status_code": 401, "message": "Unauthorized"}}, status=401)
+        limited, headers = self.check_rate_limit(method)
+        if limited is not None:
+            return limited
+        if self.latency:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+        body = build()
+        if body is None:
+            return web.json_response({"status": {"status_code": 404, "message": "Data not found"}},
+                                     status=404, headers=headers)
+        self.stats["ok_" + method] += 1
+        return web.json_response(body, headers=headers)
+
+    # -------------------- 路由 --------------------
+    async def account(self, request):
+        def build():
+            player = int(hashlib.md5(request.match_info["name"].encode()).hexdigest(), 16) % (self.total * 2)
+            return {
+                "puuid": self.generator.player_puuid(player),
+                "gameName": request.match_info["name"],
+                "tagLine": request.match_info["tag"],
+            }
+
+        return await self.respond(request, "account-v1.by-riot-id", build)
+
+    async def match_ids(self, request):
+        def build():
+            # 每個 puuid 固定對應一組對局 (不一定真的包含該玩家，但足以讓爬蟲持續擴展)
+            # 與 Riot 相同：新的對局在前，依 startTime / endTime (epoch 秒) 過濾後再以 start / count 分頁
+            rng = random.Random(request.match_info["puuid"])
+            count = min(100, int(request.query.get("count", 20)))
+            start = int(request.query.get("start", 0))
+            start_time = int(request.query.get("startTime", 0)) * 1000
+            end_time = int(request.query.get("endTime", 2 ** 40)) * 1000
+            indexes = sorted(rng.sample(range(self.total), min(self.total, rng.randint(20, 300))), reverse=True)
+            indexes = [index for index in indexes
+                       if start_time <= self.generator.base_timestamp + index * 20000 <= end_time]
+            return [f"{self.match_id_prefix}{self.id_offset + index}" for index in indexes[start:start + count]]
+
+        return await self.respond(request, "match-v5.by-puuid", build)
+
+    async def match(self, request):
+        def build():
+            match_id = request.match_info["match_id"]
+            if not match_id.startswith(self.match_id_prefix):
+                return None
+            try:
+                index = int(match_id[len(self.match_id_prefix):]) - self.id_offset
+            except ValueError:
+                return None
+            if not 0 <= index < self.total:
+                return None
+            return self.generator.match(random.Random(self.seed * 1000003 + index), index, self.total)
+
+        return await self.respond(request, "match-v5.match", build)
+
+    async def report(self, request):
+        return web.json_response(dict(self.stats))
+
+    def app(self):
+        app = web.Application()
+        app.add_routes([
+            web.get("/riot/account/v1/accounts/by-riot-id/{name}/{tag}", self.account),
+            web.get("/lol/match/v5/matches/by-puuid/{puuid}/ids", self.match_ids),
+            web.get("/lol/match/v5/matches/{match_id}", self.match),
+            web.get("/stats", self.report),
+        ])
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機模擬 Riot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--matches", type=int, default=100_000, help="可查詢的對局數")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--id-offset", type=int, default=9_000_000_000)
+    parser.add_argument("--patches", default=",".join(DEFAULT_PATCHES))
+    parser.add_argument("--platform", default="TW2", help="對局的平台 (對局 id 前綴)，多區域測試時每個區域各啟動一個")
+    parser.add_argument("--app-limit", default="20:1,100:120", help="應用程式限速 (次數:秒,...)")
+    parser.add_argument("--method-limit", default="500:10", help="每個 API 方法的限速")
+    parser.add_argument("--latency", type=float, default=0.2, help="平均回應延遲 (秒)")
+    parser.add_argument("--service-error-rate", type=float, default=0.0, help="隨機回傳 service 429 的比例")
+    parser.add_argument("--days-ago", type=float, default=None,
+                        help="第一場對局在幾天前結束 (預設依 MatchGenerator；爬蟲只取 60 天內的對局)")
+    args = parser.parse_args()
+
+    server = MockRiotServer(args.matches, args.seed, args.patches.split(","), args.id_offset,
+                            args.app_limit, args.method_limit, args.latency, args.service_error_rate, args.platform)
+    if args.days_ago is not None:
+        server.generator.base_timestamp = int((time.time() - args.days_ago * 24 * 3600) * 1000)
+    web.run_app(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
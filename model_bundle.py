@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+版本化的模型包：把模型與預測需要的資料打包成單一 zip 檔，取代四個分開下載的檔案
+(advanced_aram_model_v2.h5、champion_to_idx_v2.pkl、scaler_v2.pkl、champion_stats_dict_v2.pkl)
+
+zip 內容 (不壓縮)：
+    manifest.json         格式版本、模型版本、英雄列表 (依英雄 ID 排列)、特徵欄位順序、各檔案的 sha256
+    model.h5 / model.tflite
+    champion_stats.npy    各英雄的平均統計 (依英雄 ID 排列，沒有統計數據的英雄為 0)，為 current_patch 的統計表
+    patch_stats.npy       (選用) 各版本的英雄統計表，shape=(版本數, 英雄數, 特徵數)，版本順序為 manifest 的 patches
+    scaler_mean.npy       StandardScaler 的 mean_
+    scaler_scale.npy      StandardScaler 的 scale_
+讀取時只需要讀一次檔案，不需要 pickle 與 scikit-learn (讀取函式由 bundle_reader.py 匯入，與服務端共用)
+
+用法：
+    python model_bundle.py pack [--model advanced_aram_model_v2.h5] [--output model_bundle]
+        以目前的模型與三個 .pkl 輔助檔案建立模型包 (--model 也可以是 export_model.py 匯出的 .tflite)
+    python model_bundle.py show aram_model_bundle.zip
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import pickle
+import shutil
+import time
+import zipfile
+
+import numpy as np
+
+# BUNDLE_FILE 為最新版本的模型包 (預測器預設讀取的檔案名稱)
+from bundle_reader import BUNDLE_FILE, BUNDLE_FORMAT, normalized_stats_table, patch_index, read_bundle
+from patch_versions import patch_key
+
+BUNDLE_DIR = "model_bundle"
+
+
+def _npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _stats_table(champion_to_idx, champion_stats_dict, num_features):
+    stats = np.zeros((len(champion_to_idx), num_features), dtype=np.float32)
+    for champ, idx in champion_to_idx.items():
+        if champ in champion_stats_dict:
+            stats[idx] = champion_stats_dict[champ]
+    return stats
+
+
+def write_bundle(model_path, champion_to_idx, champion_stats_dict, feature_columns, scaler_mean, scaler_scale,
+                 output_dir=BUNDLE_DIR, extra=None, patch_tables=None, current_patch=None):
+    """
+    建立模型包 output_dir/aram_model_<版本>.zip，並複製為 output_dir/aram_model_bundle.zip (最新版本)
+    scaler_mean/scaler_scale 為 StandardScaler 的 mean_ 與 scale_；
+    patch_tables 為各版本的英雄統計 {版本: champion_stats_dict}，current_patch 為 champion_stats_dict 對應的版本；
+    extra 會寫入 manifest (例如訓練資料的 high water mark)，回傳模型包路徑
+    """
+    champions = sorted(champion_to_idx, key=champion_to_idx.get)
+    model_name = "model" + os.path.splitext(model_path)[1]
+    with open(model_path, "rb") as f:
+        files = {model_name: f.read()}
+    files["champion_stats.npy"] = _npy_bytes(_stats_table(champion_to_idx, champion_stats_dict, len(feature_columns)))
+    patches = sorted(patch_tables or {}, key=patch_key)
+    if patches:
+        files["patch_stats.npy"] = _npy_bytes(np.stack([
+            _stats_table(champion_to_idx, patch_tables[patch], len(feature_columns)) for patch in patches]))
+    files["scaler_mean.npy"] = _npy_bytes(np.asarray(scaler_mean, dtype=np.float64))
+    files["scaler_scale.npy"] = _npy_bytes(np.asarray(scaler_scale, dtype=np.float64))
+
+    version = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+        "model": model_name,
+        "champions": champions,
+        "feature_columns": list(feature_columns),
+        "patches": patches,
+        "current_patch": current_patch,
+        "files": {name: hashlib.sha256(content).hexdigest() for name, content in files.items()},
+    }
+    manifest.update(extra or {})
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"aram_model_{version}.zip")
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        for name, content in files.items():
+            zf.writestr(name, content)
+    shutil.copyfile(path, os.path.join(output_dir, BUNDLE_FILE))
+    print(f"模型包已建立: {path} (版本 {version})")
+    return path
+
+
+def bundle_patch_tables(manifest, arrays):
+    """模型包中各版本的英雄統計 {版本: {英雄: 統計}} (舊的模型包沒有版本統計時為空)"""
+    if "patch_stats" not in arrays:
+        return {}
+    return {patch: dict(zip(manifest["champions"], arrays["patch_stats"][i]))
+            for i, patch in enumerate(manifest["patches"])}
+
+
+def pack_legacy(model_path="advanced_aram_model_v2.h5", output_dir=BUNDLE_DIR):
+    """以目前的三個 .pkl 輔助檔案建立模型包"""
+    with open("champion_to_idx_v2.pkl", "rb") as f:
+        champion_to_idx = pickle.load(f)
+    with open("scaler_v2.pkl", "rb") as f:
+        scaler = pickle.load(f)
+    with open("champion_stats_dict_v2.pkl", "rb") as f:
+        champion_stats_dict = pickle.load(f)
+    num_features = len(next(iter(champion_stats_dict.values())))
+    # 舊的輔助檔案沒有記錄欄位名稱，依 chatDeep 的特徵欄位順序
+    from chatDeep import STORE_FEATURE_COLUMNS
+    feature_columns = STORE_FEATURE_COLUMNS if len(STORE_FEATURE_COLUMNS) == num_features else \
+        [f"feature_{i}" for i in range(num_features)]
+    return write_bundle(model_path, champion_to_idx, champion_stats_dict, feature_columns, scaler.mean_, scaler.scale_,
+                        output_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="建立或檢視模型包")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="以目前的模型與 .pkl 輔助檔案建立模型包")
+    pack_parser.add_argument("--model", default="advanced_aram_model_v2.h5")
+    pack_parser.add_argument("--output", default=BUNDLE_DIR)
+    show_parser = subparsers.add_parser("show", help="驗證並顯示模型包內容")
+    show_parser.add_argument("bundle")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        pack_legacy(args.model, args.output)
+    else:
+        manifest, model_content, arrays = read_bundle(args.bundle)
+        print(json.dumps({key: value for key, value in manifest.items() if key != "champions"},
+                         ensure_ascii=False, indent=2))
+        print(f"英雄數: {len(manifest['champions'])}，模型 {len(model_content) / 1024:.1f} KB，"
+              f"陣列: {', '.join(f'{name}{array.shape}' for name, array in arrays.items())}")
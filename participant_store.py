@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+參與者層級的欄位式特徵資料庫：
+1. 從 model_matches 的原始對局 JSON (或 config.ini [crawler] ARCHIVE_DIR 的封存) 擷取一次，每位參與者一列
+2. 以 Arrow IPC 檔案儲存，依版本 (例如 patch=15.5) 分區
+3. ETL、模型訓練與臨時分析只讀取需要的欄位 (memory-mapped)，不必再解析 JSON
+需要選用套件 pyarrow (不在 requirements.txt 中，pip install pyarrow)；從封存擷取時另需 zstandard
+
+用法：
+    python participant_store.py [輸出目錄]
+"""
+
+import configparser
+import json
+import os
+import sys
+
+import psycopg2
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from match_features import participant_features
+from patch_versions import game_patch
+
+DEFAULT_STORE_DIR = "participant_store"
+MANIFEST_FILE = "_manifest.json"
+# 只擷取 INGEST_LAG_SECONDS 秒之前寫入 (created_at) 的對局，與 chatDeep.py 的 high water mark 相同：
+# 多個爬蟲同時寫入時 id 與 commit 順序不同，較小的 id 可能較晚 commit，延遲內的對局留給下一次擷取
+INGEST_LAG_SECONDS = int(os.environ.get("INGEST_LAG_SECONDS", "600"))
+
+# -------------------- 欄位定義 --------------------
+# 對局層級欄位
+MATCH_FIELDS = [
+    pa.field("match_row_id", pa.int64()),
+    pa.field("match_id", pa.string()),
+    pa.field("game_mode", pa.dictionary(pa.int8(), pa.string())),
+    pa.field("game_version", pa.string()),
+    pa.field("game_duration", pa.int32()),
+    pa.field("game_end_timestamp", pa.int64()),
+    pa.field("winning_team_id", pa.int16()),
+]
+
+# 參與者識別欄位
+IDENTITY_FIELDS = [
+    pa.field("participant_order", pa.int8()),
+    pa.field("puuid", pa.string()),
+    pa.field("champion_id", pa.int32()),
+    pa.field("champion_name", pa.dictionary(pa.int16(), pa.string())),
+    pa.field("team_id", pa.int16()),
+    pa.field("win", pa.bool_()),
+]
+
+# 數值統計欄位：(欄位名稱, 原始 JSON 欄位)
+RAW_STAT_COLUMNS = [
+    ("kills", "kills"),
+    ("deaths", "deaths"),
+    ("assists", "assists"),
+    ("total_damage_dealt_to_champions", "totalDamageDealtToChampions"),
+    ("total_damage_taken", "totalDamageTaken"),
+    ("physical_damage_dealt_to_champions", "physicalDamageDealtToChampions"),
+    ("magic_damage_dealt_to_champions", "magicDamageDealtToChampions"),
+    ("damage_self_mitigated", "damageSelfMitigated"),
+    ("total_heal", "totalHeal"),
+    ("total_heals_on_teammates", "totalHealsOnTeammates"),
+    ("total_damage_shielded_on_teammates", "totalDamageShieldedOnTeammates"),
+    ("time_ccing_others", "timeCCingOthers"),
+    ("gold_earned", "goldEarned"),
+    ("gold_spent", "goldSpent"),
+]
+# 由其他欄位推算或取自 challenges 的統計
+DERIVED_STAT_COLUMNS = [
+    "damage_per_minute",
+    "gold_per_damage_dealt",
+    "gold_conversion_efficiency",
+    "kda",
+    "team_damage_percentage",
+    "damage_taken_on_team_percentage",
+]
+STAT_FIELDS = [pa.field(name, pa.float64()) for name, _ in RAW_STAT_COLUMNS] + \
+              [pa.field(name, pa.float64()) for name in DERIVED_STAT_COLUMNS]
+
+# 符文與裝備欄位 (主系 4 個 + 副系 2 個符文)
+RUNE_SELECTION_COUNT = 6
+LOADOUT_FIELDS = [pa.field("has_perks", pa.bool_()),
+                  pa.field("primary_style", pa.int32()),
+                  pa.field("sub_style", pa.int32())] + \
+                 [pa.field(f"perk{i}", pa.int32()) for i in range(RUNE_SELECTION_COUNT)] + \
+                 [pa.field("stat_offense", pa.int32()),
+                  pa.field("stat_flex", pa.int32()),
+                  pa.field("stat_defense", pa.int32())] + \
+                 [pa.field(f"item{i}", pa.int32()) for i in range(7)]
+
+PARTICIPANT_SCHEMA = pa.schema(MATCH_FIELDS + IDENTITY_FIELDS + STAT_FIELDS + LOADOUT_FIELDS)
+
+
+# -------------------- 特徵擷取 --------------------
+def rune_columns(perks):
+    """將 perks 結構攤平成固定欄位；結構不完整時對應欄位為 None"""
+    columns = {"has_perks": perks is not None, "primary_style": None, "sub_style": None,
+               "stat_offense": None, "stat_flex": None, "stat_defense": None}
+    for i in range(RUNE_SELECTION_COUNT):
+        columns[f"perk{i}"] = None
+    if not perks:
+        return columns
+
+    try:
+        styles = perks["styles"]
+        columns["primary_style"] = styles[0]["style"]
+        columns["sub_style"] = styles[1]["style"]
+        selections = [selection["perk"] for style in styles for selection in style["selections"]]
+        for i, perk in enumerate(selections[:RUNE_SELECTION_COUNT]):
+            columns[f"perk{i}"] = perk
+    except (KeyError, IndexError, TypeError):
+        pass
+
+    stat_perks = perks.get("statPerks")
+    if stat_perks:
+        columns["stat_offense"] = stat_perks.get("offense", 0)
+        columns["stat_flex"] = stat_perks.get("flex", 0)
+        columns["stat_defense"] = stat_perks.get("defense", 0)
+    return columns
+
+
+def extract_participant_rows(match_row_id, raw_match):
+    """將一場原始對局拆成每位參與者一列的資料"""
+    info = raw_match.get("info", {})
+    metadata = raw_match.get("metadata", {})
+    game_duration = info.get("gameDuration", 0)
+
+    team_wins = {team.get("teamId"): team.get("win", False) for team in info.get("teams", [])}
+    winning_team_id = next((team_id for team_id, win in team_wins.items() if win), 0)
+
+    match_columns = {
+        "match_row_id": match_row_id,
+        "match_id": metadata.get("matchId"),
+        "game_mode": info.get("gameMode", ""),
+        "game_version": info.get("gameVersion", ""),
+        "game_duration": game_duration,
+        "game_end_timestamp": info.get("gameEndTimestamp"),
+        "winning_team_id": winning_team_id,
+    }
+
+    rows = []
+    for order, participant in enumerate(info.get("participants", [])):
+        p_feats = participant_features(participant, game_duration)
+        challenges = participant.get("challenges", {})
+
+        row = dict(match_columns)
+        row["participant_order"] = order
+        row["puuid"] = p_feats["puuid"]
+        row["champion_id"] = participant.get("championId", 0)
+        row["champion_name"] = p_feats["championName"]
+        row["team_id"] = p_feats["teamId"]
+        row["win"] = bool(team_wins.get(p_feats["teamId"], False))
+        for name, _ in RAW_STAT_COLUMNS:
+            row[name] = p_feats[name]
+        row["damage_per_minute"] = p_feats["damage_per_minute"]
+        row["gold_per_damage_dealt"] = p_feats["gold_per_damage_dealt"]
+        row["gold_conversion_efficiency"] = p_feats["gold_conversion_efficiency"]
+        row["kda"] = p_feats["kda"]
+        row["team_damage_percentage"] = challenges.get("teamDamagePercentage", 0)
+        row["damage_taken_on_team_percentage"] = challenges.get("damageTakenOnTeamPercentage", 0)
+        row.update(rune_columns(participant.get("perks")))
+        for i in range(7):
+            row[f"item{i}"] = participant.get(f"item{i}", 0)
+        rows.append(row)
+    return rows
+
+
+# -------------------- 寫入 --------------------
+def get_db_connection():
+    """依 config.ini 的 [database] 設定建立連線"""
+    config = configparser.ConfigParser()
+    config.read('config.ini', encoding='utf-8')
+    return psycopg2.connect(
+        host=config.get('database', 'DB_HOST'),
+        port=config.getint('database', 'DB_PORT'),
+        dbname=config.get('database', 'DB_NAME'),
+        user=config.get('database', 'DB_USER'),
+        password=config.get('database', 'DB_PASSWORD'),
+    )
+
+
+def load_manifest(store_dir):
+    """
+    讀取資料庫的進度紀錄：已擷取到的寫入時間 high_water_mark 與該時間中最後擷取的 id (last_match_row_id，
+    為 None 表示 high_water_mark 之前的對局都已擷取)；舊版只記錄 last_match_row_id (沒有 high_water_mark)
+    """
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"high_water_mark": None, "last_match_row_id": None, "participants": 0}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def write_partitions(store_dir, rows):
+    """依版本分區寫出一個批次的 Arrow IPC 檔案，回傳寫入的列數"""
+    by_patch = {}
+    for row in rows:
+        by_patch.setdefault(game_patch(row["game_version"]), []).append(row)
+
+    for patch, patch_rows in by_patch.items():
+        partition_dir = os.path.join(store_dir, f"patch={patch}")
+        os.makedirs(partition_dir, exist_ok=True)
+        first_id, last_id = patch_rows[0]["match_row_id"], patch_rows[-1]["match_row_id"]
+        path = os.path.join(partition_dir, f"part-{first_id:010d}-{last_id:010d}.arrow")
+
+        table = pa.Table.from_pylist(patch_rows, schema=PARTICIPANT_SCHEMA)
+        # 以 "." 開頭的暫存檔不會被資料集讀到
+        tmp_path = os.path.join(partition_dir, f".{os.path.basename(path)}.tmp")
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, PARTICIPANT_SCHEMA) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    return len(rows)
+
+
+def current_high_water_mark(conn, lag_seconds=INGEST_LAG_SECONDS):
+    """已確定 commit 的寫入時間 (資料庫時間 lag_seconds 秒前，ISO 格式字串)"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT LOCALTIMESTAMP - %s * INTERVAL '1 second'", (int(lag_seconds),))
+        mark = cursor.fetchone()[0]
+    conn.commit()
+    return mark.isoformat()
+
+
+def missing_match_row_ids(conn, store_dir, until_time, source_filter):
+    """
+    舊版進度 (以 id 記錄) 的補齊：until_time 之前寫入、但不在資料庫中的對局 id
+    (舊版以 id > 上次進度擷取，較晚 commit 的較小 id 會被跳過)
+    """
+    extracted = set()
+    if any(name.startswith("patch=") for name in os.listdir(store_dir)):
+        extracted.update(read_participants(["match_row_id"], store_dir).column("match_row_id").to_pylist())
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT id FROM model_matches WHERE created_at <= %s AND ({source_filter})", (until_time,))
+        missing = [row[0] for row in cursor.fetchall() if row[0] not in extracted]
+    conn.commit()
+    return missing
+
+
+def build_participant_store(conn, store_dir=DEFAULT_STORE_DIR, batch_size=2000, archive_dir=None):
+    """
+    從 model_matches 擷取尚未寫入的對局並寫入欄位式資料庫：
+    依寫入時間 (created_at, id) 的順序，只讀取上次進度之後、high water mark (current_high_water_mark) 之前寫入的對局
+    每個批次寫完才更新進度，中斷後重跑會從上次完成的批次繼續
+    match_data 已移入封存 (match_archive.py) 的對局從 archive_dir 讀取
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = load_manifest(store_dir)
+    reader = None
+    if archive_dir:
+        from match_archive import ArchiveReader
+        reader = ArchiveReader(archive_dir)
+
+    until_time = current_high_water_mark(conn)
+    source_filter = "match_data IS NOT NULL" + (" OR archive_ref IS NOT NULL" if reader else "")
+    params = {"until_time": until_time}
+    if "high_water_mark" not in manifest:
+        # 舊版進度：補齊被跳過的對局與之後寫入的對局，之後改以寫入時間記錄
+        params["missing"] = missing_match_row_ids(conn, store_dir, until_time, source_filter)
+        position_filter = "AND id = ANY(%(missing)s)"
+        print(f"舊版進度 (id {manifest['last_match_row_id']})：補齊 {len(params['missing'])} 場尚未擷取的對局...")
+    elif manifest["high_water_mark"] is None:
+        position_filter = ""
+    elif manifest["last_match_row_id"] is None:
+        position_filter = "AND created_at > %(mark)s"
+        params["mark"] = manifest["high_water_mark"]
+    else:
+        position_filter = "AND (created_at, id) > (%(mark)s, %(last_id)s)"
+        params.update(mark=manifest["high_water_mark"], last_id=manifest["last_match_row_id"])
+    print(f"擷取寫入時間在 {manifest.get('high_water_mark') or '最早'} 之後、{until_time} 之前的對局...")
+
+    with conn.cursor(name="participant_store") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(f"""
+            SELECT id, created_at, match_data, {'archive_ref' if reader else 'NULL'} FROM model_matches
+            WHERE created_at <= %(until_time)s AND ({source_filter}) {position_filter}
+            ORDER BY created_at, id
+        """, params)
+
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            rows = []
+            for match_row_id, _, raw_match, archive_ref in batch:
+                if raw_match is None:
+                    raw_match = reader.read(archive_ref)
+                elif isinstance(raw_match, str):
+                    raw_match = json.loads(raw_match)
+                rows.extend(extract_participant_rows(match_row_id, raw_match))
+
+            manifest["participants"] += write_partitions(store_dir, rows)
+            manifest["high_water_mark"] = batch[-1][1].isoformat()
+            manifest["last_match_row_id"] = batch[-1][0]
+            save_manifest(store_dir, manifest)
+            print(f"已擷取至 {manifest['high_water_mark']} (id {manifest['last_match_row_id']})，"
+                  f"累計 {manifest['participants']} 位參與者")
+    conn.commit()
+
+    # high water mark 之前的對局都已擷取
+    manifest["high_water_mark"], manifest["last_match_row_id"] = until_time, None
+    save_manifest(store_dir, manifest)
+    if reader:
+        reader.close()
+    return manifest
+
+
+# -------------------- 讀取 --------------------
+def open_participant_dataset(store_dir=DEFAULT_STORE_DIR):
+    """以 memory-map 開啟欄位式資料庫 (patch 為分區欄位)"""
+    partitioning = ds.partitioning(pa.schema([("patch", pa.string())]), flavor="hive")
+    return ds.dataset(store_dir, format="ipc", partitioning=partitioning,
+                      filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+def read_participants(columns, store_dir=DEFAULT_STORE_DIR, patches=None, row_filter=None):
+    """
+    只讀取指定欄位，可用 patches 限定版本分區 (只掃描對應的檔案)，
+    row_filter 為額外的 pyarrow.dataset 篩選條件
+    回傳 pyarrow.Table，依 (match_row_id, participant_order) 排序
+    """
+    dataset = open_participant_dataset(store_dir)
+    expression = row_filter
+    if patches:
+        patch_filter = ds.field("patch").isin(list(patches))
+        expression = patch_filter if expression is None else expression & patch_filter
+
+    sort_columns = [name for name in ("match_row_id", "participant_order") if name not in columns]
+    table = dataset.to_table(columns=list(columns) + sort_columns, filter=expression)
+    if "match_row_id" in table.column_names and "participant_order" in table.column_names:
+        table = table.sort_by([("match_row_id", "ascending"), ("participant_order", "ascending")])
+    return table.select(list(columns))
+
+
+if __name__ == "__main__":
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_STORE_DIR
+    config = configparser.ConfigParser()
+    config.read('config.ini', encoding='utf-8')
+    connection = get_db_connection()
+    try:
+        result = build_participant_store(connection, target_dir,
+                                         archive_dir=config.get('crawler', 'ARCHIVE_DIR', fallback=None))
+        print(f"完成：共 {result['participants']} 位參與者，已擷取至 {result['high_water_mark']}")
+    finally:
+        connection.close()
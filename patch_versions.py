@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+遊戲版本 (patch) 的共用函式，不依賴任何套件：
+爬蟲 (find_data、match_features)、封存 (match_archive)、欄位式資料庫、ETL (flaskApi/calculateData.py)、
+模型訓練 (chatDeep) 與服務端的模型包讀取 (bundle_reader) 都使用這一份實作
+flaskApi 部署時只包含該目錄，flaskApi/patch_versions.py 為指向此檔案的符號連結 (dockerfile 會複製實際檔案)
+"""
+
+
+def game_patch(game_version):
+    """只保留主版本號，例如 "15.1.649.4112" -> "15.1" (無法解析時歸入 unknown 分區)"""
+    if game_version and '.' in game_version:
+        return '.'.join(game_version.split('.')[:2])
+    return "unknown"
+
+
+def patch_key(patch):
+    """版本排序鍵："15.10" 排在 "15.9" 之後，無法解析的 (unknown) 排在最前面"""
+    try:
+        return tuple(int(part) for part in patch.split('.'))
+    except (AttributeError, ValueError):
+        return (-1,)
+
+
+def parse_version_window(spec, available):
+    """
+    解析版本區間設定，回傳要使用的版本列表 (spec 為空時回傳 None，表示不限制)：
+        "15.1,15.3"   指定版本
+        "15.1-15.4"   available 中介於兩者之間的版本 (含頭尾)
+        "latest:3"    available 中最新的 3 個版本
+    """
+    spec = (spec or '').strip()
+    if not spec:
+        return None
+    available = sorted((patch for patch in available if patch_key(patch) != (-1,)), key=patch_key)
+    if spec.startswith('latest:'):
+        return available[-int(spec.split(':', 1)[1]):]
+    if '-' in spec:
+        low, high = (patch_key(part.strip()) for part in spec.split('-', 1))
+        return [patch for patch in available if low <= patch_key(patch) <= high]
+    return sorted((part.strip() for part in spec.split(',') if part.strip()), key=patch_key)
@@ -7,6 +7,8 @@ import sys
 import numpy as np
 import tensorflow as tf
 
+from model_bundle import BUNDLE_FILE, normalized_stats_table, read_bundle
+
 
 # -------------------- 英雄名稱正規化類別 --------------------
 class ChampionNormalizer:
@@ -73,7 +75,36 @@ class ARAMPredictor:
     def __init__(self, model_path="advanced_aram_model_v2.h5",
                  mapping_path="champion_to_idx_v2.pkl",
                  scaler_path="scaler_v2.pkl",
-                 champion_stats_path="champion_stats_dict_v2.pkl"):
+                 champion_stats_path="champion_stats_dict_v2.pkl",
+                 bundle_path=BUNDLE_FILE):
+        # 有模型包 (model_bundle.py) 時只讀取模型包，否則讀取模型與三個 .pkl 輔助檔案
+        if bundle_path and os.path.exists(resource_path(bundle_path)):
+            self._load_bundle(resource_path(bundle_path))
+        else:
+            self._load_files(model_path, mapping_path, scaler_path, champion_stats_path)
+
+        # 建立名稱正規化器
+        self.normalizer = ChampionNormalizer()
+        # 建立正規化後名稱對應到英雄索引的字典
+        self.norm_to_idx = {}
+        for champ, idx in self.champion_to_idx.items():
+            norm_name = self.normalizer.normalize(champ)
+            self.norm_to_idx[norm_name] = idx
+
+    def _load_bundle(self, bundle_full_path):
+        """從單一模型包載入模型、英雄索引與正規化後的英雄統計表"""
+        manifest, model_content, arrays = read_bundle(bundle_full_path)
+        self.model_version = manifest["version"]
+        self.champion_to_idx = {champ: idx for idx, champ in enumerate(manifest["champions"])}
+        # Keras 只能從檔案載入模型，寫到模型包旁邊
+        model_full_path = os.path.join(os.path.dirname(bundle_full_path), f"bundle_{manifest['model']}")
+        with open(model_full_path, "wb") as f:
+            f.write(model_content)
+        self.model = tf.keras.models.load_model(model_full_path)
+        self.ids_only = len(self.model.inputs) == 1
+        self.stats_table = normalized_stats_table(arrays)
+
+    def _load_files(self, model_path, mapping_path, scaler_path, champion_stats_path):
         # 使用 resource_path 取得正確路徑
         model_full_path = resource_path(model_path)
         mapping_full_path = resource_path(mapping_path)
@@ -90,13 +121,15 @@ class ARAMPredictor:
             self.scaler = pickle.load(f)
         with open(champion_stats_full_path, "rb") as f:
             self.champion_stats_dict = pickle.load(f)
-        # 建立名稱正規化器
-        self.normalizer = ChampionNormalizer()
-        # 建立正規化後名稱對應到英雄索引的字典
-        self.norm_to_idx = {}
+        # lookup 模型 (chatDeep 的 MODEL_VARIANT=lookup) 只需要英雄 ID，英雄統計在模型內查表
+        self.ids_only = len(self.model.inputs) == 1
+        # 依英雄 ID 排列的正規化英雄統計表 (與訓練時相同以英雄原始名稱查詢，沒有統計數據的英雄以 0 代入)
+        num_features = len(next(iter(self.champion_stats_dict.values())))
+        stats_table = np.zeros((len(self.champion_to_idx), num_features), dtype=np.float32)
         for champ, idx in self.champion_to_idx.items():
-            norm_name = self.normalizer.normalize(champ)
-            self.norm_to_idx[norm_name] = idx
+            if champ in self.champion_stats_dict:
+                stats_table[idx] = self.champion_stats_dict[champ]
+        self.stats_table = self.scaler.transform(stats_table).astype(np.float32)
 
     def predict_team_strength(self, champion_names):
         """
@@ -113,17 +146,7 @@ class ARAMPredictor:
         except KeyError as e:
             raise ValueError(f"未知的英雄名稱: {e}")
         X_ids = np.array([ids], dtype=np.int32)
-        stats = []
-        for champ in comp_sorted:
-            if champ in self.champion_stats_dict:
-                stats.append(self.champion_stats_dict[champ])
-            else:
-                stats.append(np.zeros(len(next(iter(self.champion_stats_dict.values()))), dtype=np.float32))
-        stats = np.array(stats, dtype=np.float32)  # shape: (5, 特徵數)
-        # 對每位英雄的統計數據進行正規化
-        stats = self.scaler.transform(stats)
-        X_stats = np.expand_dims(stats, axis=0)  # shape: (1, 5, 特徵數)
-        prediction = self.model.predict([X_ids, X_stats])
+        prediction = self.model.predict(self.model_inputs(X_ids))
         score = prediction[0][0]
         return score
 
@@ -133,7 +156,6 @@ class ARAMPredictor:
         輸入多組陣容（每組包含 5 位英雄名稱），返回預測結果列表
         """
         X_ids = []
-        X_stats = []
         for comp in compositions:
             if len(comp) != 5:
                 raise ValueError("每個陣容必須包含五位英雄")
@@ -144,21 +166,13 @@ class ARAMPredictor:
             except KeyError as e:
                 raise ValueError(f"未知的英雄名稱: {e}")
             X_ids.append(ids)
-            stats = []
-            for champ in comp_sorted:
-                if champ in self.champion_stats_dict:
-                    stats.append(self.champion_stats_dict[champ])
-                else:
-                    stats.append(np.zeros(len(next(iter(self.champion_stats_dict.values()))), dtype=np.float32))
-            X_stats.append(stats)
         X_ids = np.array(X_ids, dtype=np.int32)
-        X_stats = np.array(X_stats, dtype=np.float32)  # shape: (批次數, 5, 特徵數)
-        # 將統計數據展平後進行正規化，再還原原矩陣形狀
-        batch_size, num_champs, num_features = X_stats.shape
-        X_stats_flat = X_stats.reshape(-1, num_features)
-        X_stats_flat = self.scaler.transform(X_stats_flat)
-        X_stats = X_stats_flat.reshape(batch_size, num_champs, num_features)
-        predictions = self.model.predict([X_ids, X_stats])
+        predictions = self.model.predict(self.model_inputs(X_ids))
         results = predictions[:, 0].tolist()
+        return results
 
-        return results
\ No newline at end of file
+    def model_inputs(self, X_ids):
+        """lookup 模型只需要英雄 ID；雙輸入模型再依英雄 ID 查正規化後的英雄統計表，shape: (批次數, 5, 特徵數)"""
+        if self.ids_only:
+            return X_ids
+        return [X_ids, self.stats_table[X_ids]]
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+非同步 Riot API 用戶端 (aiohttp)：
+1. 共用連線池 (keep-alive)，每個區域可同時有 max_in_flight 個請求在途 (某區域被限速時不佔用其他區域的名額)
+2. 依回應的 X-App-Rate-Limit / X-Method-Rate-Limit 標頭調整限速，
+   應用程式限速以區域 (routing value) 為單位，方法限速以 (區域, API 方法) 為單位
+3. 收到 429 時依 Retry-After 暫停對應的範圍 (application / method / service) 後重試，5xx 以指數退避重試
+base_url 可指向本機的 mock_riot_server.py 進行測試，base_urls 可為個別區域指定不同的位址
+需要選用套件 aiohttp (不在 requirements.txt 中，pip install aiohttp)
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+import aiohttp
+
+# 取得第一個回應前使用的保守限速 (開發用 API key 的限制)
+DEFAULT_APP_LIMIT = "20:1,100:120"
+DEFAULT_METHOD_LIMIT = "2000:10"
+# 伺服器收到請求的時間會比送出晚，token 放回時多等一點避免壓線
+RATE_LIMIT_MARGIN = 0.05
+MAX_RETRIES = 5
+
+
+class RiotApiError(Exception):
+    """請求失敗 (重試 MAX_RETRIES 次後仍失敗或 404 以外的 4xx)，與查無資料 (404，回傳 None) 區分"""
+
+
+def parse_rate_limit(header):
+    """解析限速標頭，例如 "20:1,100:120" -> [(20, 1), (100, 120)] (次數, 秒)"""
+    limits = []
+    for part in (header or "").split(","):
+        if ":" not in part:
+            continue
+        count, window = part.split(":", 1)
+        limits.append((int(count), int(window)))
+    return limits
+
+
+class TokenBucket:
+    """
+    單一限速視窗：window 秒內最多 limit 個 token
+    用掉的 token 在 window 秒後才放回，任意 window 秒內的請求數都不會超過 limit (與 Riot 的固定視窗相容)
+    """
+
+    def __init__(self, limit, window, margin=RATE_LIMIT_MARGIN):
+        self.limit = limit
+        self.window = window
+        self.margin = margin
+        self.returns = deque()  # 已用掉的 token 放回的時間 (遞增)
+
+    def _release(self, now):
+        while self.returns and self.returns[0] <= now:
+            self.returns.popleft()
+
+    def wait_time(self, now):
+        """距離可以取得 token 還要等幾秒 (0 表示現在就可以)"""
+        self._release(now)
+        if len(self.returns) < self.limit:
+            return 0
+        return self.returns[len(self.returns) - self.limit] - now
+
+    def consume(self, now):
+        self.returns.append(now + self.window + self.margin)
+
+    def sync(self, used, now):
+        """以回應的 X-*-Rate-Limit-Count 校正：伺服器記錄的次數較多時 (例如其他程序共用 key)，補記用掉的 token"""
+        self._release(now)
+        for _ in range(min(used, self.limit) - len(self.returns)):
+            self.consume(now)
+
+
+class RateLimiter:
+    """一個限速範圍 (例如某區域的應用程式限速)，包含多個視窗的 TokenBucket"""
+
+    def __init__(self, header):
+        self.header = header
+        self.buckets = [TokenBucket(limit, window) for limit, window in parse_rate_limit(header)]
+        self.blocked_until = 0.0  # 429 Retry-After 暫停到的時間
+
+    def wait_time(self, now):
+        waits = [bucket.wait_time(now) for bucket in self.buckets]
+        waits.append(self.blocked_until - now)
+        return max(0, max(waits))
+
+    def consume(self, now):
+        for bucket in self.buckets:
+            bucket.consume(now)
+
+    def update(self, limit_header, count_header, now):
+        """依回應標頭更新限速設定與已使用次數"""
+        if limit_header and limit_header != self.header:
+            # 限速改變時保留相同視窗已用掉的 token
+            old_buckets = {bucket.window: bucket for bucket in self.buckets}
+            self.header = limit_header
+            self.buckets = []
+            for limit, window in parse_rate_limit(limit_header):
+                bucket = TokenBucket(limit, window)
+                if window in old_buckets:
+                    bucket.returns = old_buckets[window].returns
+                self.buckets.append(bucket)
+        if count_header:
+            used = dict((window, count) for count, window in parse_rate_limit(count_header))
+            for bucket in self.buckets:
+                if bucket.window in used:
+                    bucket.sync(used[bucket.window], now)
+
+    def block(self, seconds, now):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class RiotClient:
+    """
+    非同步 Riot API 用戶端，使用方式：
+        async with RiotClient(api_key) as client:
+            match = await client.get_match("sea", "TW2_123")
+    """
+
+    def __init__(self, api_key, base_url=None, max_in_flight=50, app_limit=DEFAULT_APP_LIMIT,
+                 method_limit=DEFAULT_METHOD_LIMIT, timeout=30, base_urls=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.base_urls = {region: url.rstrip("/") for region, url in (base_urls or {}).items()}
+        self.max_in_flight = max_in_flight
+        self.app_limit = app_limit
+        self.method_limit = method_limit
+        self.timeout = timeout
+        self.app_limiters = {}  # 區域 -> RateLimiter
+        self.method_limiters = {}  # (區域, 方法) -> RateLimiter
+        self.limit_lock = asyncio.Lock()
+        self.in_flight = {}  # 區域 -> Semaphore
+        self.session = None
+        self.stats = {"requests": 0, "rate_limited": 0, "retries": 0, "errors": 0}
+
+    async def __aenter__(self):
+        # 連線數由各區域的 in_flight 限制
+        connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"X-Riot-Token": self.api_key},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    def url(self, region, path):
+        base = self.base_urls.get(region) or self.base_url or f"https://{region}.api.riotgames.com"
+        return base + path
+
+    def limiters(self, region, method):
+        if region not in self.app_limiters:
+            self.app_limiters[region] = RateLimiter(self.app_limit)
+        if (region, method) not in self.method_limiters:
+            self.method_limiters[(region, method)] = RateLimiter(self.method_limit)
+        return self.app_limiters[region], self.method_limiters[(region, method)]
+
+    def region_in_flight(self, region):
+        if region not in self.in_flight:
+            self.in_flight[region] = asyncio.Semaphore(self.max_in_flight)
+        return self.in_flight[region]
+
+    async def acquire(self, region, method):
+        """等到應用程式與方法限速都有 token 時一起取用"""
+        app_limiter, method_limiter = self.limiters(region, method)
+        while True:
+            async with self.limit_lock:
+                now = time.monotonic()
+                wait = max(app_limiter.wait_time(now), method_limiter.wait_time(now))
+                if wait <= 0:
+                    app_limiter.consume(now)
+                    method_limiter.consume(now)
+                    return
+            await asyncio.sleep(wait)
+
+    def update_limits(self, region, method, headers):
+        app_limiter, method_limiter = self.limiters(region, method)
+        now = time.monotonic()
+        app_limiter.update(headers.get("X-App-Rate-Limit"), headers.get("X-App-Rate-Limit-Count"), now)
+        method_limiter.update(headers.get("X-Method-Rate-Limit"), headers.get("X-Method-Rate-Limit-Count"), now)
+
+    async def get(self, region, method, path, params=None):
+        """
+        送出 GET 請求並回傳 JSON；404 (查無資料) 回傳 None，
+        其他 4xx 或重試 MAX_RETRIES 次後仍失敗時拋出 RiotApiError，呼叫端不可當成查無資料處理
+        method 為限速用的 API 方法名稱
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with self.region_in_flight(region):
+                    # 取得連線名額後才取用 token，避免排隊中的請求在名額釋出時一起送出而超過限速
+                    await self.acquire(region, method)
+                    self.stats["requests"] += 1
+                    async with self.session.get(self.url(region, path), params=params) as response:
+                        self.update_limits(region, method, response.headers)
+                        if response.status == 200:
+                            return await response.json()
+                        if response.status == 404:
+                            return None
+                        if response.status == 429:
+                            self.stats["rate_limited"] += 1
+                            await self.handle_rate_limited(region, method, response.headers)
+                            continue
+                        if response.status >= 500:
+                            logging.warning(f"{path} 回應 {response.status}，第 {attempt + 1} 次重試")
+                        else:
+                            self.stats["errors"] += 1
+                            text = await response.text()
+                            logging.error(f"{path} 錯誤: {response.status} {text}")
+                            raise RiotApiError(f"{path} 錯誤: {response.status} {text}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"{path} 連線錯誤: {e!r}，第 {attempt + 1} 次重試")
+            self.stats["retries"] += 1
+            await asyncio.sleep(min(30, 2 ** attempt))
+
+        self.stats["errors"] += 1
+        logging.error(f"{path} 重試 {MAX_RETRIES} 次後仍失敗")
+        raise RiotApiError(f"{path} 重試 {MAX_RETRIES} 次後仍失敗")
+
+    async def handle_rate_limited(self, region, method, headers):
+        """429：依 Retry-After 暫停對應的限速範圍；service 限速 (或沒有標頭) 只暫停這個請求"""
+        retry_after = float(headers.get("Retry-After", 1))
+        limit_type = headers.get("X-Rate-Limit-Type", "service")
+        logging.warning(f"{region} {method} 觸發 {limit_type} 限速，{retry_after} 秒後重試")
+        app_limiter, method_limiter = self.limiters(region, method)
+        now = time.monotonic()
+        if limit_type == "application":
+            app_limiter.block(retry_after, now)
+        elif limit_type == "method":
+            method_limiter.block(retry_after, now)
+        else:
+            await asyncio.sleep(retry_after)
+
+    # -------------------- API 方法 --------------------
+    async def get_account(self, region, game_name, tag_line):
+        path = f"/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"
+        return await self.get(region, "account-v1.by-riot-id", path)
+
+    async def get_match_ids(self, region, puuid, start=0, count=100, queue=450, start_time=None, end_time=None):
+        params = {"start": start, "count": count, "queue": queue}
+        if start_time is not None:
+            params["startTime"] = int(start_time)
+        if end_time is not None:
+            params["endTime"] = int(end_time)
+        path = f"/lol/match/v5/matches/by-puuid/{puuid}/ids"
+        return await self.get(region, "match-v5.by-puuid", path, params)
+
+    async def get_match(self, region, match_id):
+        return await self.get(region, "match-v5.match", f"/lol/match/v5/matches/{match_id}")
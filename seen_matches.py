@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+爬蟲用的已收錄對局集合 (Bloom filter)：
+大亂鬥同場玩家重疊很高，新召喚師的對局 id 大多已收錄，先在記憶體判斷，只有「可能是新的」id 才查資料庫與呼叫 API
+- 不在集合中：一定沒看過
+- 在集合中：幾乎一定已收錄 (誤判率 error_rate，誤判的對局會被略過)
+啟動時讀取上次存檔並補上 model_matches 中 id 較新的對局，定期存檔 (同時補上其他爬蟲程序寫入的對局)
+match_archive.py retire 刪除舊版本分區前把對局 id 記錄到 retired_match_ids，集合同樣由這張表補上，
+從頭建立時移入封存的對局也不會被重新抓取
+存檔不存在或容量不足時從頭建立，容量至少為目前對局數的兩倍 (設定的容量太小時不會建立一開始就超量的集合)
+"""
+
+import hashlib
+import json
+import math
+import os
+
+SAVE_BATCH_SIZE = 50000
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate, bits=None, hashes=None, data=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # m = -n ln p / (ln 2)^2，k = m / n ln 2
+        self.bits = bits or max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.bits / capacity * math.log(2)))
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+        self.count = count
+
+    def positions(self, key):
+        """double hashing：由一次 blake2b 的兩個 64-bit 值產生 k 個位置"""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        added = False
+        for position in self.positions(key):
+            mask = 1 << (position & 7)
+            if not self.data[position >> 3] & mask:
+                self.data[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, key):
+        return all(self.data[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class SeenMatches:
+    """Bloom filter + 存檔路徑與已同步到的 model_matches.id / retired_match_ids.id"""
+
+    def __init__(self, path, capacity, error_rate):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filter = BloomFilter(capacity, error_rate)
+        self.last_row_id = 0
+        self.last_retired_id = 0
+
+    def __contains__(self, match_id):
+        return match_id in self.filter
+
+    def add(self, match_id):
+        self.filter.add(match_id)
+
+    def filter_new(self, match_ids):
+        """只保留可能尚未收錄的對局 id"""
+        return [match_id for match_id in match_ids if match_id not in self.filter]
+
+    def load(self):
+        """讀取存檔；檔案不存在或容量已不足時回傳 False (由 rebuild 重新建立)"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "rb") as f:
+            header = json.loads(f.readline())
+            data = bytearray(f.read())
+        if header["count"] >= header["capacity"] or header["capacity"] < self.capacity:
+            print(f"已收錄對局集合容量不足 ({header['count']}/{header['capacity']})，重新建立")
+            return False
+        self.filter = BloomFilter(header["capacity"], header["error_rate"], header["bits"], header["hashes"],
+                                  data, header["count"])
+        self.last_row_id = header["last_row_id"]
+        # 舊版存檔沒有記錄 retired_match_ids 的進度，從頭補上 (已在集合中的 id 不影響)
+        self.last_retired_id = header.get("last_retired_id", 0)
+        return True
+
+    def count_matches(self, conn):
+        """目前已收錄的對局數，包含已移入封存的 (從頭建立時決定容量)"""
+        with conn.cursor() as cur:
+            cur.execute("SELECT (SELECT COUNT(*) FROM model_matches) + (SELECT COUNT(*) FROM retired_match_ids)")
+            count = cur.fetchone()[0]
+        conn.commit()
+        return count
+
+    def rebuild(self, conn):
+        """建立空的集合 (之後由 sync 全部加入)，容量為設定值與目前對局數兩倍中較大者"""
+        count = self.count_matches(conn)
+        capacity = max(self.capacity, 2 * count)
+        if capacity > self.capacity:
+            print(f"已收錄對局 {count} 筆超過設定容量的一半 ({self.capacity})，以容量 {capacity} 建立；"
+                  f"請調高 [crawler] SEEN_CAPACITY")
+        self.filter = BloomFilter(capacity, self.error_rate)
+        self.last_row_id = 0
+        self.last_retired_id = 0
+
+    def sync_table(self, conn, table, last_id):
+        """加入 table 中 id 大於 last_id 的對局，回傳 (加入的筆數, 最後的 id)"""
+        added = 0
+        with conn.cursor(name="seen_matches") as cur:
+            cur.itersize = SAVE_BATCH_SIZE
+            cur.execute(f"SELECT id, match_id FROM {table} WHERE id > %s ORDER BY id", (last_id,))
+            for row_id, match_id in cur:
+                self.filter.add(match_id)
+                last_id = row_id
+                added += 1
+        conn.commit()
+        return added, last_id
+
+    def sync(self, conn):
+        """
+        加入 model_matches 中 id 大於上次同步的對局 (包含其他爬蟲程序寫入的)
+        與 retired_match_ids 中新移入封存的對局，回傳加入的筆數
+        """
+        added, self.last_row_id = self.sync_table(conn, "model_matches", self.last_row_id)
+        retired, self.last_retired_id = self.sync_table(conn, "retired_match_ids", self.last_retired_id)
+        added += retired
+        if self.filter.count >= self.filter.capacity:
+            print(f"已收錄對局集合已超過容量 ({self.filter.count}/{self.filter.capacity})，誤判率升高；"
+                  f"下次啟動時會以較大的容量重新建立")
+        return added
+
+    def save(self):
+        header = {
+            "capacity": self.filter.capacity,
+            "error_rate": self.filter.error_rate,
+            "bits": self.filter.bits,
+            "hashes": self.filter.hashes,
+            "count": self.filter.count,
+            "last_row_id": self.last_row_id,
+            "last_retired_id": self.last_retired_id,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            f.write(self.filter.data)
+        os.replace(tmp_path, self.path)
+
+
+def load_seen_matches(conn, path, capacity, error_rate):
+    """讀取存檔並補上新對局 (沒有存檔時從 model_matches 與 retired_match_ids 全部建立)，回傳 SeenMatches"""
+    seen = SeenMatches(path, capacity, error_rate)
+    if not seen.load():
+        seen.rebuild(conn)
+    added = seen.sync(conn)
+    seen.save()
+    print(f"已收錄對局集合：{seen.filter.count} 筆 (新加入 {added} 筆，"
+          f"{len(seen.filter.data) / 1024 / 1024:.1f} MB，誤判率 {seen.filter.error_rate})")
+    return seen
@@ -6,8 +6,19 @@ CREATE TABLE summoners (
     riot_id_tagline VARCHAR(50),
     is_searched BOOLEAN DEFAULT FALSE,
     last_searched TIMESTAMP,
-    created_at TIMESTAMP DEFAULT NOW()
+    created_at TIMESTAMP DEFAULT NOW(),
+    priority INT DEFAULT 0,                  -- 爬取優先度 (越大越先處理)
+    last_played TIMESTAMP,                   -- 最近一次出現的對局結束時間 (越近越先處理)
+    leased_by VARCHAR(100),                  -- 目前處理中的爬蟲程序
+    leased_until TIMESTAMP,                  -- 租約到期時間，程序中斷後由其他程序接手
+    crawl_state JSONB,                       -- 爬取進度檢查點 (待處理的對局 id 與位置)，完成後清空
+    crawled_until TIMESTAMP,                 -- 已收錄到的最新對局結束時間，下次只取之後的對局 id
+    region VARCHAR(20) NOT NULL DEFAULT 'sea' -- match-v5 區域 (爬取佇列依區域分區)
 );
+-- 爬取佇列：只索引尚未搜尋的召喚師，每個區域各自排序
+CREATE INDEX idx_summoners_frontier ON summoners(region, priority DESC, last_played DESC NULLS LAST, created_at)
+    WHERE is_searched = FALSE;
+CREATE INDEX idx_summoners_leased_by ON summoners(leased_by) WHERE leased_by IS NOT NULL;
 
 CREATE TABLE matches (
     id SERIAL PRIMARY KEY,
@@ -52,9 +63,9 @@ CREATE TABLE champion_list (
 
 
 CREATE TABLE model_matches (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     is_searched_summoners BOOLEAN DEFAULT FALSE,
-    match_id VARCHAR(50) NOT NULL UNIQUE,
+    match_id VARCHAR(50) NOT NULL,
     game_mode VARCHAR(50),
     game_type VARCHAR(50),
     game_version VARCHAR(50),
@@ -67,10 +78,56 @@ CREATE TABLE model_matches (
     game_duration INT,
     game_start_timestamp TIMESTAMP,
     game_end_timestamp TIMESTAMP,
-    match_data JSONB,   -- 原本的資料
+    match_data JSONB,   -- 原本的資料 (封存模式下為 NULL)
     extract_data JSONB, -- 清洗的資料
-    created_at TIMESTAMP DEFAULT NOW()
+    archive_ref VARCHAR(200), -- 原始資料在封存區段檔的位置 (match_archive.py)
+    created_at TIMESTAMP DEFAULT NOW(),
+    patch VARCHAR(20) NOT NULL DEFAULT 'unknown', -- 主版本號，例如 "15.1" (分區鍵)
+    PRIMARY KEY (id, patch),
+    UNIQUE (match_id, patch)  -- 同一場對局只會屬於一個版本，等同 match_id 唯一
+) PARTITION BY LIST (patch);
+CREATE TABLE model_matches_unknown PARTITION OF model_matches FOR VALUES IN ('unknown');
+-- 微調與版本英雄統計以寫入時間 (created_at) 作為 high water mark，只讀取新寫入的對局
+CREATE INDEX idx_model_matches_created_at ON model_matches(created_at);
+
+-- model_matches 的版本分區 (由 ensure_model_matches_partition 建立；match_archive.py retire 移入封存後記錄 retired_at)
+CREATE TABLE model_match_patches (
+    patch VARCHAR(20) PRIMARY KEY,
+    partition_name TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    retired_at TIMESTAMP,                    -- 分區已移入封存並刪除的時間
+    retired_matches INT                      -- 刪除時的對局數
 );
+INSERT INTO model_match_patches (patch, partition_name) VALUES ('unknown', 'model_matches_unknown');
+
+-- 已移入封存並刪除分區的對局 id (爬蟲的已收錄集合重新建立時由此補上，避免重新抓取)
+CREATE TABLE retired_match_ids (
+    id BIGSERIAL PRIMARY KEY,
+    match_id VARCHAR(50) NOT NULL UNIQUE,
+    patch VARCHAR(20),                       -- 由封存索引回填時為 NULL
+    retired_at TIMESTAMP DEFAULT NOW()
+);
+
+-- 寫入新版本的對局前建立分區 (多個爬蟲同時遇到新版本時以 advisory lock 排隊)
+CREATE OR REPLACE FUNCTION ensure_model_matches_partition(p_patch TEXT) RETURNS VOID AS $$
+DECLARE
+    v_partition TEXT;
+BEGIN
+    -- 已登記且分區仍存在 (包含預先建立的 unknown 分區)
+    SELECT partition_name INTO v_partition FROM model_match_patches WHERE patch = p_patch AND retired_at IS NULL;
+    IF v_partition IS NOT NULL AND to_regclass(v_partition) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    v_partition := 'model_matches_p' || regexp_replace(p_patch, '[^0-9A-Za-z]+', '_', 'g');
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_model_matches_partition'));
+    IF to_regclass(v_partition) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF model_matches FOR VALUES IN (%L)', v_partition, p_patch);
+    END IF;
+    -- 已移入封存的舊版本又有對局寫入時重新建立分區，等下次 retire 再移入封存
+    INSERT INTO model_match_patches (patch, partition_name) VALUES (p_patch, v_partition)
+    ON CONFLICT (patch) DO UPDATE SET partition_name = EXCLUDED.partition_name, retired_at = NULL;
+END;
+$$ LANGUAGE plpgsql;
 
 -- 英雄基本資料表 (適用於 PostgreSQL)
 CREATE TABLE champions (
@@ -0,0 +1,6 @@
+-- 既有資料庫升級：召喚師爬取進度檢查點
+-- (新建資料庫直接使用 aram.sql，已包含以下欄位與索引)
+ALTER TABLE summoners ADD COLUMN IF NOT EXISTS crawl_state JSONB;
+
+-- 重新啟動時找回同一個 WORKER_ID 租用中的召喚師
+CREATE INDEX IF NOT EXISTS idx_summoners_leased_by ON summoners(leased_by) WHERE leased_by IS NOT NULL;
@@ -0,0 +1,20 @@
+-- 既有資料庫升級：summoners 作為多個爬蟲程序共用的爬取佇列
+-- (新建資料庫直接使用 aram.sql，已包含以下欄位與索引)
+ALTER TABLE summoners ADD COLUMN IF NOT EXISTS priority INT DEFAULT 0;
+ALTER TABLE summoners ADD COLUMN IF NOT EXISTS last_played TIMESTAMP;
+ALTER TABLE summoners ADD COLUMN IF NOT EXISTS leased_by VARCHAR(100);
+ALTER TABLE summoners ADD COLUMN IF NOT EXISTS leased_until TIMESTAMP;
+
+-- 以已收錄的對局回填召喚師最近一次出現的時間
+UPDATE summoners s
+SET last_played = m.last_played
+FROM (
+    SELECT p.puuid, MAX(mm.game_end_timestamp) AS last_played
+    FROM model_matches mm
+    CROSS JOIN LATERAL jsonb_array_elements_text(mm.match_data #> '{metadata,participants}') AS p(puuid)
+    GROUP BY p.puuid
+) m
+WHERE s.puuid = m.puuid AND s.is_searched = FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_summoners_frontier ON summoners(priority DESC, last_played DESC NULLS LAST, created_at)
+    WHERE is_searched = FALSE;
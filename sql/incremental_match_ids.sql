@@ -0,0 +1,7 @@
+-- 既有資料庫升級：召喚師對局 id 清單改為只取上次收錄之後的對局
+-- (新建資料庫直接使用 aram.sql，已包含以下欄位)
+ALTER TABLE summoners ADD COLUMN IF NOT EXISTS crawled_until TIMESTAMP;
+
+-- 已搜尋過的召喚師以搜尋時間回填 (當時的清單取到搜尋時為止)
+UPDATE summoners SET crawled_until = last_searched
+WHERE is_searched = TRUE AND crawled_until IS NULL AND last_searched IS NOT NULL;
@@ -0,0 +1,4 @@
+-- 既有資料庫升級：微調 (chatDeep.fine_tune_model_v2) 以寫入時間 created_at 取代 MAX(id) 作為 high water mark
+-- (id 在交易開始時取得，commit 順序不同，較小的 id 可能在 high water mark 記錄之後才 commit 而被略過)
+-- (新建資料庫直接使用 aram.sql，已包含以下索引；分區資料表上建立時會自動建立到每個分區)
+CREATE INDEX IF NOT EXISTS idx_model_matches_created_at ON model_matches(created_at);
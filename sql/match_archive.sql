@@ -0,0 +1,5 @@
+-- 既有資料庫升級：原始對局 JSON 改存於 match_archive.py 的壓縮區段檔
+-- (新建資料庫直接使用 aram.sql，已包含此欄位)
+ALTER TABLE model_matches ADD COLUMN IF NOT EXISTS archive_ref VARCHAR(200);
+
+-- 之後執行 python match_archive.py train / migrate，再 VACUUM FULL model_matches 釋放空間
@@ -0,0 +1,8 @@
+-- 既有資料庫升級：爬取佇列依 match-v5 區域分區，每個區域由 async_crawler.py 的一條爬取路線處理
+-- (新建資料庫直接使用 aram.sql，已包含以下欄位與索引)
+-- 既有的召喚師都來自單一區域：若 config.ini 的 REGION_MATCH 不是 sea，請先修改下面的預設值
+ALTER TABLE summoners ADD COLUMN IF NOT EXISTS region VARCHAR(20) NOT NULL DEFAULT 'sea';
+
+DROP INDEX IF EXISTS idx_summoners_frontier;
+CREATE INDEX idx_summoners_frontier ON summoners(region, priority DESC, last_played DESC NULLS LAST, created_at)
+    WHERE is_searched = FALSE;
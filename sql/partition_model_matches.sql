@@ -0,0 +1,91 @@
+-- 既有資料庫升級：model_matches 依主版本號 (patch，例如 "15.1") 做 LIST 分區
+-- (新建資料庫直接使用 aram.sql，已包含以下資料表與函式)
+-- 重建資料表並保留原本的 id (已收錄對局集合與欄位式資料庫以 id 記錄進度)；執行期間請先停止爬蟲
+BEGIN;
+
+ALTER TABLE model_matches RENAME TO model_matches_old;
+ALTER SEQUENCE IF EXISTS model_matches_id_seq RENAME TO model_matches_old_id_seq;
+-- 釋出主鍵名稱，新資料表的主鍵才會是 model_matches_pkey
+ALTER TABLE model_matches_old RENAME CONSTRAINT model_matches_pkey TO model_matches_old_pkey;
+
+CREATE TABLE model_matches (
+    id SERIAL,
+    is_searched_summoners BOOLEAN DEFAULT FALSE,
+    match_id VARCHAR(50) NOT NULL,
+    game_mode VARCHAR(50),
+    game_type VARCHAR(50),
+    game_version VARCHAR(50),
+    map_id INT,
+    queue_id INT,
+    platform_id VARCHAR(20),
+    tournament_code VARCHAR(50),
+    game_name VARCHAR(100),
+    game_creation TIMESTAMP,
+    game_duration INT,
+    game_start_timestamp TIMESTAMP,
+    game_end_timestamp TIMESTAMP,
+    match_data JSONB,
+    extract_data JSONB,
+    archive_ref VARCHAR(200),
+    created_at TIMESTAMP DEFAULT NOW(),
+    patch VARCHAR(20) NOT NULL DEFAULT 'unknown',
+    PRIMARY KEY (id, patch),
+    UNIQUE (match_id, patch)
+) PARTITION BY LIST (patch);
+CREATE TABLE model_matches_unknown PARTITION OF model_matches FOR VALUES IN ('unknown');
+
+CREATE TABLE IF NOT EXISTS model_match_patches (
+    patch VARCHAR(20) PRIMARY KEY,
+    partition_name TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    retired_at TIMESTAMP,
+    retired_matches INT
+);
+INSERT INTO model_match_patches (patch, partition_name) VALUES ('unknown', 'model_matches_unknown')
+ON CONFLICT (patch) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION ensure_model_matches_partition(p_patch TEXT) RETURNS VOID AS $$
+DECLARE
+    v_partition TEXT;
+BEGIN
+    -- 已登記且分區仍存在 (包含預先建立的 unknown 分區)
+    SELECT partition_name INTO v_partition FROM model_match_patches WHERE patch = p_patch AND retired_at IS NULL;
+    IF v_partition IS NOT NULL AND to_regclass(v_partition) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    v_partition := 'model_matches_p' || regexp_replace(p_patch, '[^0-9A-Za-z]+', '_', 'g');
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_model_matches_partition'));
+    IF to_regclass(v_partition) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF model_matches FOR VALUES IN (%L)', v_partition, p_patch);
+    END IF;
+    INSERT INTO model_match_patches (patch, partition_name) VALUES (p_patch, v_partition)
+    ON CONFLICT (patch) DO UPDATE SET partition_name = EXCLUDED.partition_name, retired_at = NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 依 game_version 計算版本 (與 patch_versions.game_patch 相同)，建立分區後搬移資料
+CREATE TEMP TABLE old_patches ON COMMIT DROP AS
+SELECT DISTINCT CASE WHEN strpos(game_version, '.') > 0
+                     THEN split_part(game_version, '.', 1) || '.' || split_part(game_version, '.', 2)
+                     ELSE 'unknown' END AS patch
+FROM model_matches_old;
+SELECT ensure_model_matches_partition(patch) FROM old_patches;
+
+INSERT INTO model_matches (
+    id, is_searched_summoners, match_id, game_mode, game_type, game_version, map_id, queue_id, platform_id,
+    tournament_code, game_name, game_creation, game_duration, game_start_timestamp, game_end_timestamp,
+    match_data, extract_data, archive_ref, created_at, patch
+)
+SELECT id, is_searched_summoners, match_id, game_mode, game_type, game_version, map_id, queue_id, platform_id,
+       tournament_code, game_name, game_creation, game_duration, game_start_timestamp, game_end_timestamp,
+       match_data, extract_data, archive_ref, created_at,
+       CASE WHEN strpos(game_version, '.') > 0
+            THEN split_part(game_version, '.', 1) || '.' || split_part(game_version, '.', 2)
+            ELSE 'unknown' END
+FROM model_matches_old;
+
+SELECT setval(pg_get_serial_sequence('model_matches', 'id'), COALESCE((SELECT MAX(id) FROM model_matches), 1));
+DROP TABLE model_matches_old;
+
+COMMIT;
+ANALYZE model_matches;
@@ -0,0 +1,11 @@
+-- 既有資料庫升級：記錄已移入封存並刪除分區的對局 id
+-- (新建資料庫直接使用 aram.sql，已包含以下資料表)
+-- 爬蟲的已收錄集合 (seen_matches.py) 從頭建立時除了 model_matches 也讀取這張表
+CREATE TABLE IF NOT EXISTS retired_match_ids (
+    id BIGSERIAL PRIMARY KEY,
+    match_id VARCHAR(50) NOT NULL UNIQUE,
+    patch VARCHAR(20),                       -- 由封存索引回填時為 NULL
+    retired_at TIMESTAMP DEFAULT NOW()
+);
+
+-- 建立前已 retire 的版本：執行 python match_archive.py backfill-retired 由封存索引補上
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+build_advanced_model_v2 的超參數搜尋：資料只前處理一次 (chatDeep.py 的訓練資料快取)，各組設定在獨立程序中平行訓練
+
+流程：
+    1. 主程序讀取/建立訓練資料快取 (TRAINING_CACHE)，與 chatDeep.train_advanced_model_v2 相同計算各版本的英雄統計表
+    2. 每個工作程序限制 TensorFlow 執行緒數 (--threads)，從快取串流讀取資料訓練一組設定
+    3. 訓練前先量測推論延遲 (lookup 模型 batch_predict --latency-batch 組陣容的中位數)，
+       超過 --latency-budget-ms 的設定不訓練、直接標記為 rejected
+    4. 結果 (驗證 loss/準確率/AUC、訓練時間、推論延遲、參數量) 每完成一組就寫入 results.csv，
+       模型存為 config-NNN.h5
+
+搜尋範圍 (--grid) 為 JSON 檔案：{"embedding_dim": [8, 16], "dropout": [0.2, 0.3]} (所有組合)
+或設定列表 [{"embedding_dim": 8}, {"embedding_dim": 32, "num_heads": 4}]；未指定的參數使用 build_advanced_model_v2 的預設值
+可調整的參數：embedding_dim, num_heads, dropout, id_units, stats_units, hidden_units, head_units, learning_rate, batch_size
+
+用法：
+    python sweep.py [--grid sweep.json] [--workers 4] [--threads 2] [--epochs 20] [--latency-budget-ms 100]
+                    [--output sweep_results]
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import EarlyStopping
+
+import chatDeep
+from export_model import roc_auc
+
+DEFAULT_GRID = {
+    "embedding_dim": [8, 16, 32],
+    "num_heads": [2, 4],
+    "dropout": [0.2, 0.3],
+}
+RESULT_COLUMNS = ["config", "status", "params", "val_loss", "val_accuracy", "val_auc", "epochs",
+                  "train_seconds", "latency_single_ms", "latency_batch_ms", "settings"]
+LATENCY_RUNS = 5
+
+
+def load_grid(path=None):
+    """讀取搜尋範圍，回傳設定列表"""
+    grid = DEFAULT_GRID
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            grid = json.load(f)
+    if isinstance(grid, list):
+        return grid
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def init_worker(threads):
+    """工作程序初始化：在 TensorFlow 建立執行環境前限制執行緒數"""
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def measure_latency(model, X_ids):
+    """預測 X_ids 的延遲中位數 (毫秒，先預熱一次)"""
+    model.predict(X_ids, verbose=0)
+    timings = []
+    for _ in range(LATENCY_RUNS):
+        started = time.perf_counter()
+        model.predict(X_ids, verbose=0)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+
+def run_config(index, settings, meta, stats_table, patch_tables, epochs, patience, latency_batch, latency_budget_ms,
+               output_dir, seed=42):
+    """
+    訓練並評估一組設定 (在工作程序中執行)：與 train_advanced_model_v2 相同以雙輸入模型訓練，
+    每筆樣本依版本從 patch_tables 查英雄統計；MODEL_VARIANT=lookup 時儲存以 stats_table (目前版本) 包成的 lookup 模型
+    """
+    settings = dict(settings)
+    batch_size = settings.pop("batch_size", 32)
+    tf.keras.utils.set_random_seed(seed)
+    num_champions, num_stats_features = stats_table.shape
+    model = chatDeep.build_advanced_model_v2(num_champions, num_stats_features, **settings)
+    lookup = chatDeep.MODEL_VARIANT == "lookup"
+    # 服務端使用 lookup 模型，延遲以 lookup 模型量測 (與權重無關，訓練前即可量測)
+    serving_model = chatDeep.build_lookup_model_v2(model, stats_table)
+    rng = np.random.default_rng(seed)
+    X_batch = np.sort(rng.integers(0, num_champions, size=(latency_batch, 5)), axis=1).astype(np.int32)
+    result = {
+        "config": index,
+        "params": (serving_model if lookup else model).count_params(),
+        "latency_single_ms": round(measure_latency(serving_model, X_batch[:1]), 2),
+        "latency_batch_ms": round(measure_latency(serving_model, X_batch), 2),
+        "settings": json.dumps(dict(settings, batch_size=batch_size), sort_keys=True),
+    }
+    if result["latency_batch_ms"] > latency_budget_ms:
+        result["status"] = "rejected"
+        return result
+
+    train_dataset = chatDeep.make_training_dataset(chatDeep.TRAINING_CACHE_DIR, meta, "train", patch_tables,
+                                                   batch_size=batch_size, seed=seed)
+    test_dataset = chatDeep.make_training_dataset(chatDeep.TRAINING_CACHE_DIR, meta, "test", patch_tables,
+                                                  batch_size=1024, shuffle=False)
+    started = time.time()
+    history = model.fit(train_dataset, epochs=epochs, validation_data=test_dataset, verbose=0,
+                        callbacks=[EarlyStopping(monitor='val_loss', patience=patience, restore_best_weights=True)])
+    result["train_seconds"] = round(time.time() - started, 1)
+    result["epochs"] = len(history.history["loss"])
+
+    val_loss, val_accuracy = model.evaluate(test_dataset, verbose=0)
+    predictions = model.predict(test_dataset, verbose=0)[:, 0]
+    y_test = np.concatenate([np.asarray(y) for _, y in chatDeep.open_cached_split(chatDeep.TRAINING_CACHE_DIR,
+                                                                                  meta, "test")])
+    result.update(status="ok", val_loss=round(val_loss, 5), val_accuracy=round(val_accuracy, 5),
+                  val_auc=round(roc_auc(y_test, predictions), 5))
+    (serving_model if lookup else model).save(os.path.join(output_dir, f"config-{index:03d}.h5"))
+    return result
+
+
+def run_sweep(configs, workers, threads, epochs, patience, latency_batch, latency_budget_ms, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    # 資料只前處理一次，工作程序直接讀取快取分片
+    meta = chatDeep.load_training_cache(chatDeep.TRAINING_CACHE_DIR)
+    # 英雄統計與 train_advanced_model_v2 相同：各樣本使用其版本的統計表，lookup 模型使用目前版本的統計表
+    patch_stats = chatDeep.update_patch_stats()
+    current_patch = chatDeep.latest_patch(patch_stats)
+    stats_by_patch = chatDeep.patch_champion_stats(patch_stats, meta["feature_columns"])
+    stats_table, patch_tables = chatDeep.prepare_cached_dataset(chatDeep.TRAINING_CACHE_DIR, meta, stats_by_patch,
+                                                                current_patch)[4:]
+    print(f"共 {len(configs)} 組設定，{workers} 個工作程序，每個程序 {threads} 個執行緒")
+
+    results = []
+    results_path = os.path.join(output_dir, "results.csv")
+    with open(results_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        # TensorFlow 不支援 fork 後繼續使用，工作程序以 spawn 啟動
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                 initializer=init_worker, initargs=(threads,)) as executor:
+            futures = {executor.submit(run_config, index, settings, meta, stats_table, patch_tables, epochs,
+                                       patience, latency_batch, latency_budget_ms, output_dir): (index, settings)
+                       for index, settings in enumerate(configs)}
+            for future in as_completed(futures):
+                index, settings = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"config": index, "status": f"error: {e}", "settings": json.dumps(settings)}
+                results.append(result)
+                writer.writerow(result)
+                f.flush()
+                print(f"設定 {index:03d} {result['status']}: {result['settings']}")
+
+    ranked = sorted((result for result in results if result["status"] == "ok"), key=lambda r: -r["val_auc"])
+    print(f"{'設定':<6}{'AUC':>9}{'準確率':>9}{'loss':>9}{'訓練(s)':>9}{'延遲(ms)':>10}{'參數量':>9}  參數")
+    for result in ranked:
+        print(f"{result['config']:<6}{result['val_auc']:>9}{result['val_accuracy']:>9}{result['val_loss']:>9}"
+              f"{result['train_seconds']:>9}{result['latency_batch_ms']:>10}{result['params']:>9}  {result['settings']}")
+    rejected = [result for result in results if result["status"] == "rejected"]
+    if rejected:
+        print(f"超過延遲上限 {latency_budget_ms} ms 而未訓練的設定: {sorted(result['config'] for result in rejected)}")
+    print(f"結果已寫入 {results_path}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="build_advanced_model_v2 超參數平行搜尋")
+    parser.add_argument("--grid", help="搜尋範圍 JSON 檔案 (預設為 DEFAULT_GRID)")
+    parser.add_argument("--threads", type=int, default=2, help="每個工作程序的 TensorFlow 執行緒數")
+    parser.add_argument("--workers", type=int, help="工作程序數 (預設為 CPU 數 / threads)")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--patience", type=int, default=3, help="EarlyStopping 的 patience")
+    parser.add_argument("--latency-batch", type=int, default=1001, help="量測延遲的陣容數 (14 選 5)")
+    parser.add_argument("--latency-budget-ms", type=float, default=100.0, help="batch 預測延遲上限")
+    parser.add_argument("--output", default="sweep_results")
+    args = parser.parse_args()
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads)
+    run_sweep(load_grid(args.grid), workers, args.threads, args.epochs, args.patience, args.latency_batch,
+              args.latency_budget_ms, args.output)
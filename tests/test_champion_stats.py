@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""英雄統計的分組加總 (np.add.at / np.bincount) 與原本逐筆相加的結果完全相同"""
+
+import numpy as np
+import pytest
+
+chatDeep = pytest.importorskip("chatDeep")
+
+FEATURES = ['kda', 'kills', 'deaths', 'damage_per_minute']
+
+
+def loop_accumulate(records, feature_columns, champion_stats_aggregated, champion_counts):
+    """向量化之前的實作：逐筆、逐特徵以 float 相加"""
+    for record in records:
+        champ_name = record.get('championName')
+        if not champ_name:
+            continue
+        if champ_name not in champion_stats_aggregated:
+            champion_stats_aggregated[champ_name] = {feature: 0.0 for feature in feature_columns}
+            champion_counts[champ_name] = 0
+        for feature in feature_columns:
+            value = record.get(feature, 0)
+            if value is not None:
+                champion_stats_aggregated[champ_name][feature] += float(value)
+        champion_counts[champ_name] += 1
+
+
+def loop_average(champion_stats_aggregated, champion_counts, feature_columns):
+    champion_stats_dict = {}
+    for champ_name, stats in champion_stats_aggregated.items():
+        count = champion_counts[champ_name]
+        if count > 0:
+            champion_stats_dict[champ_name] = np.array([stats[feature] / count for feature in feature_columns],
+                                                       dtype=np.float32)
+    return champion_stats_dict
+
+
+def make_batches():
+    rng = np.random.default_rng(7)
+    champions = ['Ahri', 'Zed', 'Lux', 'Garen']
+    batches = []
+    for _ in range(3):
+        batch = []
+        for _ in range(200):
+            record = {'championName': champions[rng.integers(len(champions))]}
+            for feature in FEATURES:
+                record[feature] = float(rng.random() * 1000) / 7
+            batch.append(record)
+        batches.append(batch)
+    # 缺少的特徵、None、整數、布林值與沒有英雄名稱的紀錄
+    batches[0][0].pop('kills')
+    batches[0][1]['deaths'] = None
+    batches[1][2]['kda'] = 3
+    batches[1][3]['kills'] = True
+    batches[2][4]['championName'] = ''
+    batches[2][5]['championName'] = None
+    # 只出現在最後一批的英雄 (前面的批次沒有看過)
+    batches[2].append({'championName': 'Teemo', 'kda': 1.5, 'kills': 2, 'deaths': 4, 'damage_per_minute': 380.25})
+    return batches
+
+
+def seeded_state():
+    """接續累加的起始狀態：有已累加的英雄與局數為 0 的英雄"""
+    aggregated = {
+        'Lux': {feature: 10.0 / 3 for feature in FEATURES},
+        'Sona': {feature: 0.0 for feature in FEATURES},
+        'Nami': {feature: 1.25 for feature in FEATURES},
+    }
+    counts = {'Lux': 3, 'Sona': 0, 'Nami': 1}
+    return aggregated, counts
+
+
+def columns(batch):
+    return {column: [record.get(column) for record in batch] for column in ['championName'] + FEATURES}
+
+
+def assert_same_stats(expected, actual):
+    assert list(expected) == list(actual)
+    for champ in expected:
+        assert actual[champ].dtype == np.float32
+        assert expected[champ].tobytes() == actual[champ].tobytes(), champ
+
+
+@pytest.mark.parametrize("as_columns", [False, True])
+def test_vectorized_matches_loop(as_columns):
+    batches = make_batches()
+    loop_aggregated, loop_counts = seeded_state()
+    new_aggregated, new_counts = seeded_state()
+    for batch in batches:
+        loop_accumulate(batch, FEATURES, loop_aggregated, loop_counts)
+        chatDeep.accumulate_champion_stats(columns(batch) if as_columns else batch, FEATURES,
+                                           new_aggregated, new_counts)
+
+    assert list(loop_aggregated) == list(new_aggregated)
+    assert loop_aggregated == new_aggregated
+    assert loop_counts == new_counts
+    expected = loop_average(loop_aggregated, loop_counts, FEATURES)
+    actual = chatDeep.average_champion_stats(new_aggregated, new_counts, FEATURES)
+    assert_same_stats(expected, actual)
+    # 沒有出現在資料中的英雄保留原本的累加值；局數為 0 的英雄不計算平均
+    assert new_aggregated['Nami'] == {feature: 1.25 for feature in FEATURES}
+    assert 'Sona' not in actual
+    assert 'Teemo' in actual
+
+
+def test_compute_champion_stats_matches_loop():
+    records = [record for batch in make_batches() for record in batch]
+    loop_aggregated, loop_counts = {}, {}
+    loop_accumulate(records, chatDeep.STORE_FEATURE_COLUMNS, loop_aggregated, loop_counts)
+    expected = loop_average(loop_aggregated, loop_counts, chatDeep.STORE_FEATURE_COLUMNS)
+
+    actual, feature_columns = chatDeep.compute_champion_stats(records)
+
+    assert feature_columns == chatDeep.STORE_FEATURE_COLUMNS
+    assert_same_stats(expected, actual)
+
+
+def test_empty_batch_leaves_state_unchanged():
+    aggregated, counts = seeded_state()
+    chatDeep.accumulate_champion_stats([], FEATURES, aggregated, counts)
+    chatDeep.accumulate_champion_stats({column: [] for column in ['championName'] + FEATURES}, FEATURES,
+                                       aggregated, counts)
+    assert (aggregated, counts) == seeded_state()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""seen_matches：分區 retire 後 (對局只剩 retired_match_ids 記錄) 已收錄集合仍能重新建立"""
+
+import json
+
+from seen_matches import load_seen_matches
+
+
+class FakeCursor:
+    """只支援 seen_matches 用到的查詢：對局數與依 id 讀取 model_matches / retired_match_ids"""
+
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if "COUNT(*)" in query:
+            self.rows = [(len(self.db.model_matches) + len(self.db.retired_match_ids),)]
+            return
+        table = self.db.retired_match_ids if "retired_match_ids" in query else self.db.model_matches
+        self.rows = sorted(row for row in table if row[0] > params[0])
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.model_matches = []  # (id, match_id)
+        self.retired_match_ids = []  # (id, match_id)
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def insert(self, *match_ids):
+        next_id = max((row_id for row_id, _ in self.model_matches), default=0) + 1
+        for offset, match_id in enumerate(match_ids):
+            self.model_matches.append((next_id + offset, match_id))
+
+    def retire(self, *match_ids):
+        """match_archive.retire_patches：對局 id 記錄到 retired_match_ids 後刪除分區"""
+        next_id = max((row_id for row_id, _ in self.retired_match_ids), default=0) + 1
+        for offset, match_id in enumerate(match_ids):
+            self.retired_match_ids.append((next_id + offset, match_id))
+        self.model_matches = [row for row in self.model_matches if row[1] not in match_ids]
+
+
+def load(conn, path):
+    return load_seen_matches(conn, str(path), 1000, 1e-4)
+
+
+def test_rebuild_after_retirement_keeps_retired_matches(tmp_path):
+    conn = FakeConnection()
+    conn.insert("TW2_1", "TW2_2", "TW2_3")
+    path = tmp_path / "seen.bloom"
+    load(conn, path)
+
+    conn.retire("TW2_1", "TW2_2")
+    path.unlink()
+    seen = load(conn, path)
+
+    assert all(match_id in seen for match_id in ("TW2_1", "TW2_2", "TW2_3"))
+    assert seen.filter_new(["TW2_1", "TW2_2", "TW2_3", "TW2_4"]) == ["TW2_4"]
+    assert seen.last_retired_id == 2
+
+
+def test_sync_adds_matches_retired_before_they_were_seen(tmp_path):
+    conn = FakeConnection()
+    conn.insert("TW2_1")
+    path = tmp_path / "seen.bloom"
+    load(conn, path)
+
+    # 其他爬蟲程序寫入的對局在這個程序同步前就被 retire
+    conn.insert("TW2_2")
+    conn.retire("TW2_2")
+    seen = load(conn, path)
+
+    assert "TW2_2" in seen
+    assert seen.last_row_id == 1
+
+
+def test_load_save_file_without_retired_progress(tmp_path):
+    conn = FakeConnection()
+    conn.insert("TW2_1")
+    path = tmp_path / "seen.bloom"
+    load(conn, path)
+    # 舊版存檔的標頭沒有 last_retired_id
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        data = f.read()
+    del header["last_retired_id"]
+    with open(path, "wb") as f:
+        f.write(json.dumps(header).encode("utf-8") + b"\n" + data)
+
+    conn.retire("TW2_1")
+    seen = load(conn, path)
+
+    assert "TW2_1" in seen
+    assert seen.last_retired_id == 1